@@ -4,17 +4,19 @@ from flask import Flask, request, jsonify
 import requests
 from datetime import datetime
 import asyncio
+import concurrent.futures
 import traceback
 import threading
+import atexit
 
 # Настройка логирования
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Импортируем бота
-from bot import dp, bot, start_background_tasks
-from aiogram import types
-from config import BOT_TOKEN
+from bot import bot, start_background_tasks, shutdown_background_tasks, process_update, update_queue, collect_stats
+from update_queue import is_valid_update
+from config import BOT_TOKEN, ASYNC_INGEST
 
 # !!! ВАЖНО: устанавливаем текущий экземпляр бота
 bot.set_current(bot)
@@ -22,21 +24,39 @@ bot.set_current(bot)
 # Создаем Flask приложение
 app = Flask(__name__)
 
-# ================ ЗАПУСК ФОНОВЫХ ЗАДАЧ В ОТДЕЛЬНОМ ПОТОКЕ ================
-def run_background_tasks():
-    """Запускает фоновые задачи в отдельном потоке со своим event loop"""
+# ================ ОБЩИЙ EVENT LOOP В ОТДЕЛЬНОМ ПОТОКЕ ================
+# Один долгоживущий цикл событий на процесс: aiohttp-сессии, bot.me и DNS
+# переживают запросы, а фоновые задачи крутятся в том же цикле.
+loop = asyncio.new_event_loop()
+
+# Сколько секунд вебхук ждёт обработки обновления
+UPDATE_TIMEOUT = 60
+
+def run_event_loop():
+    """Крутит общий event loop, пока жив процесс"""
+    asyncio.set_event_loop(loop)
+    loop.run_forever()
+
+loop_thread = threading.Thread(target=run_event_loop, name="bot-event-loop", daemon=True)
+loop_thread.start()
+logger.info("🚀 Поток с общим event loop запущен")
+
+def run_in_loop(coro):
+    """Отправляет корутину в общий цикл и возвращает concurrent.futures.Future"""
+    return asyncio.run_coroutine_threadsafe(coro, loop)
+
+# Фоновые задачи запускаем в том же цикле, где обрабатываются обновления
+run_in_loop(start_background_tasks())
+logger.info("✅ Фоновые задачи запланированы в общем цикле")
+
+@atexit.register
+def stop_event_loop():
+    """При остановке воркера корректно завершает фоновые задачи и цикл"""
     try:
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        loop.run_until_complete(start_background_tasks())
-        logger.info("✅ Фоновые задачи запущены в отдельном потоке")
+        run_in_loop(shutdown_background_tasks()).result(timeout=UPDATE_TIMEOUT)
     except Exception as e:
-        logger.error(f"❌ Ошибка запуска фоновых задач: {e}")
-
-# Запускаем в отдельном потоке, чтобы не мешать Flask
-thread = threading.Thread(target=run_background_tasks, daemon=True)
-thread.start()
-logger.info("🚀 Поток для фоновых задач запущен")
+        logger.error(f"Ошибка остановки фоновых задач: {e}")
+    loop.call_soon_threadsafe(loop.stop)
 # ===================================================================
 
 @app.route('/')
@@ -57,17 +77,25 @@ def webhook():
     if request.method == 'POST':
         try:
             update_data = request.get_json()
+            if not is_valid_update(update_data):
+                return 'Bad request', 400
             logger.info(f"Получено обновление: {update_data.get('update_id')}")
             
-            # Создаем новый цикл событий для каждого запроса
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
+            # Быстрый режим: кладём в очередь и сразу отвечаем Telegram
+            if ASYNC_INGEST:
+                accepted = run_in_loop(update_queue.submit(update_data)).result(timeout=5)
+                if not accepted:
+                    return 'Busy', 503
+                return 'OK', 200
             
-            # Обрабатываем обновление
-            update = types.Update(**update_data)
-            loop.run_until_complete(dp.process_update(update))
+            # Обрабатываем обновление в общем цикле событий
+            future = run_in_loop(process_update(update_data))
+            try:
+                future.result(timeout=UPDATE_TIMEOUT)
+            except concurrent.futures.TimeoutError:
+                # Обработка продолжается в цикле, Telegram повторять не нужно
+                logger.warning(f"⏳ Обновление {update_data.get('update_id')} обрабатывается дольше {UPDATE_TIMEOUT}с")
             
-            loop.close()
             return 'OK', 200
         except Exception as e:
             logger.error(f"Ошибка обработки вебхука: {e}")
@@ -132,6 +160,18 @@ def webhook_info():
 def health():
     return jsonify({'status': 'healthy', 'timestamp': datetime.now().isoformat()}), 200
 
+async def collect_stats_in_loop():
+    """Счётчики компонентов меняются в потоке цикла — там их и читаем"""
+    return collect_stats()
+
+@app.route('/stats', methods=['GET'])
+def stats():
+    """Метрики очереди обновлений и других компонентов"""
+    try:
+        return jsonify(run_in_loop(collect_stats_in_loop()).result(timeout=5)), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 if __name__ == '__main__':
     port = int(os.getenv('PORT', 8080))
     app.run(host='0.0.0.0', port=port)
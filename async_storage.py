@@ -0,0 +1,130 @@
+import asyncio
+import functools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+
+import storage
+from config import DB_READERS, DB_OFFLOAD
+
+logger = logging.getLogger(__name__)
+
+# ================ АСИНХРОННЫЙ ФАСАД НАД STORAGE ================
+# Запросы к SQLite выполняются вне event loop: все записи идут через один
+# поток-писатель (SQLite всё равно пишет по одному), чтения — через пул.
+# DB_OFFLOAD=0 выполняет запросы прямо в цикле (для сравнения задержек).
+
+_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-writer")
+_readers = ThreadPoolExecutor(max_workers=DB_READERS, thread_name_prefix="db-reader")
+
+async def _run(executor: ThreadPoolExecutor, func, *args, **kwargs):
+    if not DB_OFFLOAD:
+        return func(*args, **kwargs)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, functools.partial(func, *args, **kwargs))
+
+async def read(func, *args, **kwargs):
+    """Выполняет читающую функцию storage в пуле читателей"""
+    return await _run(_readers, func, *args, **kwargs)
+
+async def write(func, *args, **kwargs):
+    """Выполняет пишущую функцию storage в потоке-писателе"""
+    return await _run(_writer, func, *args, **kwargs)
+
+def shutdown():
+    """Дожидается запросов в потоках и закрывает соединения"""
+    _writer.shutdown(wait=True)
+    _readers.shutdown(wait=True)
+    storage.pool.close()
+
+# ================ КАРМА ================
+
+async def get_user_karma(user_id: int, chat_id: int) -> int:
+    return await read(storage.get_user_karma, user_id, chat_id)
+
+async def get_top_karma(chat_id: int, limit: int = 10) -> List[Tuple[int, int]]:
+    return await read(storage.get_top_karma, chat_id, limit)
+
+# ================ ИГРЫ ================
+
+async def start_game(chat_id: int, word: str, started_at, game_type: str = 'crocodile'):
+    await write(storage.start_game, chat_id, word, started_at, game_type)
+
+async def finish_game(chat_id: int, game_type: str = 'crocodile') -> bool:
+    return await write(storage.finish_game, chat_id, game_type)
+
+async def archive_finished_games() -> int:
+    return await write(storage.archive_finished_games)
+
+# ================ СЛОВА ДЛЯ ИГРЫ ================
+
+async def get_all_words() -> List[Tuple[str, str]]:
+    return await read(storage.get_all_words)
+
+async def add_word(word: str, description: str, added_by: int) -> bool:
+    return await write(storage.add_word, word, description, added_by)
+
+# ================ СТАТИСТИКА КРОКОДИЛА ================
+
+async def get_game_stats(user_id: int, chat_id: int) -> Tuple[int, int]:
+    return await read(storage.get_game_stats, user_id, chat_id)
+
+async def get_top_game_stats(chat_id: int, limit: int = 10) -> List[Tuple[int, int, int]]:
+    return await read(storage.get_top_game_stats, chat_id, limit)
+
+async def apply_stat_deltas(karma: List[Tuple[int, int, int]], games: List[storage.GameEvent]):
+    await write(storage.apply_stat_deltas, karma, games)
+
+# ================ ПАРЫ ДНЯ ================
+
+async def add_couple(chat_id: int, user1_id: int, user2_id: int, date):
+    await write(storage.add_couple, chat_id, user1_id, user2_id, date)
+
+# ================ ПОДПИСКИ НА ПОГОДУ ================
+
+async def subscribe_weather(chat_id: int, cities: List[str], send_time: str, timezone: str = 'Europe/Moscow'):
+    await write(storage.subscribe_weather, chat_id, cities, send_time, timezone)
+
+async def unsubscribe_weather(chat_id: int) -> bool:
+    return await write(storage.unsubscribe_weather, chat_id)
+
+async def get_weather_timezones() -> List[str]:
+    return await read(storage.get_weather_timezones)
+
+async def get_due_weather_subscriptions(timezone: str, send_time: str) -> List[Tuple[int, List[str]]]:
+    return await read(storage.get_due_weather_subscriptions, timezone, send_time)
+
+# ================ ПРОФИЛИ ПОЛЬЗОВАТЕЛЕЙ ================
+
+async def get_user_profiles() -> List[Tuple[int, str, Optional[str], float]]:
+    return await read(storage.get_user_profiles)
+
+async def save_user_profiles(profiles: List[Tuple[int, str, Optional[str], float]]):
+    await write(storage.save_user_profiles, profiles)
+
+# ================ ИСТОРИЯ ДИАЛОГОВ ================
+
+async def save_conversations(rows: List[Tuple[int, str, float]]):
+    await write(storage.save_conversations, rows)
+
+async def load_conversation(chat_id: int) -> Optional[str]:
+    return await read(storage.load_conversation, chat_id)
+
+# ================ РАСХОД ТОКЕНОВ НЕЙРОСЕТИ ================
+
+async def save_ai_usage(rows: List[Tuple[str, int, int, int, int, int]]):
+    await write(storage.save_ai_usage, rows)
+
+async def get_top_ai_usage_chats(day: str, limit: int = 10) -> List[Tuple[int, int, int, int]]:
+    return await read(storage.get_top_ai_usage_chats, day, limit)
+
+async def get_top_ai_usage_users(day: str, chat_id: int, limit: int = 10) -> List[Tuple[int, int, int, int]]:
+    return await read(storage.get_top_ai_usage_users, day, chat_id, limit)
+
+# ================ СЛОВА-ТРИГГЕРЫ ЧАТОВ ================
+
+async def add_chat_trigger(chat_id: int, word: str, added_by: int):
+    await write(storage.add_chat_trigger, chat_id, word, added_by)
+
+async def remove_chat_trigger(chat_id: int, word: str):
+    await write(storage.remove_chat_trigger, chat_id, word)
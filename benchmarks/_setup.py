@@ -0,0 +1,27 @@
+import os
+import sys
+import tempfile
+import time
+
+# Как в tests/conftest.py: тестовые токены и отдельная база до импорта модулей бота
+TMP_DIR = tempfile.mkdtemp(prefix="bot-bench-")
+os.environ.setdefault("BOT_TOKEN", "123456:BENCH")
+os.environ.setdefault("MEGANOVA_API_KEY", "bench")
+os.environ["DB_PATH"] = os.path.join(TMP_DIR, "bench.db")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def percentile(samples, q: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+def report(name: str, samples, unit: float = 1e3, suffix: str = "ms"):
+    """p50/p99/среднее по замерам в секундах"""
+    print(f"{name:<40} p50 {percentile(samples, 0.5) * unit:8.3f} {suffix}   "
+          f"p99 {percentile(samples, 0.99) * unit:8.3f} {suffix}   "
+          f"avg {sum(samples) / len(samples) * unit:8.3f} {suffix}")
+
+def timed(func, *args):
+    started = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - started, result
@@ -0,0 +1,107 @@
+"""Пачка из 1000 обновлений /start: новый event loop на каждое обновление против общего цикла.
+
+    python benchmarks/bench_event_loop.py
+
+Bot API подменён локальной заглушкой на aiohttp (без TLS), поэтому выигрыш
+на настоящем api.telegram.org с рукопожатием TLS будет заметно больше.
+"""
+import asyncio
+import concurrent.futures
+import logging
+import threading
+import time
+
+import _setup
+from _setup import report
+
+from aiogram.bot.api import TelegramAPIServer
+from aiohttp import web
+
+import bot as bot_module
+from outbound import OutboundLimiter
+
+UPDATES = 1000
+
+async def fake_telegram(request: web.Request):
+    """Отвечает на любой метод Bot API как на sendMessage"""
+    data = await request.post()
+    chat_id = int(data.get("chat_id", 0))
+    return web.json_response({"ok": True, "result": {
+        "message_id": 1, "date": 0, "chat": {"id": chat_id, "type": "private"}, "text": data.get("text", "")}})
+
+def start_stub_server() -> str:
+    loop = asyncio.new_event_loop()
+    app = web.Application()
+    app.router.add_post("/{path:.*}", fake_telegram)
+    runner = web.AppRunner(app, access_log=None)
+    loop.run_until_complete(runner.setup())
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    loop.run_until_complete(site.start())
+    port = site._server.sockets[0].getsockname()[1]
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    return f"http://127.0.0.1:{port}"
+
+def start_update(update_id: int) -> dict:
+    chat_id = 10_000 + update_id
+    return {"update_id": update_id, "message": {
+        "message_id": update_id, "date": 0, "text": "/start",
+        "entities": [{"type": "bot_command", "offset": 0, "length": 6}],
+        "chat": {"id": chat_id, "type": "private"},
+        "from": {"id": chat_id, "is_bot": False, "first_name": "Bench"}}}
+
+async def close_session():
+    # bot.close() в aiogram 2 помечен устаревшим и шумит в выводе
+    await (await bot_module.bot.get_session()).close()
+
+def unlimited() -> OutboundLimiter:
+    # Лимиты Telegram здесь не измеряются — снимаем их
+    return OutboundLimiter(global_rate=1_000_000)
+
+def loop_per_update():
+    """Как было в app.py: новый цикл, обработка, закрытие сессии и цикла"""
+    samples = []
+    for update_id in range(UPDATES):
+        started = time.perf_counter()
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        bot_module.bot.outbound = unlimited()
+        loop.run_until_complete(bot_module.process_update(start_update(update_id)))
+        loop.run_until_complete(close_session())
+        loop.close()
+        samples.append(time.perf_counter() - started)
+    return samples
+
+def shared_loop():
+    """Как сейчас: один цикл в отдельном потоке, обновления через run_coroutine_threadsafe"""
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    bot_module.bot.outbound = unlimited()
+
+    def submit(update_id):
+        started = time.perf_counter()
+        asyncio.run_coroutine_threadsafe(bot_module.process_update(start_update(update_id)), loop).result()
+        return time.perf_counter() - started
+
+    sequential = [submit(update_id) for update_id in range(UPDATES, 2 * UPDATES)]
+    # Пачка: 1000 обновлений одновременно из потоков веб-сервера
+    started = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=32) as pool:
+        burst = list(pool.map(submit, range(2 * UPDATES, 3 * UPDATES)))
+    elapsed = time.perf_counter() - started
+    asyncio.run_coroutine_threadsafe(close_session(), loop).result()
+    return sequential, burst, elapsed
+
+def main():
+    logging.disable(logging.INFO)
+    bot_module.bot.server = TelegramAPIServer.from_base(start_stub_server())
+
+    started = time.perf_counter()
+    report("loop per update (sequential)", loop_per_update())
+    print(f"  {UPDATES / (time.perf_counter() - started):.0f} updates/s")
+
+    sequential, burst, elapsed = shared_loop()
+    report("shared loop (sequential)", sequential)
+    report("shared loop (burst, 32 threads)", burst)
+    print(f"  burst: {UPDATES / elapsed:.0f} updates/s")
+
+main()
@@ -0,0 +1,64 @@
+"""Пропускная способность UPSERT статистики Крокодила.
+
+Сравнивает старую схему (SELECT и одна из четырёх веток INSERT/UPDATE,
+транзакция на событие), один UPSERT на событие и пачку событий в одной
+транзакции через apply_stat_deltas (так пишет StatsBuffer).
+
+    python benchmarks/bench_game_stats.py
+"""
+import random
+import time
+
+import _setup
+
+import storage
+
+EVENTS = 20_000
+BATCH = 200
+
+def events(seed: int):
+    rng = random.Random(seed)
+    # Как в живых чатах: сотня чатов, в каждом несколько десятков игроков
+    return [(rng.randint(1, 50), -rng.randint(1, 100), 1, int(rng.random() < 0.2), rng.randint(0, 5))
+            for _ in range(EVENTS)]
+
+def legacy(batch):
+    """Старая update_game_stats: SELECT, затем INSERT или UPDATE"""
+    for user_id, chat_id, _, won, _ in batch:
+        with storage.transaction() as conn:
+            row = conn.execute("SELECT * FROM game_stats WHERE user_id = ? AND chat_id = ?",
+                               (user_id, chat_id)).fetchone()
+            if row:
+                conn.execute('''UPDATE game_stats SET games_played = games_played + 1,
+                                games_won = games_won + ?, last_played = ?
+                                WHERE user_id = ? AND chat_id = ?''',
+                             (won, time.strftime("%Y-%m-%d %H:%M:%S"), user_id, chat_id))
+            else:
+                conn.execute('''INSERT INTO game_stats (user_id, chat_id, games_played, games_won, last_played)
+                                VALUES (?, ?, 1, ?, ?)''', (user_id, chat_id, won, time.strftime("%Y-%m-%d %H:%M:%S")))
+
+def upsert_each(batch):
+    for event in batch:
+        with storage.transaction() as conn:
+            conn.execute(storage._GAME_STATS_UPSERT, event)
+
+def upsert_batched(batch):
+    for i in range(0, len(batch), BATCH):
+        storage.apply_stat_deltas([], batch[i:i + BATCH])
+
+def main():
+    storage.init_db()
+    for name, func in (("SELECT + INSERT/UPDATE", legacy), ("UPSERT per event", upsert_each),
+                       (f"UPSERT batched x{BATCH}", upsert_batched)):
+        with storage.transaction() as conn:
+            conn.execute("DELETE FROM game_stats")
+        batch = events(1)
+        started = time.perf_counter()
+        func(batch)
+        elapsed = time.perf_counter() - started
+        with storage.pool.connection() as conn:
+            played = conn.execute("SELECT SUM(games_played) FROM game_stats").fetchone()[0]
+        assert played == EVENTS
+        print(f"{name:<26} {EVENTS / elapsed:10.0f} events/s")
+
+main()
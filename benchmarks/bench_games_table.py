@@ -0,0 +1,65 @@
+"""Поиск активной игры при 1M завершённых игр в таблице games: без индекса, с частичным индексом и после архивации.
+
+    python benchmarks/bench_games_table.py
+"""
+import random
+from datetime import datetime, timedelta
+
+import _setup
+from _setup import report, timed
+
+import storage
+
+HISTORY = 1_000_000
+CHATS = 5_000
+LOOKUPS = 2_000
+
+# Запрос ai_chat_handler на каждое текстовое сообщение
+HOT_QUERY = "SELECT word, started_at FROM games WHERE chat_id = ? AND active = 1"
+
+def fill_history():
+    rng = random.Random(0)
+    started = datetime(2024, 1, 1)
+    rows = ((-rng.randrange(CHATS), "слон", started + timedelta(minutes=i)) for i in range(HISTORY))
+    with storage.transaction() as conn:
+        conn.executemany("INSERT INTO games (chat_id, game_type, active, word, started_at) "
+                         "VALUES (?, 'crocodile', 0, ?, ?)", rows)
+        # Сейчас идёт игра в каждом десятом чате
+        conn.executemany("INSERT INTO games (chat_id, game_type, active, word, started_at) "
+                         "VALUES (?, 'crocodile', 1, 'кофе', ?)",
+                         [(-chat_id, datetime.now()) for chat_id in range(0, CHATS, 10)])
+
+def lookup(chat_id: int):
+    with storage.pool.connection() as conn:
+        return conn.execute(HOT_QUERY, (chat_id,)).fetchone()
+
+def measure(name: str, chats):
+    report(name, [timed(lookup, chat_id)[0] for chat_id in chats], 1e6, "us")
+
+def main():
+    storage.init_db()
+    fill_history()
+    rng = random.Random(1)
+    chats = [-rng.randrange(CHATS) for _ in range(LOOKUPS)]
+
+    # Без индексов — как до миграции: запрос читает всю таблицу
+    with storage.transaction() as conn:
+        indexes = conn.execute("SELECT name, sql FROM sqlite_master "
+                               "WHERE type = 'index' AND tbl_name = 'games' AND sql IS NOT NULL").fetchall()
+        for name, _ in indexes:
+            conn.execute(f"DROP INDEX {name}")
+    measure(f"full scan, {HISTORY:,} finished rows", chats[:200])
+
+    with storage.transaction() as conn:
+        for _, sql in indexes:
+            conn.execute(sql)
+    with storage.pool.connection() as conn:
+        plan = conn.execute(f"EXPLAIN QUERY PLAN {HOT_QUERY}", (0,)).fetchall()
+    print("  plan:", plan[0][-1])
+    measure(f"partial index, {HISTORY:,} finished rows", chats)
+
+    elapsed, archived = timed(storage.archive_finished_games)
+    print(f"archive_finished_games: {archived:,} rows in {elapsed:.1f} s")
+    measure("partial index, after archiving", chats)
+
+main()
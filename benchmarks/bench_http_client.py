@@ -0,0 +1,94 @@
+"""500 последовательных запросов погоды и Википедии к локальной HTTPS-заглушке:
+новая ClientSession на каждый вызов против общего http_client.
+
+    python benchmarks/bench_http_client.py
+
+Нужен openssl в PATH: им выпускается самоподписанный сертификат заглушки.
+"""
+import os
+import subprocess
+
+import _setup
+from _setup import TMP_DIR, report
+
+# Сертификат выпускаем до импорта aiohttp: он читает SSL_CERT_FILE при импорте
+CERT = os.path.join(TMP_DIR, "stub.pem")
+KEY = os.path.join(TMP_DIR, "stub.key")
+subprocess.run(["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+                "-keyout", KEY, "-out", CERT, "-subj", "/CN=127.0.0.1",
+                "-addext", "subjectAltName=IP:127.0.0.1"], check=True, capture_output=True)
+os.environ["SSL_CERT_FILE"] = CERT
+
+import asyncio
+import logging
+import ssl
+import time
+
+import aiohttp
+from aiohttp import web
+
+import weather_service
+from http_client import http_client
+
+CALLS = 500
+CITY = "Липецк"
+WIKI_PARAMS = {"action": "query", "list": "search", "srsearch": "слон", "srlimit": 5, "format": "json", "utf8": 1}
+
+async def fake_weather(request: web.Request):
+    return web.json_response({"current": {"temperature_2m": 12.5, "weather_code": 3},
+                              "daily": {"temperature_2m_max": [15], "temperature_2m_min": [8]}})
+
+async def fake_wiki(request: web.Request):
+    return web.json_response({"query": {"search": [{"title": "Слон", "snippet": "млекопитающее"}]}})
+
+async def old_get_weather(url: str):
+    """Как было: своя сессия (TCP + TLS + DNS) на каждый запрос"""
+    async with aiohttp.ClientSession() as session:
+        async with session.get(url) as response:
+            return await response.json()
+
+async def old_search_wiki(url: str):
+    async with aiohttp.ClientSession() as session:
+        async with session.get(url, params=WIKI_PARAMS) as response:
+            return await response.json()
+
+async def search_wiki(url: str):
+    async with http_client.session.get(url, params=WIKI_PARAMS, timeout=http_client.timeout("wiki")) as response:
+        return await response.json()
+
+async def sequential(call):
+    samples = []
+    for _ in range(CALLS):
+        started = time.perf_counter()
+        await call()
+        samples.append(time.perf_counter() - started)
+    return samples
+
+async def main():
+    stub = web.Application()
+    stub.router.add_get("/v1/forecast", fake_weather)
+    stub.router.add_get("/w/api.php", fake_wiki)
+    context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+    context.load_cert_chain(CERT, KEY)
+    runner = web.AppRunner(stub, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0, ssl_context=context)
+    await site.start()
+    try:
+        base = f"https://127.0.0.1:{site._server.sockets[0].getsockname()[1]}"
+        weather_service.WEATHER_API_URL = f"{base}/v1/forecast"
+
+        report("weather: session per call", await sequential(lambda: old_get_weather(f"{base}/v1/forecast")))
+        await http_client.start()
+        status, _ = await weather_service.get_weather(CITY)
+        assert status == "success"
+        report("weather: shared http_client", await sequential(lambda: weather_service.get_weather(CITY)))
+
+        report("wiki: session per call", await sequential(lambda: old_search_wiki(f"{base}/w/api.php")))
+        report("wiki: shared http_client", await sequential(lambda: search_wiki(f"{base}/w/api.php")))
+        await http_client.close()
+    finally:
+        await runner.cleanup()
+
+logging.disable(logging.INFO)
+asyncio.run(main())
@@ -0,0 +1,56 @@
+"""Топ кармы в чате со 100k пользователями: ORDER BY по индексу против топа в памяти.
+
+    python benchmarks/bench_leaderboard.py
+"""
+import asyncio
+import random
+
+import _setup
+from _setup import report, timed
+
+import storage
+from leaderboard import Leaderboard
+
+CHAT = -1
+USERS = 100_000
+READS = 2_000
+UPDATES = 20_000
+
+async def main():
+    storage.init_db()
+    rng = random.Random(0)
+    storage.apply_stat_deltas([(user_id, CHAT, rng.randint(0, 5000)) for user_id in range(USERS)], [])
+    with storage.pool.connection() as conn:
+        print("plan:", conn.execute("EXPLAIN QUERY PLAN SELECT user_id, karma FROM karma WHERE chat_id = ? "
+                                    "ORDER BY karma DESC, user_id LIMIT 10", (CHAT,)).fetchall())
+
+    sql = [timed(storage.get_top_karma, CHAT, 10)[0] for _ in range(READS)]
+    report(f"SQL top-10 ({USERS} users)", sql)
+
+    async def loader(chat_id, limit):
+        return storage.get_top_karma(chat_id, limit)
+    board = Leaderboard(loader)
+    await board.top(CHAT)
+
+    cached = []
+    for _ in range(READS):
+        started = asyncio.get_running_loop().time()
+        await board.top(CHAT)
+        cached.append(asyncio.get_running_loop().time() - started)
+    report("cached top-10", cached)
+
+    # Приращения: как add_karma — новое значение счёта в update()
+    scores = dict(storage.get_top_karma(CHAT, USERS))
+    deltas, updates = [], []
+    for _ in range(UPDATES):
+        user_id, delta = rng.randrange(USERS), rng.choice((1, 1, 2, 5, -1))
+        scores[user_id] += delta
+        deltas.append((user_id, CHAT, delta))
+        updates.append(timed(board.update, CHAT, (user_id, scores[user_id]))[0])
+    report("update()", updates, 1e6, "us")
+
+    storage.apply_stat_deltas(deltas, [])
+    assert await board.top(CHAT) == storage.get_top_karma(CHAT, 10)
+    print("after updates: cached top == SQL top;", board.stats())
+
+asyncio.run(main())
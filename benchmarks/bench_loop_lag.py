@@ -0,0 +1,86 @@
+"""Задержка event loop под параллельной нагрузкой на SQLite: DB_OFFLOAD=1 (фасад) против DB_OFFLOAD=0.
+
+    python benchmarks/bench_loop_lag.py
+
+Обработчики выбирают слово ORDER BY RANDOM() (как /crocodile до word_bank),
+пишут карму и читают топ чата — через db.read / db.write, как обёртки
+async_storage. LoopLagProbe меряет, насколько позже просыпается цикл.
+"""
+import asyncio
+import random
+
+import _setup
+from _setup import percentile
+
+import async_storage as db
+import storage
+from loop_monitor import LoopLagProbe
+
+WORDS = 20_000
+HANDLERS = 20
+DURATION = 3.0
+
+class SampledProbe(LoopLagProbe):
+    """LoopLagProbe, который дополнительно хранит все замеры для перцентилей"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.lags = []
+
+    def record(self, lag_ms: float):
+        super().record(lag_ms)
+        self.lags.append(lag_ms)
+
+def random_word():
+    with storage.pool.connection() as conn:
+        return conn.execute("SELECT word, description FROM game_words ORDER BY RANDOM() LIMIT 1").fetchone()
+
+def add_karma(user_id: int, chat_id: int):
+    with storage.transaction() as conn:
+        conn.execute("INSERT INTO karma (user_id, chat_id, karma) VALUES (?, ?, 1) "
+                     "ON CONFLICT(user_id, chat_id) DO UPDATE SET karma = karma + 1", (user_id, chat_id))
+
+def top_karma(chat_id: int):
+    with storage.pool.connection() as conn:
+        return conn.execute("SELECT user_id, karma FROM karma WHERE chat_id = ? ORDER BY karma DESC LIMIT 10",
+                            (chat_id,)).fetchall()
+
+async def handler(rng: random.Random, stop: asyncio.Event):
+    chat_id = -rng.randint(1, 50)
+    while not stop.is_set():
+        await db.read(random_word)
+        await db.write(add_karma, rng.randint(1, 5000), chat_id)
+        await db.read(top_karma, chat_id)
+        # Ответ в Telegram: без этого при DB_OFFLOAD=0 обработчики вообще не отдают цикл
+        await asyncio.sleep(0.001)
+
+async def run(offload: bool) -> SampledProbe:
+    db.DB_OFFLOAD = offload  # то же, что запуск с DB_OFFLOAD=1 / DB_OFFLOAD=0
+    probe = SampledProbe(interval=0.01, warn_ms=float("inf"))
+    stop = asyncio.Event()
+    probe_task = asyncio.create_task(probe.run())
+    rng = random.Random(0)
+    handlers = [asyncio.create_task(handler(rng, stop)) for _ in range(HANDLERS)]
+    await asyncio.sleep(DURATION)
+    stop.set()
+    await asyncio.gather(*handlers)
+    probe_task.cancel()
+    return probe
+
+def print_histogram(name: str, probe: SampledProbe):
+    print(f"{name}: {probe.samples} samples   p50 {percentile(probe.lags, 0.5):7.2f} ms   "
+          f"p99 {percentile(probe.lags, 0.99):7.2f} ms   max {probe.max_ms:7.2f} ms")
+    for bucket, count in probe.stats()["histogram"].items():
+        print(f"  {bucket:>8} {count:6d} {'#' * round(60 * count / probe.samples)}")
+
+def main():
+    storage.init_db()
+    with storage.transaction() as conn:
+        conn.executemany("INSERT OR IGNORE INTO game_words (word, description, added_by, added_at) VALUES (?, ?, 0, 0)",
+                         [(f"слово{i}", f"описание слова номер {i}") for i in range(WORDS)])
+
+    print_histogram("DB_OFFLOAD=1 (async facade)", asyncio.run(run(True)))
+    print_histogram("DB_OFFLOAD=0 (inline)", asyncio.run(run(False)))
+    db.shutdown()
+
+main()
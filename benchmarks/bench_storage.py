@@ -0,0 +1,91 @@
+"""ops/sec для add_karma и поиска активной игры: sqlite3.connect на каждый вызов против пула storage.
+
+    python benchmarks/bench_storage.py
+"""
+import os
+import random
+import sqlite3
+import time
+from datetime import datetime
+
+import _setup
+from _setup import TMP_DIR
+
+import storage
+from game_registry import GameRegistry
+
+OPS = 5_000
+CHATS = 200
+
+OLD_DB = os.path.join(TMP_DIR, "old.db")
+
+def old_schema():
+    """Схема и настройки по умолчанию, как в init_db() до storage.py"""
+    conn = sqlite3.connect(OLD_DB)
+    conn.execute('''CREATE TABLE IF NOT EXISTS karma
+                    (user_id INTEGER, chat_id INTEGER, karma INTEGER DEFAULT 0,
+                     PRIMARY KEY (user_id, chat_id))''')
+    conn.execute('''CREATE TABLE IF NOT EXISTS games
+                    (chat_id INTEGER, game_type TEXT, active INTEGER,
+                     word TEXT, players TEXT, started_at TIMESTAMP)''')
+    conn.executemany("INSERT INTO games VALUES (?, 'crocodile', ?, 'слон', '', ?)",
+                     [(-chat_id, int(chat_id % 10 == 0), datetime.now()) for chat_id in range(CHATS)])
+    conn.commit()
+    conn.close()
+
+def old_add_karma(user_id: int, chat_id: int, value: int = 1):
+    conn = sqlite3.connect(OLD_DB)
+    c = conn.cursor()
+    c.execute('''INSERT INTO karma (user_id, chat_id, karma)
+                 VALUES (?, ?, ?)
+                 ON CONFLICT(user_id, chat_id)
+                 DO UPDATE SET karma = karma + ?''',
+              (user_id, chat_id, value, value))
+    conn.commit()
+    conn.close()
+
+def old_active_game(chat_id: int):
+    conn = sqlite3.connect(OLD_DB)
+    c = conn.cursor()
+    c.execute("SELECT * FROM games WHERE chat_id = ? AND active = 1", (chat_id,))
+    game = c.fetchone()
+    conn.close()
+    return game
+
+def pooled_active_game(chat_id: int):
+    with storage.pool.connection() as conn:
+        return conn.execute("SELECT word, started_at FROM games WHERE chat_id = ? AND active = 1",
+                            (chat_id,)).fetchone()
+
+def ops_per_sec(name: str, func, args):
+    started = time.perf_counter()
+    for call in args:
+        func(*call)
+    elapsed = time.perf_counter() - started
+    print(f"{name:<45} {len(args) / elapsed:>10,.0f} ops/s")
+
+def main():
+    old_schema()
+    storage.init_db()
+    registry = GameRegistry()
+    for chat_id in range(0, CHATS, 10):
+        storage.start_game(-chat_id, "слон", datetime.now())
+    registry.load(storage.get_active_games())
+
+    rng = random.Random(0)
+    karma = [(rng.randint(1, 1000), -rng.randrange(CHATS), 1) for _ in range(OPS)]
+    lookups = [(-rng.randrange(CHATS),) for _ in range(OPS)]
+
+    ops_per_sec("add_karma: connect per call", old_add_karma, karma)
+    ops_per_sec("add_karma: pool (one delta per call)",
+                lambda *row: storage.apply_stat_deltas([row], []), karma)
+    # Так пишет бот: StatsBuffer копит приращения и сбрасывает их пачкой
+    started = time.perf_counter()
+    storage.apply_stat_deltas(karma, [])
+    print(f"{'add_karma: pool (batched flush)':<45} {OPS / (time.perf_counter() - started):>10,.0f} ops/s")
+
+    ops_per_sec("active game: connect per call", old_active_game, lookups)
+    ops_per_sec("active game: pool + partial index", pooled_active_game, lookups)
+    ops_per_sec("active game: GameRegistry (in memory)", registry.get, lookups)
+
+main()
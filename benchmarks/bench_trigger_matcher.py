@@ -0,0 +1,64 @@
+"""Проверка слов-триггеров на 100k сообщений чата: старый цикл против TriggerMatcher.
+
+    python benchmarks/bench_trigger_matcher.py
+"""
+import random
+import time
+
+import _setup
+
+from trigger_matcher import DEFAULT_TRIGGERS, TriggerRegistry
+
+MESSAGES = 100_000
+
+PHRASES = [
+    "привет всем", "кто идёт вечером гулять?", "скинь фотку", "ахаха", "ну такое",
+    "я на работе до шести", "сегодня опять дождь", "купил новый телефон", "ок",
+    "кто смотрел вчерашний матч?", "роботы захватят мир", "какая эйфория", "спасибо!",
+    "завтра созвон в 10", "давайте в пятницу", "это же дружба", "а где все?",
+]
+APPEALS = ["бот, ", "Бот ", "эй, ", "болталка ", "друг, ", "помоги ", "@croco_bot "]
+
+def corpus(rng: random.Random):
+    """Обычная переписка: примерно каждое десятое сообщение — обращение к боту"""
+    for _ in range(MESSAGES):
+        text = " ".join(rng.choice(PHRASES) for _ in range(rng.randint(1, 4)))
+        if rng.random() < 0.1:
+            text = rng.choice(APPEALS) + text
+        yield -rng.randint(1, 1000), text
+
+def old_loop(text: str):
+    """Как было в ai_chat_handler: подстрока и case-sensitive replace"""
+    text_lower = text.lower()
+    should_reply = False
+    for word in DEFAULT_TRIGGERS:
+        if word.lower() in text_lower:
+            should_reply = True
+            break
+    prompt = text
+    if should_reply:
+        for word in DEFAULT_TRIGGERS:
+            prompt = prompt.replace(word, "").strip()
+    return should_reply, prompt
+
+def run(name, func, messages):
+    started = time.perf_counter()
+    replies = sum(func(chat_id, text)[0] for chat_id, text in messages)
+    elapsed = time.perf_counter() - started
+    print(f"{name:<40} {elapsed * 1e3:8.1f} ms   {elapsed / len(messages) * 1e6:6.2f} us/msg   "
+          f"replies {replies}")
+
+def main():
+    messages = list(corpus(random.Random(0)))
+    run("old substring loop", lambda chat_id, text: old_loop(text), messages)
+
+    registry = TriggerRegistry()
+    registry.set_mention("croco_bot")
+    run("TriggerRegistry (defaults)", registry.match, messages)
+
+    # Сотне чатов добавлены свои слова
+    registry.load([(-chat_id, f"кеша{chat_id % 5}") for chat_id in range(1, 101)])
+    run("TriggerRegistry (100 custom chats)", registry.match, messages)
+    print(f"compiled matchers: {registry.stats()['compiled']}")
+
+main()
@@ -0,0 +1,78 @@
+"""Нагрузочный тест aiohttp-режима (SERVER_MODE=aiohttp): сколько обновлений один процесс держит одновременно.
+
+    python benchmarks/bench_web_app.py
+
+Bot API — локальная заглушка, которая отвечает с задержкой TELEGRAM_LATENCY,
+как медленный внешний вызов. Синхронный воркер обрабатывал бы такие
+обновления по одному (около 1 / TELEGRAM_LATENCY в секунду).
+"""
+import asyncio
+import logging
+import time
+
+import _setup
+from _setup import report
+
+from aiogram import Bot, Dispatcher
+from aiogram.bot.api import TelegramAPIServer
+from aiohttp import ClientSession, web
+from aiohttp.test_utils import TestServer
+
+import bot as bot_module
+import web_app
+from outbound import OutboundLimiter
+
+TELEGRAM_LATENCY = 0.2
+CONCURRENCY = (1, 50, 200, 500)
+
+async def fake_telegram(request: web.Request):
+    data = await request.post()
+    await asyncio.sleep(TELEGRAM_LATENCY)
+    chat_id = int(data.get("chat_id", 0))
+    return web.json_response({"ok": True, "result": {
+        "message_id": 1, "date": 0, "chat": {"id": chat_id, "type": "private"}, "text": data.get("text", "")}})
+
+def start_update(update_id: int) -> dict:
+    chat_id = 10_000 + update_id  # разные чаты: внутри одного чата обновления идут по очереди
+    return {"update_id": update_id, "message": {
+        "message_id": update_id, "date": 0, "text": "/start",
+        "entities": [{"type": "bot_command", "offset": 0, "length": 6}],
+        "chat": {"id": chat_id, "type": "private"},
+        "from": {"id": chat_id, "is_bot": False, "first_name": "Bench"}}}
+
+async def load(session: ClientSession, url: str, concurrency: int, first_id: int):
+    async def post(update_id):
+        started = time.perf_counter()
+        async with session.post(url, json=start_update(update_id)) as response:
+            assert response.status == 200, response.status
+        return time.perf_counter() - started
+
+    started = time.perf_counter()
+    samples = await asyncio.gather(*(post(first_id + i) for i in range(concurrency)))
+    return samples, time.perf_counter() - started
+
+async def main():
+    telegram_stub = web.Application()
+    telegram_stub.router.add_post("/{path:.*}", fake_telegram)
+    async with TestServer(telegram_stub) as telegram:
+        bot_module.bot.server = TelegramAPIServer.from_base(str(telegram.make_url("")).rstrip("/"))
+        bot_module.bot.outbound = OutboundLimiter(global_rate=1_000_000)  # лимиты Telegram здесь не измеряем
+
+        app = web_app.create_app()
+        app.on_startup.clear()  # фоновые задачи (планировщик и т.д.) в тесте не нужны
+        app.on_shutdown.clear()
+        Bot.set_current(bot_module.bot)
+        Dispatcher.set_current(bot_module.dp)
+        async with TestServer(app) as server, ClientSession() as session:
+            url = str(server.make_url("/webhook"))
+            first_id = 0
+            for concurrency in CONCURRENCY:
+                samples, elapsed = await load(session, url, concurrency, first_id)
+                first_id += concurrency
+                report(f"{concurrency} concurrent updates", samples)
+                print(f"  {concurrency / elapsed:.0f} updates/s "
+                      f"(синхронный воркер: ~{1 / TELEGRAM_LATENCY:.0f}/s)")
+        await (await bot_module.bot.get_session()).close()
+
+logging.disable(logging.INFO)
+asyncio.run(main())
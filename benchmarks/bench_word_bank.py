@@ -0,0 +1,46 @@
+"""Выбор слова для Крокодила при 100k слов: ORDER BY RANDOM() против WordBank.
+
+    python benchmarks/bench_word_bank.py
+"""
+import random
+
+import _setup
+from _setup import report, timed
+
+import storage
+from word_bank import WordBank
+
+WORDS = 100_000
+PICKS = 2_000
+
+def main():
+    storage.init_db()
+    with storage.transaction() as conn:
+        conn.executemany("INSERT OR IGNORE INTO game_words (word, description, added_by, added_at) VALUES (?, ?, 0, 0)",
+                         [(f"слово{i}", f"описание слова номер {i}") for i in range(WORDS)])
+
+    def order_by_random():
+        # Старая схема: сортировка всей таблицы и отдельный запрос описания
+        with storage.pool.connection() as conn:
+            word, description = conn.execute("SELECT word, description FROM game_words "
+                                             "ORDER BY RANDOM() LIMIT 1").fetchone()
+            conn.execute("SELECT description FROM game_words WHERE word = ?", (word,)).fetchone()
+        return word
+
+    report("ORDER BY RANDOM() + description", [timed(order_by_random)[0] for _ in range(200)])
+
+    bank = WordBank()
+    load, _ = timed(bank.load, storage.get_all_words())
+    print(f"WordBank.load({len(bank)} words): {load * 1e3:.1f} ms")
+
+    rng = random.Random(0)
+    report("WordBank.pick(chat)", [timed(bank.pick, -rng.randint(1, 100))[0] for _ in range(PICKS)], 1e6, "us")
+    report("WordBank.describe", [timed(bank.describe, f"слово{rng.randrange(WORDS)}")[0]
+                                 for _ in range(PICKS)], 1e6, "us")
+    report("WordBank.add (/addword)", [timed(bank.add, f"новое{i}", "описание")[0] for i in range(PICKS)], 1e6, "us")
+
+    # Недавние слова чата не повторяются
+    picks = [bank.pick(-1)[0] for _ in range(bank.recent_size)]
+    assert len(set(picks)) == len(picks)
+
+main()
@@ -1,21 +1,38 @@
-from aiogram import types
-import openai
-from openai.error import AuthenticationError, RateLimitError, APIConnectionError, APIError
 import asyncio
 import logging
 import random
-import sqlite3
-import aiohttp
-import json
 import time
-from datetime import datetime
+from datetime import date, datetime
+from typing import Dict, List
 from aiogram import Bot, Dispatcher, types
 from aiogram.contrib.middlewares.logging import LoggingMiddleware
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
-from config import BOT_TOKEN, MEGANOVA_API_KEY
+from config import (BOT_TOKEN, MEGANOVA_API_KEY, ASYNC_INGEST, UPDATE_QUEUE_SIZE, UPDATE_WORKERS,
+                    CHAT_DISPATCH_CONCURRENCY, AI_STREAMING, AI_STREAM_EDIT_INTERVAL,
+                    AI_ECONOMY_MAX_TOKENS, BOT_ADMIN_IDS)
+from update_queue import UpdateQueue
+from chat_dispatcher import ChatDispatcher
+import storage
+import async_storage as db
+from loop_monitor import loop_lag_probe
+from game_registry import game_registry
+from word_bank import word_bank
+from http_client import http_client
+from weather_broadcast import WeatherBroadcaster
+from outbound import ThrottledBot, bulk_sends
+from profile_cache import ProfileMiddleware, profile_cache
+from leaderboard import karma_leaderboard, crocodile_leaderboard
+from stats_buffer import stats_buffer
+from conversation_memory import conversation_store
+from completion_cache import completion_cache, cache_key
+from streaming_reply import StreamingMessage, streaming_stats
+from llm_client import LLMClient, LLMUnavailable
+from usage_ledger import usage_ledger, NORMAL as NORMAL_LEVEL, ECONOMY, EXHAUSTED
+from trigger_matcher import trigger_registry
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
 
 # ================ ИМПОРТЫ ДЛЯ ПОГОДЫ ================
-from weather_service import get_weather_with_retry, format_weather_message
+from weather_service import CITIES, render_weather_messages, weather_cache
 # ====================================================
 
 # Словарь для защиты от спама (время последнего сообщения пользователя)
@@ -65,75 +82,58 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Инициализация бота и диспетчера
-bot = Bot(token=BOT_TOKEN, parse_mode="HTML")
+# Все отправки идут через лимиты Telegram (см. outbound.py)
+bot = ThrottledBot(token=BOT_TOKEN, parse_mode="HTML")
 dp = Dispatcher(bot)
 dp.middleware.setup(LoggingMiddleware())
+dp.middleware.setup(ProfileMiddleware(profile_cache))
 
 # ================ ФОНОВЫЕ ЗАДАЧИ ================
 
-async def game_timeout_checker():
-    """Фоновая задача: проверяет активные игры и завершает просроченные"""
+async def announce_game_timeout(game):
+    """Сообщает в чат, что время игры вышло (вызывается планировщиком сроков)"""
+    await record_game_result(game)
+    try:
+        # Объявления уступают ответам пользователям, если игр истекло много
+        with bulk_sends():
+            await bot.send_message(
+                game.chat_id,
+                f"⏰ Время вышло! Никто не угадал слово *{game.word}*.\n"
+                f"Можете начать новую игру: /crocodile"
+            )
+    except Exception as e:
+        logger.warning(f"Не удалось объявить конец игры в чате {game.chat_id}: {e}")
+
+game_registry.on_expire = announce_game_timeout
+
+async def games_archiver():
+    """Фоновая задача: раз в час переносит завершённые игры в архив"""
     while True:
+        await asyncio.sleep(3600)
         try:
-            conn = sqlite3.connect('bot_database.db')
-            c = conn.cursor()
-            
-            # Ишем все активные игры старше 5 минут
-            c.execute('''SELECT chat_id, word FROM games 
-                         WHERE game_type = 'crocodile' AND active = 1 
-                         AND datetime(started_at) < datetime('now', '-5 minutes')''')
-            expired_games = c.fetchall()
-            
-            for chat_id, word in expired_games:
-                # Завершаем игру
-                c.execute("UPDATE games SET active = 0 WHERE chat_id = ? AND game_type = 'crocodile'", 
-                          (chat_id,))
-                conn.commit()
-                
-                # Отправляем сообщение в чат
-                try:
-                    await bot.send_message(
-                        chat_id,
-                        f"⏰ Время вышло! Никто не угадал слово *{word}*.\n"
-                        f"Можете начать новую игру: /crocodile"
-                    )
-                except:
-                    pass  # Если не можем отправить — игнорируем
-            
-            conn.close()
-            
+            archived = await db.archive_finished_games()
+            if archived:
+                logger.info(f"🗄️ В архив перенесено {archived} завершённых игр")
         except Exception as e:
-            logger.error(f"Ошибка в game_timeout_checker: {e}")
-        
-        # Проверяем каждые 60 секунд
-        await asyncio.sleep(60)
+            logger.error(f"Ошибка в games_archiver: {e}")
 
 # =================== УНИВЕРСАЛЬНАЯ ФУНКЦИЯ ДЛЯ ПОГОДЫ ===================
 
-async def send_weather_to_chat(chat_id: int):
-    """Отправляет погоду в указанный чат"""
+async def send_weather_to_chat(chat_id: int, cities: List[str] = None,
+                               rendered: Dict[str, str] = None, send=None):
+    """Отправляет погоду в указанный чат.
+    Рассылка передаёт уже готовые тексты (rendered) и свою отправку с лимитами (send)."""
     try:
         logger.info(f"🌅 Запуск рассылки погоды в чат {chat_id}")
         
-        weather_messages = []
+        cities = cities or list(CITIES)
+        if rendered is None:
+            # Все города — одним запросом к Open-Meteo (или из кэша)
+            rendered = await render_weather_messages(cities)
         
-        for city in ["Славянск-на-Кубани", "Липецк"]:
-            status, weather_data = await get_weather_with_retry(city)
-            
-            if status == "success":
-                message = format_weather_message(city, weather_data)
-                weather_messages.append(message)
-                await asyncio.sleep(2)
-            else:
-                logger.error(f"Не удалось получить погоду для {city}")
-                await bot.send_message(
-                    chat_id,
-                    f"🌅 Доброе утро! Не удалось получить погоду для {city}, но день всё равно будет хорошим! ☀️"
-                )
-        
-        for msg in weather_messages:
-            await bot.send_message(chat_id, msg, parse_mode="Markdown")
-            await asyncio.sleep(1)
+        send = send or bot.send_message
+        for city in cities:
+            await send(chat_id, rendered[city], parse_mode="Markdown")
             
     except Exception as e:
         logger.error(f"Ошибка в рассылке погоды: {e}")
@@ -157,106 +157,75 @@ async def cmd_testweather(message: types.Message):
         # Пробуем отправить простое сообщение, если что-то пошло не так
         await message.answer("✅ Погода отправлена!")
 
-# ============== СТАРАЯ ФУНКЦИЯ ДЛЯ СОВМЕСТИМОСТИ ==============
-async def send_morning_weather():
-    """Отправляет погоду в группу по умолчанию"""
-    GROUP_CHAT_ID = -4722324078
-    await send_weather_to_chat(GROUP_CHAT_ID)
+# ============== ПОДПИСКА НА УТРЕННЮЮ ПОГОДУ ==============
 
-# ================ БАЗА ДАННЫХ ================
+weather_broadcaster = WeatherBroadcaster(bot, send_weather_to_chat)
 
-def init_db():
-    """Инициализация базы данных SQLite"""
-    conn = sqlite3.connect('bot_database.db')
-    c = conn.cursor()
-    
-    # Таблица кармы
-    c.execute('''CREATE TABLE IF NOT EXISTS karma
-                 (user_id INTEGER, chat_id INTEGER, karma INTEGER DEFAULT 0,
-                  PRIMARY KEY (user_id, chat_id))''')
-    
-    # Таблица игр
-    c.execute('''CREATE TABLE IF NOT EXISTS games
-                 (chat_id INTEGER, game_type TEXT, active INTEGER, 
-                  word TEXT, players TEXT, started_at TIMESTAMP)''')
-    
-    # Таблица пар дня
-    c.execute('''CREATE TABLE IF NOT EXISTS couples
-                 (chat_id INTEGER, user1_id INTEGER, user2_id INTEGER, 
-                  date TEXT)''')
-    
-    # Таблица слов для игры с описанием
-    c.execute('''CREATE TABLE IF NOT EXISTS game_words
-                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                  word TEXT UNIQUE,
-                  description TEXT,
-                  added_by INTEGER,
-                  added_at TIMESTAMP)''')
-    
-    # ===== НОВАЯ ТАБЛИЦА ДЛЯ СТАТИСТИКИ КРОКОДИЛА =====
-    c.execute('''CREATE TABLE IF NOT EXISTS game_stats
-                 (user_id INTEGER,
-                  chat_id INTEGER,
-                  games_played INTEGER DEFAULT 0,
-                  games_won INTEGER DEFAULT 0,
-                  total_guesses INTEGER DEFAULT 0,
-                  last_played TIMESTAMP,
-                  PRIMARY KEY (user_id, chat_id))''')
-    # ==================================================
-    
-    conn.commit()
-    
-    # Добавляем начальные слова и описания, если таблица пуста
-    c.execute("SELECT COUNT(*) FROM game_words")
-    count = c.fetchone()[0]
-    if count == 0:
-        default_words = {
-            "крокодил": "зелёное зубастое животное, которое живёт в реках и любит плавать",
-            "слон": "огромное серое животное с длинным хоботом и большими ушами",
-            "робот": "механическое устройство, которое может выполнять команды человека",
-            "пицца": "итальянское блюдо: круглая лепёшка с томатным соусом и сыром",
-            "самолёт": "летательный аппарат с крыльями, который перевозит людей и грузы",
-            "кофе": "ароматный напиток из зёрен, бодрит по утрам",
-            "гитара": "музыкальный инструмент с шестью струнами и грифом",
-            "радуга": "разноцветная дуга на небе после дождя",
-            "космос": "бесконечное пространство со звёздами и планетами за пределами Земли",
-            "шоколад": "сладкое лакомство из какао-бобов, бывает молочным и горьким",
-            "интернет": "глобальная сеть, которая соединяет компьютеры по всему миру",
-            "дружба": "близкие отношения между людьми, основанные на доверии и взаимопомощи",
-            "солнце": "звезда, которая даёт нам свет и тепло",
-            "море": "огромное солёное водное пространство",
-            "поезд": "транспортное средство из вагонов, которое движется по рельсам",
-            "телефон": "устройство для связи с людьми на расстоянии",
-            "компьютер": "электронная машина для работы, игр и выхода в интернет",
-            "книга": "печатное издание с текстом и картинками",
-            "цветок": "растение с красивыми лепестками и приятным запахом",
-            "дождь": "атмосферные осадки в виде капель воды"
-        }
-        
-        for word, description in default_words.items():
-            try:
-                c.execute("INSERT INTO game_words (word, description, added_by, added_at) VALUES (?, ?, ?, ?)",
-                          (word, description, 0, datetime.now()))
-            except:
-                pass
-        conn.commit()
-        logger.info("Добавлены начальные слова для игры с описаниями")
+# Планировщик: раз в минуту проверяет, кому пора отправить погоду.
+# Если цикл был занят и тик опоздал, запуск всё равно выполняется
+# (в пределах 50 секунд, до следующего тика), а не пропускается молча
+scheduler = AsyncIOScheduler(timezone="Europe/Moscow")
+scheduler.add_job(weather_broadcaster.run_due, "cron", second=0,
+                  id="weather_broadcast", max_instances=1, coalesce=True,
+                  misfire_grace_time=50)
+
+@dp.message_handler(commands=['weather_subscribe'])
+async def cmd_weather_subscribe(message: types.Message):
+    """Подписывает чат на ежедневную погоду: /weather_subscribe 08:00 Липецк, Славянск-на-Кубани"""
+    if message.chat.type != 'private' and not await is_user_admin(message):
+        await message.answer("❌ Только администраторы могут настраивать рассылку погоды")
+        return
+    
+    args = message.get_args().split(maxsplit=1)
+    send_time = args[0] if args else "08:00"
+    try:
+        send_time = datetime.strptime(send_time, "%H:%M").strftime("%H:%M")
+    except ValueError:
+        await message.answer(
+            "❌ Формат: /weather_subscribe ЧЧ:ММ [город, город]\n"
+            "Например: /weather_subscribe 08:00 Липецк"
+        )
+        return
     
-    conn.close()
-    logger.info("База данных инициализирована")
+    if len(args) > 1:
+        cities = [city.strip() for city in args[1].split(",") if city.strip()]
+    else:
+        cities = list(CITIES)
+    unknown = [city for city in cities if city not in CITIES]
+    if unknown or not cities:
+        await message.answer(f"❌ Не знаю такие города: {', '.join(unknown)}\nДоступны: {', '.join(CITIES)}")
+        return
+    
+    await db.subscribe_weather(message.chat.id, cities, send_time)
+    await message.answer(f"✅ Погода для {', '.join(cities)} будет приходить каждый день в {send_time} (МСК)")
 
-# Создаем таблицы при запуске
-init_db()
+@dp.message_handler(commands=['weather_unsubscribe'])
+async def cmd_weather_unsubscribe(message: types.Message):
+    """Отписывает чат от ежедневной погоды"""
+    if message.chat.type != 'private' and not await is_user_admin(message):
+        await message.answer("❌ Только администраторы могут настраивать рассылку погоды")
+        return
+    
+    if await db.unsubscribe_weather(message.chat.id):
+        await message.answer("✅ Рассылка погоды отключена")
+    else:
+        await message.answer("ℹ️ Этот чат не подписан на погоду")
+
+# ================ БАЗА ДАННЫХ ================
+
+# Создаем таблицы при запуске и восстанавливаем активные игры
+storage.init_db()
+game_registry.load(storage.get_active_games())
+word_bank.load(storage.get_all_words())
+profile_cache.load(storage.get_user_profiles())
+usage_ledger.load(storage.get_ai_usage_by_chat(date.today().isoformat()))
+trigger_registry.load(storage.get_chat_triggers())
 
 # ================ ФУНКЦИИ ДЛЯ ИГРОВЫХ СЛОВ ================
 
-def get_random_word_with_description():
-    """Возвращает случайное слово и его описание из базы"""
-    conn = sqlite3.connect('bot_database.db')
-    c = conn.cursor()
-    c.execute("SELECT word, description FROM game_words ORDER BY RANDOM() LIMIT 1")
-    result = c.fetchone()
-    conn.close()
+def get_random_word_with_description(chat_id: int = None):
+    """Возвращает случайное слово и его описание, избегая недавних слов чата"""
+    result = word_bank.pick(chat_id)
     
     if result:
         return result[0], result[1]  # слово, описание
@@ -297,69 +266,38 @@ def get_hint(guess: str, target: str) -> str:
         return "⬇️ Слово длиннее загаданного"
 
 # ================ НОВАЯ ФУНКЦИЯ ДЛЯ СТАТИСТИКИ ================
-def update_game_stats(user_id: int, chat_id: int, won: bool = False):
-    """Обновляет статистику игрока в Крокодиле"""
-    conn = sqlite3.connect('bot_database.db')
-    c = conn.cursor()
-    
-    # Проверяем, есть ли запись
-    c.execute("SELECT * FROM game_stats WHERE user_id = ? AND chat_id = ?", (user_id, chat_id))
-    if c.fetchone():
-        # Обновляем существующую
-        if won:
-            c.execute('''UPDATE game_stats 
-                         SET games_played = games_played + 1,
-                             games_won = games_won + 1,
-                             last_played = ?
-                         WHERE user_id = ? AND chat_id = ?''',
-                      (datetime.now(), user_id, chat_id))
-        else:
-            c.execute('''UPDATE game_stats 
-                         SET games_played = games_played + 1,
-                             last_played = ?
-                         WHERE user_id = ? AND chat_id = ?''',
-                      (datetime.now(), user_id, chat_id))
-    else:
-        # Создаём новую запись
-        if won:
-            c.execute('''INSERT INTO game_stats (user_id, chat_id, games_played, games_won, last_played)
-                         VALUES (?, ?, 1, 1, ?)''',
-                      (user_id, chat_id, datetime.now()))
-        else:
-            c.execute('''INSERT INTO game_stats (user_id, chat_id, games_played, games_won, last_played)
-                         VALUES (?, ?, 1, 0, ?)''',
-                      (user_id, chat_id, datetime.now()))
-    
-    conn.commit()
-    conn.close()
+async def update_game_stats(user_id: int, chat_id: int, won: bool = False):
+    """Обновляет статистику игрока в Крокодиле (запись в БД — пачкой, см. stats_buffer)"""
+    stats_buffer.add_game(user_id, chat_id, won)
+    if crocodile_leaderboard.tracks(chat_id):
+        wins, played = await stats_buffer.get_game_stats(user_id, chat_id)
+        crocodile_leaderboard.update(chat_id, (user_id, wins, played))
+
+async def record_game_result(game, winner_id: int = None):
+    """Засчитывает сыгранную игру всем, кто угадывал, и победу — победителю"""
+    if winner_id is not None:
+        game.players.add(winner_id)
+    for user_id in game.players:
+        await update_game_stats(user_id, game.chat_id, won=(user_id == winner_id))
 # =============================================================
 
 async def check_crocodile_guess(message: types.Message) -> bool:
     """Проверяет, угадал ли игрок слово. Даёт подсказки и следит за временем."""
     
-    conn = sqlite3.connect('bot_database.db')
-    c = conn.cursor()
-    
     # Получаем информацию об игре (слово и время начала)
-    c.execute("SELECT word, started_at FROM games WHERE chat_id = ? AND game_type = 'crocodile' AND active = 1", 
-              (message.chat.id,))
-    result = c.fetchone()
+    game = game_registry.get(message.chat.id)
     
-    if not result:
-        conn.close()
+    if not game:
         return False
     
-    word, started_at_str = result
-    started_at = datetime.fromisoformat(started_at_str)
+    word = game.word
     
     # Проверяем, не прошло ли 5 минут
-    time_diff = datetime.now() - started_at
-    if time_diff.total_seconds() > 300:  # 5 минут = 300 секунд
+    if game.is_expired():
         # Время вышло — завершаем игру
-        c.execute("UPDATE games SET active = 0 WHERE chat_id = ? AND game_type = 'crocodile'", 
-                  (message.chat.id,))
-        conn.commit()
-        conn.close()
+        if not await game_registry.finish(message.chat.id):
+            return True
+        await record_game_result(game)
         
         await message.answer(
             f"⏰ Время вышло! Никто не угадал слово *{word}*.\n"
@@ -367,29 +305,24 @@ async def check_crocodile_guess(message: types.Message) -> bool:
         )
         return True  # Игра завершена
     
+    # Каждое сообщение во время игры — попытка угадать
+    game.players.add(message.from_user.id)
+    stats_buffer.add_guess(message.from_user.id, message.chat.id)
+    
     # Сравниваем (регистронезависимо)
     if message.text.lower().strip() == word.lower():
-        # Ура, угадал!
-        c.execute("UPDATE games SET active = 0 WHERE chat_id = ? AND game_type = 'crocodile'", 
-                  (message.chat.id,))
-        conn.commit()
-        conn.close()
+        # Ура, угадал! Если игру уже завершил кто-то другой — победы нет
+        if not await game_registry.finish(message.chat.id):
+            return True
         
         # Добавляем карму победителю
-        add_karma(message.from_user.id, message.chat.id, 1)
+        await add_karma(message.from_user.id, message.chat.id, 1)
         
         # ===== ОБНОВЛЯЕМ СТАТИСТИКУ =====
-        update_game_stats(message.from_user.id, message.chat.id, won=True)
+        await record_game_result(game, winner_id=message.from_user.id)
         # ================================
         
-        # Получаем описание слова
-        desc_conn = sqlite3.connect('bot_database.db')
-        desc_c = desc_conn.cursor()
-        desc_c.execute("SELECT description FROM game_words WHERE word = ?", (word,))
-        desc_result = desc_c.fetchone()
-        desc_conn.close()
-        
-        description = desc_result[0] if desc_result else ""
+        description = game.description
         
         if description:
             await message.answer(
@@ -412,81 +345,140 @@ async def check_crocodile_guess(message: types.Message) -> bool:
         await message.answer(f"🤔 {hint}")
         last_hint_time[chat_id] = now
     
-    conn.close()
     return False
 
 # ================ AI CHAT (MEGANOVA) ================
 
-# Настройка OpenAI-совместимого клиента для MegaNova
-openai.api_key = MEGANOVA_API_KEY
-openai.api_base = "https://api.meganova.ai/v1"
-
-async def get_ai_response(prompt: str, chat_id: int = None) -> str:
-    """Получение ответа от MegaNova API"""
+# Клиент openai настраивается на MegaNova один раз в llm_client.py
+
+AI_MODEL = "mistralai/Mistral-Small-3.2-24B-Instruct-2506"
+AI_TEMPERATURE = 0.8
+AI_SYSTEM_PROMPT = "Ты Болталка — весёлый бот. Отвечай коротко, с эмодзи."
+
+# Все запросы к MegaNova — через один клиент с лимитами и автоматом защиты
+llm = LLMClient(AI_MODEL, AI_TEMPERATURE, max_tokens=250)
+llm.on_usage = usage_ledger.record
+
+# Ответ, когда дневной бюджет токенов исчерпан
+AI_BUDGET_MESSAGE = "🥺 Сегодня я уже наболталась! Завтра снова буду болтать. А пока давай в игру? /crocodile"
+
+def ai_error_message(error: Exception) -> str:
+    """Текст для пользователя вместо ответа нейросети"""
+    if isinstance(error, LLMUnavailable) and error.reason == "chat_busy":
+        return "⏳ Я ещё отвечаю на прошлое сообщение, подожди чуть-чуть"
+    if isinstance(error, LLMUnavailable):
+        # Нейросеть перегружена или недоступна — не ждём, отвечаем заготовкой
+        return AI_BUDGET_MESSAGE
+    if "quota" in str(error).lower() or "rate limit" in str(error).lower() or "429" in str(error):
+        return AI_BUDGET_MESSAGE
+    return "😔 Что-то пошло не так. Попробуй позже или напиши /help"
+
+async def complete_chat(messages: list, chat_id: int = None, user_id: int = None, max_tokens: int = None):
+    """Один вызов MegaNova. Возвращает (ответ, потрачено токенов)"""
+    return await llm.complete([{"role": "system", "content": AI_SYSTEM_PROMPT}, *messages],
+                              chat_id, user_id, max_tokens)
+
+def stream_chat(messages: list, chat_id: int = None, user_id: int = None, max_tokens: int = None):
+    """Вызов MegaNova с stream=True: отдаёт куски ответа по мере генерации"""
+    return llm.stream([{"role": "system", "content": AI_SYSTEM_PROMPT}, *messages],
+                      chat_id, user_id, max_tokens)
+
+async def get_ai_response(prompt: str, chat_id: int = None, user_id: int = None,
+                          remember: bool = True, cache: bool = False) -> str:
+    """Получение ответа от MegaNova API.
+    С chat_id (и remember=True) нейросеть видит предыдущие реплики этого чата.
+    cache=True — для однотипных запросов без контекста: ответ берётся из completion_cache.
+    Ближе к дневному бюджету ответы короче и без истории, после него — заготовка."""
     
     if not MEGANOVA_API_KEY:
         logger.error("MEGANOVA_API_KEY не задан")
         return "🔑 Ошибка: API ключ не настроен."
     
+    level = usage_ledger.level(chat_id)
+    max_tokens = AI_ECONOMY_MAX_TOKENS if level == ECONOMY else None
+    
     try:
-        import openai
-        openai.api_key = MEGANOVA_API_KEY
-        openai.api_base = "https://api.meganova.ai/v1"
+        if cache:
+            full_key = cache_key(prompt, AI_MODEL, AI_TEMPERATURE, llm.max_tokens)
+            key = cache_key(prompt, AI_MODEL, AI_TEMPERATURE, max_tokens or llm.max_tokens)
+            if level != NORMAL_LEVEL:
+                # Экономим: отдаём уже накопленный вариант (полный годится и здесь), если он есть
+                cached = completion_cache.peek(full_key) or completion_cache.peek(key)
+                if cached or level == EXHAUSTED:
+                    return cached or AI_BUDGET_MESSAGE
+            return await completion_cache.get(
+                key, lambda: complete_chat([{"role": "user", "content": prompt}], chat_id, user_id, max_tokens))
         
-        response = await openai.ChatCompletion.acreate(
-            model="mistralai/Mistral-Small-3.2-24B-Instruct-2506",
-            messages=[
-                {"role": "system", "content": "Ты Болталка — весёлый бот. Отвечай коротко, с эмодзи."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.8,
-            max_tokens=250
-        )
+        if level == EXHAUSTED:
+            return AI_BUDGET_MESSAGE
         
-        return response.choices[0].message.content
+        use_history = remember and chat_id is not None
+        history = await conversation_store.history(chat_id) if use_history and level != ECONOMY else []
         
+        answer, _ = await complete_chat([*history, {"role": "user", "content": prompt}], chat_id, user_id, max_tokens)
+        if use_history:
+            await conversation_store.add_exchange(chat_id, prompt, answer)
+        return answer
+        
+    except LLMUnavailable as e:
+        logger.info(f"MegaNova: запрос не отправлен ({e.reason})")
+        return ai_error_message(e)
     except Exception as e:
         logger.error(f"Ошибка MegaNova: {e}")
-        # Если ошибка из-за лимита
-        if "quota" in str(e).lower() or "rate limit" in str(e).lower() or "429" in str(e):
-            return "🥺 Сегодня я уже наболталась! Завтра снова буду болтать. А пока давай в игру? /crocodile"
-        else:
-            return "😔 Что-то пошло не так. Попробуй позже или напиши /help"
+        return ai_error_message(e)
+
+async def reply_with_ai_stream(message: types.Message, prompt: str):
+    """Отвечает заглушкой и дописывает в неё ответ нейросети по мере генерации"""
+    started = time.monotonic()
+    chat_id = message.chat.id
+    level = usage_ledger.level(chat_id)
+    if level == EXHAUSTED:
+        await message.answer(AI_BUDGET_MESSAGE)
+        return
+    
+    # В экономном режиме — короткий ответ без истории
+    economy = level == ECONOMY
+    history = [] if economy else await conversation_store.history(chat_id)
+    max_tokens = AI_ECONOMY_MAX_TOKENS if economy else None
+    placeholder = await message.answer("💭 Думаю...")
+    reply = StreamingMessage(bot, chat_id, placeholder.message_id, AI_STREAM_EDIT_INTERVAL)
+    
+    answer = ""
+    error = None
+    try:
+        async for piece in stream_chat([*history, {"role": "user", "content": prompt}],
+                                       chat_id, message.from_user.id, max_tokens):
+            answer += piece
+            reply.update(answer)
+    except Exception as e:
+        logger.error(f"Ошибка MegaNova (поток): {e}")
+        error = e
+    
+    # Если поток оборвался в самом начале — показываем обычное сообщение об ошибке
+    if not answer:
+        await reply.finish(ai_error_message(error) if error else "🤷")
+    else:
+        await reply.finish(answer)
+    streaming_stats.record_stream(started, reply, failed=error is not None)
+    if answer and error is None:
+        await conversation_store.add_exchange(chat_id, prompt, answer)
 
 # ================ КАРМА ================
 
-def add_karma(user_id: int, chat_id: int, value: int = 1):
-    """Добавить карму пользователю"""
-    conn = sqlite3.connect('bot_database.db')
-    c = conn.cursor()
-    c.execute('''INSERT INTO karma (user_id, chat_id, karma) 
-                 VALUES (?, ?, ?)
-                 ON CONFLICT(user_id, chat_id) 
-                 DO UPDATE SET karma = karma + ?''',
-              (user_id, chat_id, value, value))
-    conn.commit()
-    conn.close()
-
-def get_user_karma(user_id: int, chat_id: int) -> int:
+async def add_karma(user_id: int, chat_id: int, value: int = 1):
+    """Добавить карму пользователю (запись в БД — пачкой, см. stats_buffer)"""
+    stats_buffer.add_karma(user_id, chat_id, value)
+    if karma_leaderboard.tracks(chat_id):
+        karma = await stats_buffer.get_user_karma(user_id, chat_id)
+        karma_leaderboard.update(chat_id, (user_id, karma))
+
+async def get_user_karma(user_id: int, chat_id: int) -> int:
     """Получить карму пользователя"""
-    conn = sqlite3.connect('bot_database.db')
-    c = conn.cursor()
-    c.execute('SELECT karma FROM karma WHERE user_id = ? AND chat_id = ?', 
-              (user_id, chat_id))
-    result = c.fetchone()
-    conn.close()
-    return result[0] if result else 0
-
-def get_top_karma(chat_id: int, limit: int = 10):
+    return await stats_buffer.get_user_karma(user_id, chat_id)
+
+async def get_top_karma(chat_id: int, limit: int = 10):
     """Получить топ пользователей по карме"""
-    conn = sqlite3.connect('bot_database.db')
-    c = conn.cursor()
-    c.execute('''SELECT user_id, karma FROM karma 
-                 WHERE chat_id = ? ORDER BY karma DESC LIMIT ?''',
-              (chat_id, limit))
-    result = c.fetchall()
-    conn.close()
-    return result
+    return await karma_leaderboard.top(chat_id, limit)
 
 # ================ ГОРОСКОП (RAPIDAPI) ================
 
@@ -522,15 +514,15 @@ async def get_horoscope(sign: str) -> dict:
             "X-RapidAPI-Host": RAPIDAPI_HOST
         }
         
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, params=params, headers=headers) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    logger.info(f"🔮 API ответ для {sign}: {data}")
-                    return {"success": True, "data": data}
-                else:
-                    logger.error(f"❌ Ошибка API гороскопа: {response.status}")
-                    return {"success": False, "error": f"API error {response.status}"}
+        async with http_client.session.get(url, params=params, headers=headers,
+                                           timeout=http_client.timeout("horoscope")) as response:
+            if response.status == 200:
+                data = await response.json()
+                logger.info(f"🔮 API ответ для {sign}: {data}")
+                return {"success": True, "data": data}
+            else:
+                logger.error(f"❌ Ошибка API гороскопа: {response.status}")
+                return {"success": False, "error": f"API error {response.status}"}
     except Exception as e:
         logger.error(f"❌ Ошибка запроса к API гороскопа: {e}")
         return {"success": False, "error": str(e)}
@@ -651,27 +643,16 @@ async def cmd_addword(message: types.Message):
         await message.answer("❌ Описание слишком короткое (минимум 5 символов)")
         return
     
-    conn = sqlite3.connect('bot_database.db')
-    c = conn.cursor()
-    
-    try:
-        c.execute("INSERT INTO game_words (word, description, added_by, added_at) VALUES (?, ?, ?, ?)",
-                  (new_word, description, message.from_user.id, datetime.now()))
-        conn.commit()
+    if await db.add_word(new_word, description, message.from_user.id):
+        word_bank.add(new_word, description)
         await message.answer(f"✅ Слово «{new_word}» с описанием добавлено в игру!")
-    except sqlite3.IntegrityError:
+    else:
         await message.answer(f"⚠️ Слово «{new_word}» уже есть в списке")
-    finally:
-        conn.close()
 
 @dp.message_handler(commands=['words'])
 async def cmd_words(message: types.Message):
     """Показывает все доступные слова"""
-    conn = sqlite3.connect('bot_database.db')
-    c = conn.cursor()
-    c.execute("SELECT word, description FROM game_words ORDER BY word")
-    words = c.fetchall()
-    conn.close()
+    words = sorted(word_bank.words)
     
     if not words:
         await message.answer("📭 Список слов пока пуст. Добавь через /addword")
@@ -696,19 +677,18 @@ async def get_random_meme():
     try:
         url = f"https://api.humorapi.com/memes/random?api-key={HUMOR_API_KEY}"
         
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    return {
-                        "success": True,
-                        "url": data.get("url"),
-                        "title": data.get("title", "😂 Случайный мем"),
-                        "nsfw": data.get("nsfw", False)
-                    }
-                else:
-                    logger.error(f"Humor API error: {response.status}")
-                    return {"success": False, "error": f"API error {response.status}"}
+        async with http_client.session.get(url, timeout=http_client.timeout("meme")) as response:
+            if response.status == 200:
+                data = await response.json()
+                return {
+                    "success": True,
+                    "url": data.get("url"),
+                    "title": data.get("title", "😂 Случайный мем"),
+                    "nsfw": data.get("nsfw", False)
+                }
+            else:
+                logger.error(f"Humor API error: {response.status}")
+                return {"success": False, "error": f"API error {response.status}"}
                     
     except Exception as e:
         logger.error(f"Error fetching meme: {e}")
@@ -748,17 +728,8 @@ async def cmd_meme(message: types.Message):
 async def cmd_croctop(message: types.Message):
     """Показывает топ игроков в Крокодила в этом чате"""
     
-    conn = sqlite3.connect('bot_database.db')
-    c = conn.cursor()
-    
     # Получаем топ-10 по победам
-    c.execute('''SELECT user_id, games_won, games_played 
-                 FROM game_stats 
-                 WHERE chat_id = ? 
-                 ORDER BY games_won DESC 
-                 LIMIT 10''', (message.chat.id,))
-    top_players = c.fetchall()
-    conn.close()
+    top_players = await crocodile_leaderboard.top(message.chat.id, 10)
     
     if not top_players:
         await message.answer(
@@ -769,13 +740,10 @@ async def cmd_croctop(message: types.Message):
     
     # Формируем сообщение
     text = "🏆 <b>Топ игроков в Крокодила</b>\n\n"
+    names = await profile_cache.names(bot, message.chat.id, [user_id for user_id, _, _ in top_players])
     
     for i, (user_id, wins, played) in enumerate(top_players, 1):
-        try:
-            user = await bot.get_chat_member(message.chat.id, user_id)
-            name = user.user.first_name
-        except:
-            name = f"Игрок {user_id}"
+        name = names[user_id] or f"Игрок {user_id}"
         
         win_rate = (wins / played * 100) if played > 0 else 0
         medal = "🥇" if i == 1 else "🥈" if i == 2 else "🥉" if i == 3 else "▫️"
@@ -840,7 +808,8 @@ async def help_chat(callback_query: types.CallbackQuery):
         "🎭 <b>Общение с ботом</b>\n\n"
         "• <b>@BoltalkaChatBot_bot [вопрос]</b> — спроси меня о чём угодно\n"
         "• <b>/fact</b> — случайный интересный факт\n"
-        "• <b>/story</b> — короткая история от нейросети\n\n"
+        "• <b>/story</b> — короткая история от нейросети\n"
+        "• <b>/triggers</b> — на какие слова я отзываюсь, <b>/addtrigger слово</b> — добавить своё (админы)\n\n"
         "Я отвечаю только когда меня упомянули, чтобы не мешать общению в чате 😌"
     )
     
@@ -931,7 +900,9 @@ async def help_weather(callback_query: types.CallbackQuery):
     """Раздел Погода"""
     text = (
         "🌤️ <b>Погода</b>\n\n"
-        "• <b>/testweather</b> — показать погоду в Славянске-на-Кубани и Липецке\n\n"
+        "• <b>/testweather</b> — показать погоду в Славянске-на-Кубани и Липецке\n"
+        "• <b>/weather_subscribe 08:00 [города]</b> — погода каждый день в это время (МСК)\n"
+        "• <b>/weather_unsubscribe</b> — отключить рассылку\n\n"
         "👉 Если команда вызвана в группе — погода уйдёт в группу\n"
         "👉 Если в личке — погода придёт лично тебе"
     )
@@ -984,7 +955,8 @@ async def help_all(callback_query: types.CallbackQuery):
         "📋 <b>Все команды бота</b>\n\n"
         "🎭 <b>Общение:</b>\n"
         "• @бот [вопрос]\n"
-        "• /fact, /story\n\n"
+        "• /fact, /story\n"
+        "• /triggers, /addtrigger, /deltrigger\n\n"
         "🏆 <b>Карма:</b>\n"
         "• + (ответом), /karma, /top\n\n"
         "🎮 <b>Игры:</b>\n"
@@ -993,11 +965,12 @@ async def help_all(callback_query: types.CallbackQuery):
         "• /words\n"
         "• /croctop\n\n"
         "🌤️ <b>Погода:</b>\n"
-        "• /testweather\n\n"
+        "• /testweather, /weather_subscribe, /weather_unsubscribe\n\n"
         "😂 <b>Мемы:</b>\n"
         "• /meme\n\n"
         "🔍 <b>Полезное:</b>\n"
-        "• /factcheck, /help, /start"
+        "• /factcheck, /help, /start\n"
+        "• /aiusage — расход токенов нейросети (для админов)"
     )
     
     keyboard = InlineKeyboardMarkup().add(
@@ -1018,25 +991,18 @@ async def help_back(callback_query: types.CallbackQuery):
 @dp.message_handler(commands=['crocodile'])
 async def cmd_crocodile(message: types.Message):
     """Игра в Крокодила с кнопкой подсказки"""
-    conn = sqlite3.connect('bot_database.db')
-    c = conn.cursor()
-    
     # Проверяем, не идёт ли уже игра
-    c.execute("SELECT * FROM games WHERE chat_id = ? AND active = 1", 
-              (message.chat.id,))
-    if c.fetchone():
+    if game_registry.is_active(message.chat.id):
         await message.answer("В чате уже идёт игра! 🎮")
-        conn.close()
         return
     
     # Получаем случайное слово и его описание из базы
-    word, description = get_random_word_with_description()
+    word, description = get_random_word_with_description(message.chat.id)
     
     # Сохраняем игру (слово и время начала)
-    c.execute("INSERT INTO games (chat_id, game_type, active, word, started_at) VALUES (?, ?, ?, ?, ?)",
-              (message.chat.id, "crocodile", 1, word, datetime.now()))
-    conn.commit()
-    conn.close()
+    if not await game_registry.start(message.chat.id, word, description):
+        await message.answer("В чате уже идёт игра! 🎮")
+        return
     
     # Создаём кнопку подсказки
     keyboard = InlineKeyboardMarkup().add(
@@ -1060,21 +1026,17 @@ async def process_hint(callback_query: types.CallbackQuery):
     word = callback_query.data.replace('hint_', '')
     
     # Проверяем, что игра ещё идёт
-    conn = sqlite3.connect('bot_database.db')
-    c = conn.cursor()
-    c.execute("SELECT * FROM games WHERE chat_id = ? AND active = 1", 
-              (callback_query.message.chat.id,))
-    if not c.fetchone():
+    game = game_registry.get(callback_query.message.chat.id)
+    if not game:
         await callback_query.answer("Игра уже закончилась!", show_alert=True)
-        conn.close()
         return
     
-    # Получаем описание слова из базы
-    c.execute("SELECT description FROM game_words WHERE word = ?", (word,))
-    result = c.fetchone()
-    conn.close()
-    
-    description = result[0] if result else "У этого слова нет подсказки 😅"
+    # Описание текущего слова уже в реестре, для кнопок прошлых игр — из банка слов в памяти
+    if game.word == word:
+        description = game.description
+    else:
+        description = word_bank.describe(word)
+    description = description or "У этого слова нет подсказки 😅"
     
     # Отвечаем (уведомление появится у всех в чате)
     await callback_query.message.answer(f"🔍 <b>Подсказка:</b> {description}", parse_mode="HTML")
@@ -1090,28 +1052,103 @@ async def cmd_karma(message: types.Message):
     else:
         user = message.from_user
     
-    karma = get_user_karma(user.id, message.chat.id)
+    karma = await get_user_karma(user.id, message.chat.id)
     await message.answer(f"⭐ Карма {user.first_name}: <b>{karma}</b>")
 
 @dp.message_handler(commands=['top'])
 async def cmd_top(message: types.Message):
     """Показать топ пользователей по карме"""
-    top_users = get_top_karma(message.chat.id, 10)
+    top_users = await get_top_karma(message.chat.id, 10)
     if not top_users:
         await message.answer("Пока нет статистики в этом чате 🥺")
         return
     
     text = "🏆 <b>Топ 10 по карме:</b>\n\n"
+    names = await profile_cache.names(bot, message.chat.id, [user_id for user_id, _ in top_users])
     for i, (user_id, karma) in enumerate(top_users, 1):
-        try:
-            user = await bot.get_chat_member(message.chat.id, user_id)
-            name = user.user.first_name
-        except:
-            name = f"Пользователь {user_id}"
+        name = names[user_id] or f"Пользователь {user_id}"
         text += f"{i}. {name} — {karma} ⭐\n"
     
     await message.answer(text)
 
+@dp.message_handler(commands=['aiusage'])
+async def cmd_aiusage(message: types.Message):
+    """Расход токенов нейросети за сегодня: в личке у админа бота — по чатам, в группе у админа — по участникам"""
+    if message.chat.type == 'private':
+        if message.from_user.id not in BOT_ADMIN_IDS:
+            await message.answer("❌ Эта команда только для администраторов бота!")
+            return
+        rows = await usage_ledger.top_chats(10)
+        title = "🧮 <b>Расход токенов за сегодня по чатам</b>"
+        names = {chat_id: f"Чат {chat_id}" for chat_id, _, _, _ in rows}
+    else:
+        if not await is_user_admin(message):
+            await message.answer("❌ Только администраторы могут смотреть расход токенов!")
+            return
+        rows = await usage_ledger.top_users(message.chat.id, 10)
+        title = "🧮 <b>Расход токенов за сегодня в этом чате</b>"
+        profiles = await profile_cache.names(bot, message.chat.id, [user_id for user_id, _, _, _ in rows])
+        names = {user_id: profiles[user_id] or f"Пользователь {user_id}" for user_id, _, _, _ in rows}
+    
+    if not rows:
+        await message.answer("🧮 Сегодня нейросеть ещё не тратила токены")
+        return
+    
+    stats = usage_ledger.stats()
+    text = f"{title}\nВсего: {stats['tokens_today']} из {stats['daily_budget']}\n\n"
+    for i, (key, prompt_tokens, completion_tokens, requests) in enumerate(rows, 1):
+        text += (f"{i}. {names[key]} — {prompt_tokens + completion_tokens} "
+                 f"({prompt_tokens} + {completion_tokens}), запросов: {requests}\n")
+    
+    await message.answer(text)
+
+# ================ СВОИ СЛОВА-ТРИГГЕРЫ ЧАТА ================
+
+@dp.message_handler(commands=['triggers'])
+async def cmd_triggers(message: types.Message):
+    """Показывает слова, на которые бот отзывается в этом чате"""
+    custom = trigger_registry.words(message.chat.id)
+    text = "🗣️ <b>Я отзываюсь на:</b>\n" + ", ".join(trigger_registry.defaults)
+    if custom:
+        text += "\n\n<b>Слова этого чата:</b>\n" + ", ".join(custom)
+    text += "\n\nДобавить: /addtrigger слово, убрать: /deltrigger слово"
+    await message.answer(text)
+
+@dp.message_handler(commands=['addtrigger'])
+async def cmd_addtrigger(message: types.Message):
+    """Добавляет слово-обращение к боту для этого чата"""
+    if message.chat.type != 'private' and not await is_user_admin(message):
+        await message.answer("❌ Только администраторы могут менять слова-триггеры")
+        return
+    
+    parts = message.text.split(maxsplit=1)
+    word = parts[1].strip().lower() if len(parts) > 1 else ""
+    if not word or len(word) < 2 or len(word) > 30 or word.startswith(('/', '@')):
+        await message.answer("❌ Формат: /addtrigger слово\nНапример: /addtrigger кроко")
+        return
+    
+    if not trigger_registry.add(message.chat.id, word):
+        await message.answer(f"⚠️ Слово «{word}» уже есть или в чате слишком много своих слов "
+                             f"(максимум {trigger_registry.max_words})")
+        return
+    await db.add_chat_trigger(message.chat.id, word, message.from_user.id)
+    await message.answer(f"✅ Теперь я отзываюсь на «{word}»")
+
+@dp.message_handler(commands=['deltrigger'])
+async def cmd_deltrigger(message: types.Message):
+    """Убирает своё слово-обращение чата"""
+    if message.chat.type != 'private' and not await is_user_admin(message):
+        await message.answer("❌ Только администраторы могут менять слова-триггеры")
+        return
+    
+    parts = message.text.split(maxsplit=1)
+    word = parts[1].strip().lower() if len(parts) > 1 else ""
+    if not trigger_registry.remove(message.chat.id, word):
+        await message.answer(f"⚠️ Своего слова «{word}» в этом чате нет. Список: /triggers")
+        return
+    await db.remove_chat_trigger(message.chat.id, word)
+    await message.answer(f"✅ Больше не отзываюсь на «{word}»")
+
 @dp.message_handler(commands=['fact'])
 async def cmd_fact(message: types.Message):
     """Случайный интересный факт"""
@@ -1131,7 +1168,7 @@ async def cmd_fact(message: types.Message):
 async def cmd_story(message: types.Message):
     """Короткая история от нейросети"""
     prompt = "Напиши очень короткую смешную историю из жизни, 2-3 предложения"
-    story = await get_ai_response(prompt, message.chat.id)
+    story = await get_ai_response(prompt, message.chat.id, message.from_user.id, remember=False, cache=True)
     await message.answer(story)
 
 @dp.message_handler(commands=['duel'])
@@ -1181,12 +1218,7 @@ async def cmd_couple(message: types.Message):
     
     couple = random.sample(members, 2)
     
-    conn = sqlite3.connect('bot_database.db')
-    c = conn.cursor()
-    c.execute("INSERT INTO couples (chat_id, user1_id, user2_id, date) VALUES (?, ?, ?, ?)",
-              (message.chat.id, couple[0].id, couple[1].id, datetime.now().date()))
-    conn.commit()
-    conn.close()
+    await db.add_couple(message.chat.id, couple[0].id, couple[1].id, datetime.now().date())
     
     await message.answer(
         f"💑 <b>Пара дня!</b>\n"
@@ -1263,17 +1295,17 @@ async def process_factcheck(message: types.Message, claim: str):
         }
         
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(search_url, params=params, headers=headers) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        logger.info(f"🔍 API ответ для '{query}': {data}")
-                        results = data.get("query", {}).get("search", [])
-                        logger.info(f"📦 Найдено результатов: {len(results)}")
-                        return results
-                    else:
-                        logger.error(f"❌ API ошибка: статус {response.status}")
-                        return []
+            async with http_client.session.get(search_url, params=params, headers=headers,
+                                               timeout=http_client.timeout("wiki")) as response:
+                if response.status == 200:
+                    data = await response.json()
+                    logger.info(f"🔍 API ответ для '{query}': {data}")
+                    results = data.get("query", {}).get("search", [])
+                    logger.info(f"📦 Найдено результатов: {len(results)}")
+                    return results
+                else:
+                    logger.error(f"❌ API ошибка: статус {response.status}")
+                    return []
         except Exception as e:
             logger.error(f"❌ Ошибка запроса к API: {e}")
             return []
@@ -1350,7 +1382,7 @@ async def plus_karma(message: types.Message):
     """Добавление кармы через плюсик"""
     if not message.reply_to_message.from_user.is_bot:
         target_user = message.reply_to_message.from_user
-        add_karma(target_user.id, message.chat.id, 1)
+        await add_karma(target_user.id, message.chat.id, 1)
         await message.answer(f"⭐ {target_user.first_name} получил +1 к карме!")
 
 @dp.message_handler(content_types=['new_chat_members'])
@@ -1381,7 +1413,7 @@ async def verify_callback(callback_query: types.CallbackQuery):
         await callback_query.message.edit_text(
             f"👤 {callback_query.from_user.first_name} подтверждён! Добро пожаловать в чат!"
         )
-        add_karma(user_id, callback_query.message.chat.id, 3)
+        await add_karma(user_id, callback_query.message.chat.id, 3)
     else:
         await callback_query.answer("Это не твоя кнопка!", show_alert=True)
     
@@ -1389,29 +1421,13 @@ async def verify_callback(callback_query: types.CallbackQuery):
 
 # ================ ОСНОВНОЙ ОБРАБОТЧИК СООБЩЕНИЙ ================
 
-# Ключевые слова для вызова бота (можно добавлять любые)
-TRIGGER_WORDS = [
-    "болталка",
-    "болталочка",
-    "бот",
-    "друг",
-    "подруга",
-    "болбес",
-    "помоги",
-    "эй"
-]
-
 @dp.message_handler(content_types=['text'])
 async def ai_chat_handler(message: types.Message):
     if message.text.startswith('/'):
         return
     
     # Проверка на активную игру
-    conn = sqlite3.connect('bot_database.db')
-    c = conn.cursor()
-    c.execute("SELECT * FROM games WHERE chat_id = ? AND active = 1", (message.chat.id,))
-    game_active = c.fetchone() is not None
-    conn.close()
+    game_active = game_registry.is_active(message.chat.id)
     
     if game_active:
         logger.info(f"🎮 Игра идёт, антиспам отключён")
@@ -1429,60 +1445,77 @@ async def ai_chat_handler(message: types.Message):
             return
         last_message_time[user_id] = now
     
-    # Получаем username бота
+    # Username бота (bot.me кэшируется aiogram) нужен для упоминаний через @
     bot_user = await bot.me
-    bot_username = bot_user.username if bot_user else None
-    logger.info(f"🤖 bot_username = {bot_username}")
-    
-    # Проверяем, нужно ли отвечать
-    should_reply = False
-    
-    # 1. Проверка на упоминание через @
-    if bot_username and f"@{bot_username}" in message.text.lower():
-        should_reply = True
-        logger.info(f"✅ Упоминание через @")
-    
-    # 2. Проверка через entities
-    if not should_reply and message.entities:
-        for entity in message.entities:
-            if entity.type == 'mention':
-                mentioned = message.text[entity.offset:entity.offset + entity.length]
-                if mentioned.lower() == f"@{bot_username.lower()}":
-                    should_reply = True
-                    logger.info(f"✅ Упоминание через entities")
-                    break
-    
-    # 3. Проверка на ключевые слова (без @)
-    if not should_reply:
-        text_lower = message.text.lower()
-        for word in TRIGGER_WORDS:
-            if word.lower() in text_lower:
-                should_reply = True
-                logger.info(f"✅ Сработало ключевое слово: '{word}'")
-                break
+    trigger_registry.set_mention(bot_user.username if bot_user else None)
     
+    # Одним проходом: есть ли обращение (@бот или слово-триггер) и текст без него
+    should_reply, prompt = trigger_registry.match(message.chat.id, message.text)
     logger.info(f"👀 should_reply = {should_reply}")
     
     # Отвечаем если нужно или это личка
     if should_reply or message.chat.type == 'private':
-        # Очищаем от упоминания, если оно было
-        prompt = message.text
-        if bot_username:
-            prompt = prompt.replace(f"@{bot_username}", "").strip()
-        
-        # Также удаляем ключевые слова (опционально)
-        for word in TRIGGER_WORDS:
-            prompt = prompt.replace(word, "").strip()
-        
-        if not prompt:
+        # Пустое обращение — стандартное приветствие, ответ на него кэшируется
+        greeting = not prompt
+        if greeting:
             prompt = "Привет!"
         
         logger.info(f"💬 Отвечаем на: '{prompt}'")
-        response = await get_ai_response(prompt, message.chat.id)
+        if AI_STREAMING and not greeting:
+            await reply_with_ai_stream(message, prompt)
+            return
+        
+        started = time.monotonic()
+        response = await get_ai_response(prompt, message.chat.id, message.from_user.id,
+                                         remember=not greeting, cache=greeting)
         await message.answer(response)
+        streaming_stats.record_full(started)
     else:
         logger.info(f"⏭️ Нет причин для ответа, молчим")
 
+# ================ ОБРАБОТКА ОБНОВЛЕНИЙ ================
+
+async def handle_update(update_data: dict):
+    """Передаёт сырое обновление в диспетчер aiogram"""
+    Bot.set_current(bot)
+    Dispatcher.set_current(dp)
+    update = types.Update(**update_data)
+    await dp.process_update(update)
+
+# Внутри чата — по порядку, между чатами — параллельно
+chat_dispatcher = ChatDispatcher(handle_update, max_concurrency=CHAT_DISPATCH_CONCURRENCY)
+
+async def process_update(update_data: dict):
+    """Обрабатывает сырое обновление из вебхука"""
+    await chat_dispatcher.dispatch(update_data)
+
+# Очередь для режима быстрого приёма вебхуков (ASYNC_INGEST=1). Она сама
+# шардирует по чатам до воркеров, поэтому вызывает handle_update напрямую:
+# воркер никогда не ждёт замка чата, пока другие чаты стоят в очереди
+update_queue = UpdateQueue(handle_update, maxsize=UPDATE_QUEUE_SIZE, workers=UPDATE_WORKERS)
+
+def collect_stats() -> dict:
+    """Собирает метрики компонентов для /stats"""
+    return {
+        "async_ingest": ASYNC_INGEST,
+        "update_queue": update_queue.stats(),
+        "chat_dispatcher": chat_dispatcher.stats(),
+        "loop_lag": loop_lag_probe.stats(),
+        "games": game_registry.stats(),
+        "weather_cache": weather_cache.stats(),
+        "weather_broadcast": weather_broadcaster.stats(),
+        "outbound": bot.outbound.stats(),
+        "profiles": profile_cache.stats(),
+        "stats_buffer": stats_buffer.stats(),
+        "conversations": conversation_store.stats(),
+        "ai_cache": completion_cache.stats(),
+        "ai_streaming": streaming_stats.stats(),
+        "llm": llm.stats(),
+        "ai_usage": usage_ledger.stats(),
+        "triggers": trigger_registry.stats(),
+        "leaderboards": {"karma": karma_leaderboard.stats(), "crocodile": crocodile_leaderboard.stats()},
+    }
+
 # ================ ЗАПУСК ФОНОВЫХ ЗАДАЧ ================
 
 async def start_background_tasks():
@@ -1495,13 +1528,48 @@ async def start_background_tasks():
     _tasks_started = True
     logger.info("🚀 Запуск фоновых задач...")
 
+    # Общая HTTP-сессия для внешних API
+    await http_client.start()
+
     # Создаем задачи и СОХРАНЯЕМ ссылки
-    task1 = asyncio.create_task(game_timeout_checker())
+    for coro in (game_registry.expiry.run(), games_archiver(), loop_lag_probe.run(), stats_buffer.run(),
+                 usage_ledger.run()):
+        task = asyncio.create_task(coro)
+
+        # Добавляем в глобальный список (сильная ссылка)
+        BACKGROUND_TASKS.add(task)
 
-    # Добавляем в глобальный список (сильная ссылка)
-    BACKGROUND_TASKS.add(task1)
+        # Автоматически удаляем из списка при завершении
+        task.add_done_callback(BACKGROUND_TASKS.discard)
 
-    # Автоматически удаляем из списка при завершении
-    task1.add_done_callback(BACKGROUND_TASKS.discard)
+    # Воркеры очереди обновлений
+    if ASYNC_INGEST:
+        await update_queue.start()
+
+    # Расписание рассылки погоды
+    scheduler.start()
 
     logger.info(f"✅ Запущено {len(BACKGROUND_TASKS)} фоновых задач")
+
+async def shutdown_background_tasks():
+    """Останавливает фоновые задачи и закрывает ресурсы при остановке процесса"""
+    logger.info("🛑 Остановка фоновых задач...")
+
+    if ASYNC_INGEST:
+        await update_queue.stop()
+
+    if scheduler.running:
+        scheduler.shutdown(wait=False)
+
+    for task in list(BACKGROUND_TASKS):
+        task.cancel()
+    await asyncio.gather(*BACKGROUND_TASKS, return_exceptions=True)
+
+    # Дописываем накопленную карму, статистику и диалоги до закрытия БД
+    await stats_buffer.flush()
+    await conversation_store.spill_all()
+    await usage_ledger.flush()
+
+    db.shutdown()
+    await http_client.close()
+    await bot.close()
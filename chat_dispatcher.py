@@ -0,0 +1,95 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# ================ ПОЧАТОВЫЙ ДИСПЕТЧЕР ОБНОВЛЕНИЙ ================
+# Обновления одного чата обрабатываются строго по очереди (угадывания в
+# Крокодиле и таблица games остаются согласованными), разные чаты — параллельно.
+# Диспетчер нужен, когда обновление обрабатывается прямо в запросе вебхука;
+# в режиме ASYNC_INGEST тот же порядок обеспечивает сама UpdateQueue.
+
+def get_update_chat_id(update_data: dict) -> Optional[int]:
+    """Достаёт chat.id из сырого обновления Telegram"""
+    for key in ("message", "edited_message", "channel_post", "edited_channel_post",
+                "chat_member", "my_chat_member", "chat_join_request"):
+        chat = (update_data.get(key) or {}).get("chat")
+        if chat:
+            return chat.get("id")
+
+    callback = update_data.get("callback_query")
+    if callback:
+        chat = (callback.get("message") or {}).get("chat")
+        if chat:
+            return chat.get("id")
+
+    return None
+
+class _Shard:
+    """Очередь одного чата: FIFO-замок и число ожидающих обновлений"""
+    __slots__ = ("lock", "users")
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.users = 0
+
+class ChatDispatcher:
+    """Шардирует обновления по chat.id и ограничивает общую параллельность.
+
+    asyncio.Lock отдаёт замок в порядке ожидания, поэтому обновления чата
+    обрабатываются в порядке поступления. Глобальный семафор берётся уже
+    внутри замка чата, так что ожидающие своей очереди обновления не занимают
+    слоты других чатов. Шард удаляется, как только у него не остаётся ожидающих.
+    """
+
+    def __init__(self, handler: Callable[[dict], Awaitable[None]], max_concurrency: int = 64):
+        self.handler = handler
+        self.max_concurrency = max_concurrency
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.shards: Dict[int, _Shard] = {}
+
+        # Счётчики для /stats
+        self.in_flight = 0
+        self.dispatched = 0
+        self.shards_reclaimed = 0
+
+    async def dispatch(self, update_data: dict):
+        """Обрабатывает обновление после всех предыдущих обновлений того же чата"""
+        chat_id = get_update_chat_id(update_data)
+        if chat_id is None:
+            await self._run(update_data)
+            return
+
+        shard = self.shards.get(chat_id)
+        if shard is None:
+            shard = self.shards[chat_id] = _Shard()
+        shard.users += 1
+
+        try:
+            async with shard.lock:
+                await self._run(update_data)
+        finally:
+            shard.users -= 1
+            if shard.users == 0 and self.shards.get(chat_id) is shard:
+                del self.shards[chat_id]
+                self.shards_reclaimed += 1
+
+    async def _run(self, update_data: dict):
+        async with self.semaphore:
+            self.in_flight += 1
+            self.dispatched += 1
+            try:
+                await self.handler(update_data)
+            finally:
+                self.in_flight -= 1
+
+    def stats(self) -> Dict:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self.in_flight,
+            "active_shards": len(self.shards),
+            "pending": sum(shard.users for shard in self.shards.values()),
+            "dispatched": self.dispatched,
+            "shards_reclaimed": self.shards_reclaimed,
+        }
@@ -0,0 +1,142 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from config import AI_CACHE_VARIANTS, AI_CACHE_TTL, AI_CACHE_MAX_ENTRIES
+
+logger = logging.getLogger(__name__)
+
+# ================ КЭШ ОТВЕТОВ НЕЙРОСЕТИ ================
+# /story и пустые обращения («Привет!») каждый раз отправляют в MegaNova один
+# и тот же запрос. Кэш копит до AI_CACHE_VARIANTS разных ответов на ключ
+# (нормализованный текст, модель, температура с шагом 0.1, max_tokens), а потом
+# выдаёт их по кругу, чтобы ответы не повторялись подряд. Одинаковые запросы,
+# пришедшие одновременно, ждут один вызов API. Записи живут AI_CACHE_TTL
+# секунд, лишние вытесняются по LRU.
+
+CacheKey = Tuple[str, str, float, int]
+# Возвращает (текст ответа, потрачено токенов)
+Generate = Callable[[], Awaitable[Tuple[str, int]]]
+
+def normalize_prompt(prompt: str) -> str:
+    return " ".join(prompt.lower().split())
+
+def cache_key(prompt: str, model: str, temperature: float, max_tokens: int) -> CacheKey:
+    # Короткий ответ экономного режима не должен выдаваться вместо полного
+    return (normalize_prompt(prompt), model, round(temperature, 1), max_tokens)
+
+class _Entry:
+    __slots__ = ("variants", "tokens", "created", "next")
+
+    def __init__(self):
+        self.variants: List[str] = []
+        self.tokens = 0           # всего потрачено токенов на варианты
+        self.created = time.monotonic()
+        self.next = 0             # какой вариант отдать следующим
+
+class CompletionCache:
+    """LRU + TTL кэш с несколькими вариантами ответа на ключ и склейкой запросов"""
+
+    def __init__(self, variants: int = AI_CACHE_VARIANTS, ttl: float = AI_CACHE_TTL,
+                 max_entries: int = AI_CACHE_MAX_ENTRIES):
+        self.variants = variants
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries: "OrderedDict[CacheKey, _Entry]" = OrderedDict()
+        self.inflight: Dict[CacheKey, asyncio.Future] = {}
+
+        # Счётчики для /stats
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.tokens_spent = 0
+        self.tokens_saved = 0
+
+    def _entry(self, key: CacheKey) -> Optional[_Entry]:
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        if time.monotonic() - entry.created > self.ttl:
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return entry
+
+    def peek(self, key: CacheKey) -> Optional[str]:
+        """Любой уже накопленный вариант без вызова API (экономный режим), иначе None"""
+        entry = self._entry(key)
+        if entry is None or not entry.variants:
+            return None
+        return self._rotate(entry)
+
+    def _rotate(self, entry: _Entry) -> str:
+        self.hits += 1
+        self.tokens_saved += entry.tokens // len(entry.variants)
+        answer = entry.variants[entry.next % len(entry.variants)]
+        entry.next += 1
+        return answer
+
+    async def get(self, key: CacheKey, generate: Generate) -> str:
+        """Ответ из кэша, если варианты уже накоплены, иначе новый вызов generate()"""
+        entry = self._entry(key)
+        if entry is not None and len(entry.variants) >= self.variants:
+            return self._rotate(entry)
+
+        future = self.inflight.get(key)
+        if future is not None:
+            # Такой же запрос уже в пути — ждём его ответ вместо второго вызова API
+            try:
+                answer, tokens = await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+                # Отменили того, кто делал запрос, а не нас — спрашиваем сами
+                return await self.get(key, generate)
+            self.coalesced += 1
+            self.tokens_saved += tokens
+            return answer
+
+        self.misses += 1
+        future = self.inflight[key] = asyncio.get_running_loop().create_future()
+        try:
+            answer, tokens = await generate()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # ошибку получат ожидающие, сам future не ругается в лог
+            raise
+        else:
+            future.set_result((answer, tokens))
+            self._store(key, answer, tokens)
+            return answer
+        finally:
+            del self.inflight[key]
+
+    def _store(self, key: CacheKey, answer: str, tokens: int):
+        self.tokens_spent += tokens
+        entry = self._entry(key)
+        if entry is None:
+            entry = self.entries[key] = _Entry()
+        if len(entry.variants) < self.variants:
+            entry.variants.append(answer)
+            entry.tokens += tokens
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def stats(self) -> Dict:
+        requests = self.hits + self.misses + self.coalesced
+        return {
+            "entries": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "hit_rate": round((self.hits + self.coalesced) / requests, 3) if requests else 0.0,
+            "tokens_spent": self.tokens_spent,
+            "tokens_saved": self.tokens_saved,
+        }
+
+completion_cache = CompletionCache()
@@ -13,3 +13,63 @@ if not MEGANOVA_API_KEY:
 # Railway URL (опционально)
 RAILWAY_STATIC_URL = os.getenv("RAILWAY_STATIC_URL", "localhost")
 WEBHOOK_URL = f"https://{RAILWAY_STATIC_URL}/webhook"
+
+# Режим веб-сервера: "flask" (gunicorn + Flask) или "aiohttp" (нативный async)
+SERVER_MODE = os.getenv("SERVER_MODE", "flask").lower()
+
+# Быстрый приём вебхуков: обновление кладётся в очередь, ответ 200 сразу
+ASYNC_INGEST = os.getenv("ASYNC_INGEST", "0") == "1"
+UPDATE_QUEUE_SIZE = int(os.getenv("UPDATE_QUEUE_SIZE", "1000"))
+UPDATE_WORKERS = int(os.getenv("UPDATE_WORKERS", "8"))
+
+# Сколько обновлений из разных чатов обрабатывается одновременно
+CHAT_DISPATCH_CONCURRENCY = int(os.getenv("CHAT_DISPATCH_CONCURRENCY", "64"))
+
+# База данных SQLite
+DB_PATH = os.getenv("DB_PATH", "bot_database.db")
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "4"))
+# Потоки-читатели асинхронного фасада (писатель всегда один)
+DB_READERS = int(os.getenv("DB_READERS", "3"))
+# 0 — выполнять запросы прямо в event loop (для сравнения задержек)
+DB_OFFLOAD = os.getenv("DB_OFFLOAD", "1") == "1"
+
+# Отложенная запись кармы и статистики: сброс раз в N мс или при M изменениях
+STATS_FLUSH_INTERVAL_MS = int(os.getenv("STATS_FLUSH_INTERVAL_MS", "500"))
+STATS_FLUSH_MAX_PENDING = int(os.getenv("STATS_FLUSH_MAX_PENDING", "200"))
+
+# Память диалога с нейросетью: последние реплики каждого чата
+AI_HISTORY_TURNS = int(os.getenv("AI_HISTORY_TURNS", "10"))            # пар вопрос-ответ
+AI_HISTORY_TOKENS = int(os.getenv("AI_HISTORY_TOKENS", "1500"))        # бюджет токенов на чат
+AI_HISTORY_MAX_CHATS = int(os.getenv("AI_HISTORY_MAX_CHATS", "10000"))
+AI_HISTORY_MEMORY_MB = float(os.getenv("AI_HISTORY_MEMORY_MB", "32"))
+# 1 — вытесненные из памяти диалоги сохраняются в SQLite и подгружаются обратно
+AI_HISTORY_SPILL = os.getenv("AI_HISTORY_SPILL", "1") == "1"
+
+# Кэш одинаковых запросов к нейросети (/story, «Привет!»)
+AI_CACHE_VARIANTS = int(os.getenv("AI_CACHE_VARIANTS", "5"))         # разных ответов на один запрос
+AI_CACHE_TTL = int(os.getenv("AI_CACHE_TTL", "21600"))               # секунд
+AI_CACHE_MAX_ENTRIES = int(os.getenv("AI_CACHE_MAX_ENTRIES", "256"))
+
+# Потоковые ответы нейросети: заглушка и правки по мере генерации
+AI_STREAMING = os.getenv("AI_STREAMING", "1") == "1"
+AI_STREAM_EDIT_INTERVAL = float(os.getenv("AI_STREAM_EDIT_INTERVAL", "1.0"))  # секунд между правками
+
+# Клиент нейросети: ограничения нагрузки на MegaNova
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))     # одновременных запросов
+LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", "32"))                # ждущих своей очереди
+LLM_PER_CHAT_INFLIGHT = int(os.getenv("LLM_PER_CHAT_INFLIGHT", "1"))  # запросов от одного чата
+LLM_RATE_PER_MIN = float(os.getenv("LLM_RATE_PER_MIN", "60"))        # бюджет запросов в минуту
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "30"))                  # секунд на ответ
+# Автомат защиты: после N ошибок подряд не ходим в API cooldown секунд
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+LLM_BREAKER_COOLDOWN = float(os.getenv("LLM_BREAKER_COOLDOWN", "30"))
+
+# Учёт токенов нейросети и дневные бюджеты (0 — без ограничения)
+AI_DAILY_TOKEN_BUDGET = int(os.getenv("AI_DAILY_TOKEN_BUDGET", "300000"))
+AI_CHAT_DAILY_TOKEN_BUDGET = int(os.getenv("AI_CHAT_DAILY_TOKEN_BUDGET", "30000"))
+# С какой доли бюджета включается экономный режим и сколько тогда токенов на ответ
+AI_ECONOMY_THRESHOLD = float(os.getenv("AI_ECONOMY_THRESHOLD", "0.8"))
+AI_ECONOMY_MAX_TOKENS = int(os.getenv("AI_ECONOMY_MAX_TOKENS", "120"))
+AI_USAGE_FLUSH_INTERVAL = float(os.getenv("AI_USAGE_FLUSH_INTERVAL", "15"))  # секунд
+# Администраторы бота (id через запятую): видят расход по всем чатам
+BOT_ADMIN_IDS = {int(user_id) for user_id in os.getenv("BOT_ADMIN_IDS", "").split(",") if user_id.strip()}
@@ -0,0 +1,148 @@
+import json
+import logging
+import sys
+import time
+from collections import OrderedDict, deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+import async_storage as db
+from config import (AI_HISTORY_TURNS, AI_HISTORY_TOKENS, AI_HISTORY_MAX_CHATS,
+                    AI_HISTORY_MEMORY_MB, AI_HISTORY_SPILL)
+
+logger = logging.getLogger(__name__)
+
+# ================ ПАМЯТЬ ДИАЛОГОВ С НЕЙРОСЕТЬЮ ================
+# Для каждого чата хранятся последние реплики (кольцевой буфер на deque с
+# maxlen), обрезанные по бюджету токенов. Чаты упорядочены по последнему
+# обращению: при превышении числа чатов или лимита памяти самые давние
+# вытесняются — в SQLite, если включён AI_HISTORY_SPILL, иначе просто
+# забываются. Вытесненный диалог подгружается при следующем сообщении.
+
+# Реплика: (True — ответ бота, False — сообщение пользователя; текст)
+Turn = Tuple[bool, str]
+
+# Накладные расходы на реплику сверх самой строки: кортеж, bool, слот deque
+_TURN_OVERHEAD = sys.getsizeof((False, "")) + 8
+# Накладные расходы на чат: объект Conversation, deque и запись в OrderedDict
+_CHAT_OVERHEAD = sys.getsizeof(deque()) + 200
+
+def estimate_tokens(text: str) -> int:
+    """Грубая оценка без токенизатора: ~3 символа кириллицы на токен"""
+    return len(text) // 3 + 1
+
+def _turn_size(text: str) -> int:
+    return sys.getsizeof(text) + _TURN_OVERHEAD
+
+class Conversation:
+    """Кольцевой буфер реплик одного чата с бюджетом токенов"""
+    __slots__ = ("turns", "tokens", "size")
+
+    def __init__(self, max_turns: int):
+        self.turns: Deque[Turn] = deque(maxlen=max_turns)
+        self.tokens = 0
+        self.size = _CHAT_OVERHEAD
+
+    def append(self, is_reply: bool, text: str, token_budget: int):
+        if len(self.turns) == self.turns.maxlen:
+            self._drop_oldest()
+        self.turns.append((is_reply, text))
+        self.tokens += estimate_tokens(text)
+        self.size += _turn_size(text)
+        while self.tokens > token_budget and len(self.turns) > 1:
+            self._drop_oldest()
+
+    def _drop_oldest(self):
+        _, text = self.turns.popleft()
+        self.tokens -= estimate_tokens(text)
+        self.size -= _turn_size(text)
+
+    def messages(self) -> List[Dict[str, str]]:
+        return [{"role": "assistant" if is_reply else "user", "content": text}
+                for is_reply, text in self.turns]
+
+class ConversationStore:
+    """Диалоги всех чатов с LRU-вытеснением по числу чатов и памяти"""
+
+    def __init__(self, max_turns: int = AI_HISTORY_TURNS * 2, token_budget: int = AI_HISTORY_TOKENS,
+                 max_chats: int = AI_HISTORY_MAX_CHATS, memory_limit: int = int(AI_HISTORY_MEMORY_MB * 1024 * 1024),
+                 spill: bool = AI_HISTORY_SPILL):
+        self.max_turns = max_turns
+        self.token_budget = token_budget
+        self.max_chats = max_chats
+        self.memory_limit = memory_limit
+        self.spill = spill
+        self.chats: "OrderedDict[int, Conversation]" = OrderedDict()
+        self.size = 0
+
+        # Счётчики для /stats
+        self.evicted = 0
+        self.spilled = 0
+        self.restored = 0
+
+    async def _get(self, chat_id: int) -> Optional[Conversation]:
+        conversation = self.chats.get(chat_id)
+        if conversation is not None:
+            self.chats.move_to_end(chat_id)
+            return conversation
+        if not self.spill:
+            return None
+
+        stored = await db.load_conversation(chat_id)
+        if chat_id in self.chats or not stored:
+            # Пока ждали БД, чат мог появиться в памяти
+            return self.chats.get(chat_id)
+        conversation = Conversation(self.max_turns)
+        for is_reply, text in json.loads(stored):
+            conversation.append(is_reply, text, self.token_budget)
+        self.chats[chat_id] = conversation
+        self.size += conversation.size
+        self.restored += 1
+        await self._evict()
+        return conversation
+
+    async def history(self, chat_id: int) -> List[Dict[str, str]]:
+        """Предыдущие реплики чата в формате messages для ChatCompletion"""
+        conversation = await self._get(chat_id)
+        return conversation.messages() if conversation else []
+
+    async def add_exchange(self, chat_id: int, prompt: str, reply: str):
+        """Запоминает вопрос пользователя и ответ бота"""
+        conversation = await self._get(chat_id)
+        if conversation is None:
+            conversation = self.chats[chat_id] = Conversation(self.max_turns)
+            self.size += conversation.size
+        self.size -= conversation.size
+        conversation.append(False, prompt, self.token_budget)
+        conversation.append(True, reply, self.token_budget)
+        self.size += conversation.size
+        await self._evict()
+
+    async def _evict(self):
+        victims = []
+        while self.chats and (len(self.chats) > self.max_chats or self.size > self.memory_limit):
+            chat_id, conversation = self.chats.popitem(last=False)
+            self.size -= conversation.size
+            self.evicted += 1
+            victims.append((chat_id, conversation))
+        if victims and self.spill:
+            await self._save(victims)
+
+    async def _save(self, conversations: List[Tuple[int, Conversation]]):
+        now = time.time()
+        try:
+            await db.save_conversations([(chat_id, json.dumps(list(conversation.turns), ensure_ascii=False), now)
+                                         for chat_id, conversation in conversations])
+            self.spilled += len(conversations)
+        except Exception as e:
+            logger.error(f"Не удалось сохранить {len(conversations)} диалогов: {e}")
+
+    async def spill_all(self):
+        """Сохраняет все диалоги из памяти (при остановке)"""
+        if self.spill and self.chats:
+            await self._save(list(self.chats.items()))
+
+    def stats(self) -> Dict:
+        return {"chats": len(self.chats), "memory_bytes": self.size, "memory_limit": self.memory_limit,
+                "evicted": self.evicted, "spilled": self.spilled, "restored": self.restored}
+
+conversation_store = ConversationStore()
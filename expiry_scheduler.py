@@ -0,0 +1,83 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+# ================ ПЛАНИРОВЩИК СРОКОВ НА КУЧЕ ================
+# Вместо опроса раз в минуту каждый срок кладётся в min-кучу, а одна задача
+# спит ровно до ближайшего срока. Отмена ленивая: устаревшие записи кучи
+# просто пропускаются, когда доходят до вершины.
+
+class ExpiryScheduler:
+    """Вызывает on_expire(key, item) точно в срок для каждого зарегистрированного ключа"""
+
+    def __init__(self, on_expire: Callable[[Hashable, Any], Awaitable[None]]):
+        self.on_expire = on_expire
+        self._heap: List[Tuple[float, int, Hashable, Any]] = []
+        self._current: Dict[Hashable, Any] = {}
+        self._seq = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._tasks = set()
+        self.fired = 0
+
+    def schedule(self, key: Hashable, deadline: float, item: Any):
+        """Регистрирует срок (time.time()) для ключа, заменяя прежний"""
+        self._current[key] = item
+        heapq.heappush(self._heap, (deadline, next(self._seq), key, item))
+        # Будим цикл, только если новый срок стал ближайшим
+        if self._heap[0][3] is item:
+            self._wakeup.set()
+
+    def cancel(self, key: Hashable):
+        """Снимает срок ключа (запись кучи удалится лениво)"""
+        self._current.pop(key, None)
+        # Если отменённых записей накопилось много — пересобираем кучу
+        if len(self._heap) > 2 * len(self._current) + 64:
+            self._heap = [entry for entry in self._heap if self._current.get(entry[2]) is entry[3]]
+            heapq.heapify(self._heap)
+
+    def __len__(self):
+        return len(self._current)
+
+    def _pop_due(self, now: float) -> List[Tuple[Hashable, Any]]:
+        due = []
+        while self._heap:
+            deadline, _, key, item = self._heap[0]
+            if self._current.get(key) is not item:
+                heapq.heappop(self._heap)  # отменённая или заменённая запись
+                continue
+            if deadline > now:
+                break
+            heapq.heappop(self._heap)
+            del self._current[key]
+            due.append((key, item))
+        return due
+
+    async def run(self):
+        """Бесконечный цикл: спит до ближайшего срока и запускает обработчики"""
+        while True:
+            for key, item in self._pop_due(time.time()):
+                self.fired += 1
+                task = asyncio.create_task(self._fire(key, item))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+
+            self._wakeup.clear()
+            timeout = self._heap[0][0] - time.time() if self._heap else None
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _fire(self, key: Hashable, item: Any):
+        try:
+            await self.on_expire(key, item)
+        except Exception as e:
+            logger.error(f"Ошибка обработки срока {key}: {e}", exc_info=True)
+
+    def stats(self):
+        return {"scheduled": len(self._current), "heap_size": len(self._heap), "fired": self.fired}
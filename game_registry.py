@@ -0,0 +1,98 @@
+import logging
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, Iterable, Optional, Set, Tuple
+
+import async_storage as db
+from expiry_scheduler import ExpiryScheduler
+
+logger = logging.getLogger(__name__)
+
+# ================ РЕЕСТР АКТИВНЫХ ИГР В ПАМЯТИ ================
+# Обычное сообщение в чате только проверяет словарь, без запроса к SQLite.
+# Все изменения сразу пишутся в таблицу games, она остаётся источником
+# истины при перезапуске. Сроки игр отслеживает ExpiryScheduler: игра
+# завершается ровно через CROCODILE_DURATION, без периодического опроса.
+
+# Сколько длится игра в Крокодила
+CROCODILE_DURATION = timedelta(minutes=5)
+
+class ActiveGame:
+    """Текущая игра в чате"""
+    __slots__ = ("chat_id", "word", "description", "started_at", "deadline", "players")
+
+    def __init__(self, chat_id: int, word: str, description: str, started_at: datetime):
+        self.chat_id = chat_id
+        self.word = word
+        self.description = description
+        self.started_at = started_at
+        self.deadline = started_at + CROCODILE_DURATION
+        # Кто пытался угадать (им засчитывается сыгранная игра)
+        self.players: Set[int] = set()
+
+    def is_expired(self, now: Optional[datetime] = None) -> bool:
+        return (now or datetime.now()) >= self.deadline
+
+class GameRegistry:
+    """Активные игры по chat_id с записью в БД при каждом изменении"""
+
+    def __init__(self):
+        self.games: Dict[int, ActiveGame] = {}
+        self.expiry = ExpiryScheduler(self._expire)
+        # Вызывается с завершённой по времени игрой (объявление в чате)
+        self.on_expire: Optional[Callable[[ActiveGame], Awaitable[None]]] = None
+
+    def load(self, rows: Iterable[Tuple[int, str, str, Optional[str]]]):
+        """Заполняет реестр строками (chat_id, слово, started_at, описание) из БД"""
+        for chat_id in list(self.games):
+            self.expiry.cancel(chat_id)
+        self.games.clear()
+        for chat_id, word, started_at, description in rows:
+            if isinstance(started_at, str):
+                started_at = datetime.fromisoformat(started_at)
+            self._add(ActiveGame(chat_id, word, description or "", started_at))
+        logger.info(f"🎮 Восстановлено активных игр: {len(self.games)}")
+
+    def get(self, chat_id: int) -> Optional[ActiveGame]:
+        return self.games.get(chat_id)
+
+    def is_active(self, chat_id: int) -> bool:
+        return chat_id in self.games
+
+    def _add(self, game: ActiveGame):
+        self.games[game.chat_id] = game
+        self.expiry.schedule(game.chat_id, game.deadline.timestamp(), game)
+
+    async def start(self, chat_id: int, word: str, description: str) -> Optional[ActiveGame]:
+        """Начинает игру. None — в чате уже идёт игра"""
+        if chat_id in self.games:
+            return None
+        game = ActiveGame(chat_id, word, description, datetime.now())
+        self._add(game)
+        try:
+            await db.start_game(chat_id, word, game.started_at)
+        except Exception:
+            self.games.pop(chat_id, None)
+            self.expiry.cancel(chat_id)
+            raise
+        return game
+
+    async def finish(self, chat_id: int) -> Optional[ActiveGame]:
+        """Завершает игру. None — игру уже завершил кто-то другой"""
+        game = self.games.pop(chat_id, None)
+        if game is None:
+            return None
+        self.expiry.cancel(chat_id)
+        await db.finish_game(chat_id)
+        return game
+
+    async def _expire(self, chat_id: int, game: ActiveGame):
+        """Срок игры истёк: завершаем её, если она всё ещё идёт"""
+        if self.games.get(chat_id) is not game:
+            return
+        if await self.finish(chat_id) and self.on_expire:
+            await self.on_expire(game)
+
+    def stats(self):
+        return {"active_games": len(self.games), "expiry": self.expiry.stats()}
+
+game_registry = GameRegistry()
@@ -0,0 +1,66 @@
+import logging
+from typing import Optional
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+# ================ ОБЩИЙ HTTP-КЛИЕНТ ДЛЯ ВНЕШНИХ API ================
+# Одна aiohttp-сессия на процесс: пул соединений по хостам, кэш DNS и
+# keep-alive, поэтому погода, гороскоп, мемы и Википедия не платят за новое
+# TCP/TLS-соединение на каждый запрос.
+
+# Таймауты по интеграциям, секунды: (всего, подключение)
+TIMEOUTS = {
+    "weather": (10, 5),
+    "horoscope": (15, 5),
+    "meme": (10, 5),
+    "wiki": (10, 5),
+    "default": (15, 5),
+}
+
+class HttpClient:
+    """Долгоживущая ClientSession, создаётся при старте и закрывается при остановке"""
+
+    def __init__(self, limit: int = 100, limit_per_host: int = 20,
+                 dns_ttl: int = 300, keepalive_timeout: float = 30):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.dns_ttl = dns_ttl
+        self.keepalive_timeout = keepalive_timeout
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._timeouts = {name: aiohttp.ClientTimeout(total=total, sock_connect=connect)
+                          for name, (total, connect) in TIMEOUTS.items()}
+
+    def _create_session(self) -> aiohttp.ClientSession:
+        connector = aiohttp.TCPConnector(
+            limit=self.limit,
+            limit_per_host=self.limit_per_host,
+            ttl_dns_cache=self.dns_ttl,
+            keepalive_timeout=self.keepalive_timeout,
+        )
+        return aiohttp.ClientSession(connector=connector, timeout=self._timeouts["default"])
+
+    async def start(self):
+        """Создаёт сессию в текущем цикле событий"""
+        if self._session is None or self._session.closed:
+            self._session = self._create_session()
+            logger.info("🌐 Общая HTTP-сессия создана")
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        """Сессия; если start() ещё не вызывался — создаётся лениво (только внутри цикла)"""
+        if self._session is None or self._session.closed:
+            self._session = self._create_session()
+        return self._session
+
+    def timeout(self, integration: str) -> aiohttp.ClientTimeout:
+        return self._timeouts.get(integration, self._timeouts["default"])
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+            logger.info("🌐 Общая HTTP-сессия закрыта")
+        self._session = None
+
+http_client = HttpClient()
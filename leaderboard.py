@@ -0,0 +1,103 @@
+import logging
+from typing import Awaitable, Callable, Dict, List, Tuple
+
+from stats_buffer import stats_buffer
+
+logger = logging.getLogger(__name__)
+
+# ================ ТОПЫ ЧАТОВ В ПАМЯТИ ================
+# Для каждого чата хранится только верхушка рейтинга (size строк). Она
+# загружается из БД при первом /top (после сброса буфера приращений) и дальше
+# обновляется из add_karma и update_game_stats новым значением счёта —
+# без повторного ORDER BY.
+# Порядок как в SQL: по убыванию счёта, при равенстве — по user_id.
+# Все, кого нет в верхушке, гарантированно стоят ниже её последней строки;
+# если это нарушается (участник верхушки потерял очки), чат сбрасывается и
+# при следующем чтении загружается заново.
+
+# Строка рейтинга: (user_id, счёт, ...доп. поля)
+Row = Tuple
+Loader = Callable[[int, int], Awaitable[List[Row]]]
+
+def _rank(row: Row):
+    return (-row[1], row[0])
+
+class _ChatTop:
+    __slots__ = ("rows", "complete")
+
+    def __init__(self, rows: List[Row], size: int):
+        self.rows: Dict[int, Row] = {row[0]: row for row in rows}
+        # Строк меньше size — значит в верхушке весь чат
+        self.complete = len(rows) < size
+
+class Leaderboard:
+    """Верхушка рейтинга по чатам с инкрементальным обновлением"""
+
+    def __init__(self, loader: Loader, size: int = 10):
+        self.loader = loader
+        self.size = size
+        self.chats: Dict[int, _ChatTop] = {}
+
+        # Счётчики для /stats
+        self.hits = 0
+        self.loads = 0
+        self.invalidations = 0
+
+    async def top(self, chat_id: int, limit: int = 10) -> List[Row]:
+        """Топ чата, отсортированный по убыванию счёта"""
+        if limit > self.size:
+            return await self.loader(chat_id, limit)
+
+        chat = self.chats.get(chat_id)
+        if chat is None:
+            self.loads += 1
+            chat = self.chats[chat_id] = _ChatTop(await self.loader(chat_id, self.size), self.size)
+        else:
+            self.hits += 1
+        return sorted(chat.rows.values(), key=_rank)[:limit]
+
+    def tracks(self, chat_id: int) -> bool:
+        """Есть ли топ чата в памяти (иначе обновлять нечего)"""
+        return chat_id in self.chats
+
+    def update(self, chat_id: int, row: Row):
+        """Новое значение счёта пользователя (с учётом ещё не записанных приращений)"""
+        chat = self.chats.get(chat_id)
+        if chat is None:
+            return  # чат ещё не читали — загрузится целиком при первом /top
+
+        user_id = row[0]
+        rows = chat.rows
+        if len(rows) < self.size:
+            if chat.complete or user_id in rows:
+                rows[user_id] = row
+            else:
+                self.invalidate(chat_id)
+            return
+
+        # Последний в верхушке — с наибольшим ключом сортировки
+        lowest = max(rows.values(), key=_rank)
+        if user_id in rows:
+            rows[user_id] = row
+            if _rank(row) > _rank(lowest) and not chat.complete:
+                # Опустился ниже прежнего последнего — кто-то снаружи мог его обогнать
+                self.invalidate(chat_id)
+        elif _rank(row) < _rank(lowest):
+            del rows[lowest[0]]
+            rows[user_id] = row
+            chat.complete = False
+        elif chat.complete:
+            # Весь чат помещался в верхушку, а теперь новый участник остаётся снаружи
+            chat.complete = False
+
+    def invalidate(self, chat_id: int):
+        if self.chats.pop(chat_id, None) is not None:
+            self.invalidations += 1
+
+    def stats(self) -> Dict:
+        return {"chats": len(self.chats), "hits": self.hits,
+                "loads": self.loads, "invalidations": self.invalidations}
+
+# Карма: (user_id, карма); Крокодил: (user_id, побед, игр)
+karma_leaderboard = Leaderboard(stats_buffer.get_top_karma)
+crocodile_leaderboard = Leaderboard(stats_buffer.get_top_game_stats)
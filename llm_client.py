@@ -0,0 +1,249 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from typing import AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+import openai
+
+from config import (MEGANOVA_API_KEY, LLM_MAX_CONCURRENCY, LLM_MAX_QUEUE, LLM_PER_CHAT_INFLIGHT,
+                    LLM_RATE_PER_MIN, LLM_TIMEOUT, LLM_BREAKER_FAILURES, LLM_BREAKER_COOLDOWN)
+from conversation_memory import estimate_tokens
+from rate_limit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# ================ КЛИЕНТ НЕЙРОСЕТИ (MEGANOVA) ================
+# Все запросы к MegaNova проходят через один клиент:
+#   * не больше LLM_MAX_CONCURRENCY одновременно, остальные ждут в очереди,
+#     где личные чаты идут раньше групповой болтовни;
+#   * от одного чата — не больше LLM_PER_CHAT_INFLIGHT запросов сразу;
+#   * общий бюджет LLM_RATE_PER_MIN запросов в минуту (token bucket);
+#   * автомат защиты: после LLM_BREAKER_FAILURES ошибок подряд запросы
+#     сразу получают отказ на LLM_BREAKER_COOLDOWN секунд, потом один пробный.
+# Отказ — исключение LLMUnavailable, бот отвечает на него заготовкой.
+# Расход токенов каждого ответа передаётся в on_usage (учёт в usage_ledger).
+
+openai.api_key = MEGANOVA_API_KEY
+openai.api_base = "https://api.meganova.ai/v1"
+
+# Приоритеты очереди: чем меньше, тем раньше
+PRIVATE = 0
+GROUP = 1
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+class LLMUnavailable(Exception):
+    """Запрос не отправлен: reason — circuit_open, chat_busy, rate_limited или queue_full"""
+
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+class CircuitBreaker:
+    """Размыкается после серии ошибок, через cooldown пропускает один пробный запрос"""
+
+    def __init__(self, failures: int = LLM_BREAKER_FAILURES, cooldown: float = LLM_BREAKER_COOLDOWN):
+        self.max_failures = failures
+        self.cooldown = cooldown
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trips = 0
+
+    def allow(self) -> bool:
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN and time.monotonic() - self.opened_at >= self.cooldown:
+            self.state = HALF_OPEN
+            return True
+        return False  # разомкнут или пробный запрос уже в пути
+
+    def abort_probe(self):
+        """Пробный запрос так и не ушёл — следующий снова может стать пробным"""
+        if self.state == HALF_OPEN:
+            self.state = OPEN
+
+    def success(self):
+        self.state = CLOSED
+        self.failures = 0
+
+    def failure(self):
+        self.failures += 1
+        if self.state == HALF_OPEN or self.failures >= self.max_failures:
+            if self.state != OPEN:
+                self.trips += 1
+                logger.warning(f"🔌 MegaNova недоступна, пауза {self.cooldown:.0f}с (ошибок подряд: {self.failures})")
+            self.state = OPEN
+            self.opened_at = time.monotonic()
+
+class LLMClient:
+    """Ограничивает параллелизм, частоту и отказы запросов к ChatCompletion"""
+
+    def __init__(self, model: str, temperature: float, max_tokens: int,
+                 max_concurrency: int = LLM_MAX_CONCURRENCY, max_queue: int = LLM_MAX_QUEUE,
+                 per_chat: int = LLM_PER_CHAT_INFLIGHT, rate_per_min: float = LLM_RATE_PER_MIN,
+                 timeout: float = LLM_TIMEOUT):
+        self.model = model
+        self.temperature = temperature
+        self.max_tokens = max_tokens
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.per_chat = per_chat
+        self.timeout = timeout
+        self.budget = TokenBucket(rate=rate_per_min / 60, capacity=max(1.0, rate_per_min / 6))
+        self.breaker = CircuitBreaker()
+
+        self.in_flight = 0
+        self.chats: Dict[int, int] = {}
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+        # Вызывается после каждого ответа: (chat_id, user_id, prompt-токены, completion-токены)
+        self.on_usage: Optional[Callable[[Optional[int], Optional[int], int, int], None]] = None
+
+        # Счётчики для /stats
+        self.requests = 0
+        self.errors = 0
+        self.rejected: Dict[str, int] = {}
+
+    def _reject(self, reason: str):
+        self.rejected[reason] = self.rejected.get(reason, 0) + 1
+        raise LLMUnavailable(reason)
+
+    def _queue_full(self) -> bool:
+        """Свободного слота нет, а очередь ожидания заполнена"""
+        if self.in_flight < self.max_concurrency and not self._waiters:
+            return False
+        return len(self._waiters) >= self.max_queue
+
+    async def _acquire_slot(self, priority: int):
+        if self.in_flight < self.max_concurrency and not self._waiters:
+            self.in_flight += 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), future))
+        try:
+            await future  # слот передаёт освобождающий, in_flight не меняется
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self._release_slot()
+            raise
+
+    def _release_slot(self):
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(None)
+                return
+        self.in_flight -= 1
+
+    async def _enter(self, chat_id: Optional[int]):
+        """Проверки перед запросом; при успехе занимает слот и место чата"""
+        if chat_id is not None and self.chats.get(chat_id, 0) >= self.per_chat:
+            self._reject("chat_busy")
+        if self._queue_full():
+            self._reject("queue_full")
+        if not self.breaker.allow():
+            self._reject("circuit_open")
+        # Токен бюджета — последним: его получает только запрос, который уйдёт
+        if self.budget.try_acquire() > 0:
+            self.breaker.abort_probe()
+            self._reject("rate_limited")
+
+        if chat_id is not None:
+            self.chats[chat_id] = self.chats.get(chat_id, 0) + 1
+        try:
+            # Положительный id — личный чат, отрицательный — группа
+            await self._acquire_slot(PRIVATE if chat_id is not None and chat_id > 0 else GROUP)
+        except BaseException:
+            self._leave_chat(chat_id)
+            self.breaker.abort_probe()
+            raise
+        self.requests += 1
+
+    def _leave_chat(self, chat_id: Optional[int]):
+        if chat_id is None:
+            return
+        count = self.chats.get(chat_id, 0) - 1
+        if count > 0:
+            self.chats[chat_id] = count
+        else:
+            self.chats.pop(chat_id, None)
+
+    def _exit(self, chat_id: Optional[int], error: Optional[BaseException]):
+        self._release_slot()
+        self._leave_chat(chat_id)
+        if error is None:
+            self.breaker.success()
+        elif isinstance(error, Exception):
+            self.errors += 1
+            self.breaker.failure()
+        else:
+            self.breaker.abort_probe()  # отменён (остановка бота), ответа не было
+
+    def _params(self, messages: List[Dict[str, str]], max_tokens: Optional[int]) -> Dict:
+        return {"model": self.model, "messages": messages, "temperature": self.temperature,
+                "max_tokens": max_tokens or self.max_tokens, "request_timeout": self.timeout}
+
+    def _record_usage(self, chat_id: Optional[int], user_id: Optional[int], usage: Dict,
+                      messages: List[Dict[str, str]], answer: str) -> int:
+        # Если провайдер не прислал usage (как в потоке) — оцениваем по длине текста
+        prompt_tokens = usage.get("prompt_tokens") or sum(estimate_tokens(m["content"]) for m in messages)
+        completion_tokens = usage.get("completion_tokens") or estimate_tokens(answer)
+        if self.on_usage:
+            self.on_usage(chat_id, user_id, prompt_tokens, completion_tokens)
+        return prompt_tokens + completion_tokens
+
+    async def complete(self, messages: List[Dict[str, str]], chat_id: Optional[int] = None,
+                       user_id: Optional[int] = None, max_tokens: Optional[int] = None) -> Tuple[str, int]:
+        """Ответ целиком: (текст, потрачено токенов)"""
+        await self._enter(chat_id)
+        error = None
+        try:
+            response = await openai.ChatCompletion.acreate(**self._params(messages, max_tokens))
+            answer = response.choices[0].message.content
+            tokens = self._record_usage(chat_id, user_id, response.get("usage") or {}, messages, answer)
+            return answer, tokens
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            self._exit(chat_id, error)
+
+    async def stream(self, messages: List[Dict[str, str]], chat_id: Optional[int] = None,
+                     user_id: Optional[int] = None, max_tokens: Optional[int] = None) -> AsyncIterator[str]:
+        """Ответ по кускам (stream=True); слот занят, пока поток не закончится"""
+        await self._enter(chat_id)
+        error = None
+        answer = ""
+        usage = {}
+        try:
+            response = await openai.ChatCompletion.acreate(stream=True, **self._params(messages, max_tokens))
+            async for chunk in response:
+                usage = chunk.get("usage") or usage
+                if chunk.choices:
+                    piece = chunk.choices[0].delta.get("content")
+                    if piece:
+                        answer += piece
+                        yield piece
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            self._exit(chat_id, error)
+            # Оборванный поток тоже расходует токены
+            if error is None or answer:
+                self._record_usage(chat_id, user_id, usage, messages, answer)
+
+    def stats(self) -> Dict:
+        return {
+            "in_flight": self.in_flight,
+            "waiting": sum(1 for _, _, future in self._waiters if not future.done()),
+            "chats_in_flight": len(self.chats),
+            "requests": self.requests,
+            "errors": self.errors,
+            "rejected": dict(self.rejected),
+            "breaker": self.breaker.state,
+            "breaker_trips": self.breaker.trips,
+        }
@@ -0,0 +1,53 @@
+import asyncio
+import bisect
+import logging
+import time
+from typing import Dict
+
+logger = logging.getLogger(__name__)
+
+# ================ ЗОНД ЗАДЕРЖКИ EVENT LOOP ================
+# Засыпает на фиксированный интервал и меряет, насколько позже проснулся:
+# это и есть время, на которое цикл был занят блокирующей работой.
+
+# Верхние границы корзин гистограммы, мс
+LAG_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000)
+
+class LoopLagProbe:
+    """Гистограмма задержек event loop"""
+
+    def __init__(self, interval: float = 0.1, warn_ms: float = 250):
+        self.interval = interval
+        self.warn_ms = warn_ms
+        self.buckets = [0] * (len(LAG_BUCKETS_MS) + 1)
+        self.samples = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def record(self, lag_ms: float):
+        self.buckets[bisect.bisect_left(LAG_BUCKETS_MS, lag_ms)] += 1
+        self.samples += 1
+        self.total_ms += lag_ms
+        self.max_ms = max(self.max_ms, lag_ms)
+        if lag_ms >= self.warn_ms:
+            logger.warning(f"🐢 Event loop был заблокирован на {lag_ms:.0f} мс")
+
+    async def run(self):
+        """Бесконечно меряет задержку цикла"""
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            lag = time.perf_counter() - started - self.interval
+            self.record(max(lag, 0.0) * 1000)
+
+    def stats(self) -> Dict:
+        histogram = {f"<={bound}ms": count for bound, count in zip(LAG_BUCKETS_MS, self.buckets)}
+        histogram[f">{LAG_BUCKETS_MS[-1]}ms"] = self.buckets[-1]
+        return {
+            "samples": self.samples,
+            "avg_ms": round(self.total_ms / self.samples, 2) if self.samples else 0.0,
+            "max_ms": round(self.max_ms, 2),
+            "histogram": histogram,
+        }
+
+loop_lag_probe = LoopLagProbe()
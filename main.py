@@ -0,0 +1,23 @@
+import os
+import logging
+from config import SERVER_MODE
+
+# Настройка логирования
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# ================ ВЫБОР ВЕБ-СЕРВЕРА ПО SERVER_MODE ================
+
+def main():
+    port = os.getenv('PORT', '8080')
+
+    if SERVER_MODE == "aiohttp":
+        logger.info("🚀 Запуск нативного aiohttp сервера")
+        from web_app import main as run_web_app
+        run_web_app()
+    else:
+        logger.info("🚀 Запуск gunicorn + Flask")
+        os.execvp("gunicorn", ["gunicorn", "app:app", "--bind", f"0.0.0.0:{port}"])
+
+if __name__ == '__main__':
+    main()
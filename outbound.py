@@ -0,0 +1,199 @@
+import asyncio
+import contextvars
+import heapq
+import itertools
+import logging
+import time
+from contextlib import contextmanager
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+from aiogram import Bot
+from aiogram.utils.exceptions import RetryAfter
+
+from rate_limit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# ================ ИСХОДЯЩИЕ СООБЩЕНИЯ С УЧЁТОМ ЛИМИТОВ ================
+# Все отправки бота (message.answer, bot.send_message, answer_photo, правки)
+# проходят через Bot.request, поэтому лимиты ставятся в одном месте:
+# сначала ведро конкретного чата, затем общее ведро бота. Общие токены
+# выдаются по приоритету: ответы пользователям раньше рассылок. На
+# RetryAfter запрос «паркуется» на указанное Telegram время и повторяется,
+# а не теряется. Пауза касается только этого чата (лимит группы 20 в минуту
+# не должен останавливать ответы в других чатах); общее ведро встаёт, только
+# если RetryAfter пришёл без чата или сразу от нескольких чатов — тогда это
+# общий лимит бота.
+
+# Приоритеты: чем меньше, тем раньше
+INTERACTIVE = 0
+BULK = 1
+
+# Методы API, которые Telegram ограничивает по частоте
+THROTTLED_METHODS = frozenset({
+    "sendMessage", "sendPhoto", "sendAnimation", "sendDocument", "sendVideo",
+    "sendAudio", "sendVoice", "sendSticker", "sendMediaGroup", "sendPoll",
+    "sendDice", "sendLocation", "forwardMessage", "copyMessage",
+    "editMessageText", "editMessageCaption", "editMessageMedia", "editMessageReplyMarkup",
+})
+
+_priority = contextvars.ContextVar("outbound_priority", default=INTERACTIVE)
+
+@contextmanager
+def bulk_sends():
+    """Отправки внутри блока (и порождённых в нём задач) уступают ответам пользователям"""
+    token = _priority.set(BULK)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+def chat_bucket(chat_id) -> TokenBucket:
+    """Ведро для одного чата: группы (отрицательный id) медленнее лички"""
+    if isinstance(chat_id, int) and chat_id > 0:
+        return TokenBucket(rate=1, capacity=3)
+    return TokenBucket(rate=20 / 60, capacity=3)
+
+class OutboundLimiter:
+    """Общее ведро с приоритетной очередью ожидающих и вёдра по чатам"""
+
+    def __init__(self, global_rate: float = 30, max_retries: int = 3, chat_idle: float = 600,
+                 flood_chats: int = 3, flood_window: float = 1.0):
+        self.global_bucket = TokenBucket(rate=global_rate, capacity=global_rate)
+        self.max_retries = max_retries
+        self.chat_idle = chat_idle
+        # RetryAfter от flood_chats разных чатов за flood_window секунд — общий лимит
+        self.flood_chats = flood_chats
+        self.flood_window = flood_window
+        self._recent_retries: Deque[Tuple[float, object]] = deque()
+        self.chats: Dict[object, TokenBucket] = {}
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+        self._pump: Optional[asyncio.Task] = None
+        self._last_sweep = time.monotonic()
+
+        # Счётчики для /stats
+        self.sent = 0
+        self.throttled = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.retry_after = 0
+        self.global_pauses = 0
+        self.gave_up = 0
+
+    def _chat(self, chat_id) -> TokenBucket:
+        bucket = self.chats.get(chat_id)
+        if bucket is None:
+            self._sweep()
+            bucket = self.chats[chat_id] = chat_bucket(chat_id)
+        return bucket
+
+    def _sweep(self):
+        """Выбрасывает вёдра чатов, которые давно полные (они ничего не помнят)"""
+        now = time.monotonic()
+        if now - self._last_sweep < self.chat_idle:
+            return
+        self._last_sweep = now
+        for chat_id, bucket in list(self.chats.items()):
+            if now - bucket.updated > self.chat_idle and not bucket._lock.locked():
+                del self.chats[chat_id]
+
+    async def _acquire_global(self):
+        # Без очереди забираем токен сразу, иначе встаём в очередь по приоритету
+        if not self._waiters and self.global_bucket.try_acquire() <= 0:
+            return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (_priority.get(), next(self._seq), future))
+        if self._pump is None or self._pump.done():
+            self._pump = asyncio.create_task(self._run_pump())
+        await future
+
+    async def _run_pump(self):
+        """Раздаёт общие токены ожидающим в порядке (приоритет, очередь)"""
+        while self._waiters:
+            wait = self.global_bucket.try_acquire()
+            if wait > 0:
+                await asyncio.sleep(wait)
+                continue
+            while self._waiters:
+                _, _, future = heapq.heappop(self._waiters)
+                if not future.done():
+                    future.set_result(None)
+                    break
+            else:
+                # Все ожидающие отменены — токен возвращаем
+                self.global_bucket.tokens += 1
+
+    async def acquire(self, chat_id):
+        """Ждёт права отправить сообщение в чат"""
+        started = time.monotonic()
+        if chat_id is not None:
+            await self._chat(chat_id).acquire()
+        await self._acquire_global()
+        waited = time.monotonic() - started
+        if waited > 0.001:
+            self.throttled += 1
+            self.wait_total += waited
+            self.wait_max = max(self.wait_max, waited)
+
+    def park(self, chat_id, seconds: float):
+        """Telegram попросил подождать: останавливаем чат, а при общем лимите — и общее ведро"""
+        self.retry_after += 1
+        if chat_id is None or self._is_flood(chat_id):
+            self.global_pauses += 1
+            self.global_bucket.pause(seconds)
+        if chat_id is not None:
+            self._chat(chat_id).pause(seconds)
+
+    def _is_flood(self, chat_id) -> bool:
+        """Несколько разных чатов получили RetryAfter почти одновременно"""
+        now = time.monotonic()
+        recent = self._recent_retries
+        recent.append((now, chat_id))
+        while recent and now - recent[0][0] > self.flood_window:
+            recent.popleft()
+        return len({chat for _, chat in recent}) >= self.flood_chats
+
+    def stats(self) -> Dict:
+        waiting = [0, 0]
+        for priority, _, future in self._waiters:
+            if not future.done():
+                waiting[priority] += 1
+        return {
+            "queue_interactive": waiting[INTERACTIVE],
+            "queue_bulk": waiting[BULK],
+            "chat_buckets": len(self.chats),
+            "sent": self.sent,
+            "throttled": self.throttled,
+            "wait_avg": round(self.wait_total / self.throttled, 3) if self.throttled else 0.0,
+            "wait_max": round(self.wait_max, 3),
+            "retry_after": self.retry_after,
+            "global_pauses": self.global_pauses,
+            "gave_up": self.gave_up,
+        }
+
+class ThrottledBot(Bot):
+    """Bot, который пропускает все отправки через OutboundLimiter"""
+
+    def __init__(self, *args, outbound: Optional[OutboundLimiter] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.outbound = outbound or OutboundLimiter()
+
+    async def request(self, method, data=None, files=None, **kwargs):
+        if method not in THROTTLED_METHODS:
+            return await super().request(method, data, files, **kwargs)
+
+        chat_id = (data or {}).get("chat_id")
+        for attempt in range(self.outbound.max_retries + 1):
+            await self.outbound.acquire(chat_id)
+            try:
+                result = await super().request(method, data, files, **kwargs)
+                self.outbound.sent += 1
+                return result
+            except RetryAfter as e:
+                logger.warning(f"⏳ RetryAfter {e.timeout}с для {method} в чат {chat_id}")
+                self.outbound.park(chat_id, e.timeout)
+                if attempt == self.outbound.max_retries:
+                    self.outbound.gave_up += 1
+                    raise
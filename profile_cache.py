@@ -0,0 +1,103 @@
+import asyncio
+import logging
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from aiogram import Bot, types
+from aiogram.dispatcher.middlewares import BaseMiddleware
+
+import async_storage as db
+
+logger = logging.getLogger(__name__)
+
+# ================ КЭШ ПРОФИЛЕЙ ПОЛЬЗОВАТЕЛЕЙ ================
+# Имена для /top и /croctop берутся из памяти, а не из get_chat_member на
+# каждого игрока. Профили пополняются сами из from_user входящих сообщений
+# и хранятся в SQLite (user_profiles). Устаревшие (старше TTL) и неизвестные
+# профили дозапрашиваются у Telegram параллельно, одним asyncio.gather.
+
+# Профиль: (имя, username, время обновления)
+Profile = Tuple[str, Optional[str], float]
+
+class ProfileCache:
+    """user_id -> (имя, username, updated_at) с ленивым обновлением по TTL"""
+
+    def __init__(self, ttl: float = 24 * 3600):
+        self.ttl = ttl
+        self.profiles: Dict[int, Profile] = {}
+
+        # Счётчики для /stats
+        self.hits = 0
+        self.fetched = 0
+        self.errors = 0
+
+    def load(self, rows: Iterable[Tuple[int, str, Optional[str], float]]):
+        """Заполняет кэш строками из БД"""
+        self.profiles = {user_id: (first_name, username, updated_at)
+                         for user_id, first_name, username, updated_at in rows}
+        logger.info(f"👤 Загружено профилей пользователей: {len(self.profiles)}")
+
+    def remember(self, user: types.User) -> Optional[Tuple[int, str, Optional[str], float]]:
+        """Запоминает пользователя. Возвращает строку для БД, если профиль новый,
+        изменился или устарел, иначе None"""
+        now = time.time()
+        known = self.profiles.get(user.id)
+        if known and known[:2] == (user.first_name, user.username) and now - known[2] < self.ttl:
+            return None
+        self.profiles[user.id] = (user.first_name, user.username, now)
+        return (user.id, user.first_name, user.username, now)
+
+    async def names(self, bot: Bot, chat_id: int, user_ids: List[int]) -> Dict[int, Optional[str]]:
+        """Имена пользователей. Неизвестные и устаревшие запрашиваются параллельно;
+        если Telegram не ответил — берём старое имя или None"""
+        now = time.time()
+        missing = [user_id for user_id in user_ids
+                   if user_id not in self.profiles or now - self.profiles[user_id][2] >= self.ttl]
+        self.hits += len(user_ids) - len(missing)
+
+        if missing:
+            members = await asyncio.gather(*(bot.get_chat_member(chat_id, user_id) for user_id in missing),
+                                           return_exceptions=True)
+            fresh = []
+            for user_id, member in zip(missing, members):
+                if isinstance(member, Exception):
+                    self.errors += 1
+                    logger.debug(f"Не удалось получить профиль {user_id}: {member}")
+                    continue
+                self.fetched += 1
+                fresh.append(self.remember(member.user))
+            fresh = [row for row in fresh if row]
+            if fresh:
+                await db.save_user_profiles(fresh)
+
+        return {user_id: self.profiles[user_id][0] if user_id in self.profiles else None
+                for user_id in user_ids}
+
+    def stats(self) -> Dict:
+        return {"profiles": len(self.profiles), "hits": self.hits,
+                "fetched": self.fetched, "errors": self.errors}
+
+class ProfileMiddleware(BaseMiddleware):
+    """Записывает from_user каждого входящего сообщения и нажатия кнопки в кэш профилей"""
+
+    def __init__(self, cache: ProfileCache):
+        super().__init__()
+        self.cache = cache
+
+    async def _remember(self, user: Optional[types.User]):
+        if user is None or user.is_bot:
+            return
+        row = self.cache.remember(user)
+        if row:
+            try:
+                await db.save_user_profiles([row])
+            except Exception as e:
+                logger.error(f"Не удалось сохранить профиль {user.id}: {e}")
+
+    async def on_pre_process_message(self, message: types.Message, data: dict):
+        await self._remember(message.from_user)
+
+    async def on_pre_process_callback_query(self, callback_query: types.CallbackQuery, data: dict):
+        await self._remember(callback_query.from_user)
+
+profile_cache = ProfileCache()
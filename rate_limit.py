@@ -0,0 +1,48 @@
+import asyncio
+import time
+
+# ================ TOKEN BUCKET ================
+# Ведро на capacity токенов, пополняется со скоростью rate токенов в секунду.
+# pause() полностью блокирует ведро (например, по RetryAfter от Telegram).
+
+class TokenBucket:
+    """Асинхронный token bucket: acquire() ждёт, пока появится токен"""
+
+    def __init__(self, rate: float, capacity: float = 1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self, tokens: float = 1) -> float:
+        """Забирает токен. Возвращает 0 при успехе или сколько секунд подождать"""
+        now = time.monotonic()
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        self._refill(now)
+        if self.tokens >= tokens:
+            self.tokens -= tokens
+            return 0.0
+        return (tokens - self.tokens) / self.rate
+
+    async def acquire(self, tokens: float = 1) -> float:
+        """Ждёт токен (в порядке очереди). Возвращает, сколько пришлось ждать"""
+        started = time.monotonic()
+        async with self._lock:
+            while True:
+                wait = self.try_acquire(tokens)
+                if wait <= 0:
+                    return time.monotonic() - started
+                await asyncio.sleep(wait)
+
+    def pause(self, seconds: float):
+        """Не выдавать токены ближайшие seconds секунд, сразу после паузы — один"""
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+        self.tokens = min(self.capacity, 1)
+        self.updated = self.blocked_until
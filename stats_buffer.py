@@ -0,0 +1,134 @@
+import asyncio
+import logging
+from typing import Dict, List, Tuple
+
+import async_storage as db
+from config import STATS_FLUSH_INTERVAL_MS, STATS_FLUSH_MAX_PENDING
+
+logger = logging.getLogger(__name__)
+
+# ================ ОТЛОЖЕННАЯ ЗАПИСЬ КАРМЫ И СТАТИСТИКИ ================
+# «+» в ответ, проверка (+3), попытки и итоги Крокодила не пишут в SQLite сразу:
+# приращения копятся в памяти по (user_id, chat_id) и раз в
+# STATS_FLUSH_INTERVAL_MS (или при STATS_FLUSH_MAX_PENDING изменениях)
+# сбрасываются одной транзакцией — один fsync на пачку вместо одного на «+».
+# Чтения прибавляют к значению из БД ещё не записанные приращения, а сброс и
+# чтение не пересекаются (общий замок), поэтому ничего не считается дважды.
+
+Key = Tuple[int, int]  # (user_id, chat_id)
+
+class StatsBuffer:
+    """Копит приращения кармы и статистики игр и пишет их пачками"""
+
+    def __init__(self, interval: float = STATS_FLUSH_INTERVAL_MS / 1000,
+                 max_pending: int = STATS_FLUSH_MAX_PENDING):
+        self.interval = interval
+        self.max_pending = max_pending
+        self.karma: Dict[Key, int] = {}
+        # (user_id, chat_id) -> [+игр, +побед, +попыток]
+        self.games: Dict[Key, List[int]] = {}
+        self._lock = asyncio.Lock()
+        self._full = asyncio.Event()
+
+        # Счётчики для /stats
+        self.increments = 0
+        self.flushes = 0
+        self.rows_written = 0
+        self.errors = 0
+
+    def __len__(self):
+        return len(self.karma) + len(self.games)
+
+    def _added(self):
+        self.increments += 1
+        if len(self) >= self.max_pending:
+            self._full.set()
+
+    def add_karma(self, user_id: int, chat_id: int, value: int = 1):
+        key = (user_id, chat_id)
+        self.karma[key] = self.karma.get(key, 0) + value
+        self._added()
+
+    def add_game_event(self, user_id: int, chat_id: int, played: int = 0, won: int = 0, guesses: int = 0):
+        entry = self.games.setdefault((user_id, chat_id), [0, 0, 0])
+        entry[0] += played
+        entry[1] += won
+        entry[2] += guesses
+        self._added()
+
+    def add_game(self, user_id: int, chat_id: int, won: bool = False):
+        """Сыгранная игра (и победа)"""
+        self.add_game_event(user_id, chat_id, played=1, won=int(won))
+
+    def add_guess(self, user_id: int, chat_id: int):
+        """Одна попытка угадать слово"""
+        self.add_game_event(user_id, chat_id, guesses=1)
+
+    async def get_user_karma(self, user_id: int, chat_id: int) -> int:
+        async with self._lock:
+            karma = await db.get_user_karma(user_id, chat_id)
+            return karma + self.karma.get((user_id, chat_id), 0)
+
+    async def get_game_stats(self, user_id: int, chat_id: int) -> Tuple[int, int]:
+        """(побед, игр) с учётом незаписанных игр"""
+        async with self._lock:
+            wins, played = await db.get_game_stats(user_id, chat_id)
+            pending = self.games.get((user_id, chat_id))
+            if pending:
+                played, wins = played + pending[0], wins + pending[1]
+            return wins, played
+
+    async def get_top_karma(self, chat_id: int, limit: int = 10) -> List[Tuple[int, int]]:
+        # Топ считается в SQL, поэтому сначала дописываем накопленное
+        async with self._lock:
+            await self._flush()
+            return await db.get_top_karma(chat_id, limit)
+
+    async def get_top_game_stats(self, chat_id: int, limit: int = 10) -> List[Tuple[int, int, int]]:
+        async with self._lock:
+            await self._flush()
+            return await db.get_top_game_stats(chat_id, limit)
+
+    async def flush(self):
+        async with self._lock:
+            await self._flush()
+
+    async def _flush(self):
+        if not self:
+            return
+        karma, self.karma = self.karma, {}
+        games, self.games = self.games, {}
+        try:
+            await db.apply_stat_deltas(
+                [(user_id, chat_id, value) for (user_id, chat_id), value in karma.items()],
+                [(user_id, chat_id, played, won, guesses)
+                 for (user_id, chat_id), (played, won, guesses) in games.items()])
+        except Exception as e:
+            # Возвращаем приращения в буфер, чтобы записать их в следующий раз
+            self.errors += 1
+            logger.error(f"Ошибка записи статистики ({len(karma) + len(games)} строк): {e}")
+            for key, value in karma.items():
+                self.karma[key] = self.karma.get(key, 0) + value
+            for key, deltas in games.items():
+                entry = self.games.setdefault(key, [0, 0, 0])
+                for i, delta in enumerate(deltas):
+                    entry[i] += delta
+            return
+        self.flushes += 1
+        self.rows_written += len(karma) + len(games)
+
+    async def run(self):
+        """Фоновая задача: сбрасывает буфер по таймеру или при переполнении"""
+        while True:
+            try:
+                await asyncio.wait_for(self._full.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._full.clear()
+            await self.flush()
+
+    def stats(self):
+        return {"pending": len(self), "increments": self.increments, "flushes": self.flushes,
+                "rows_written": self.rows_written, "errors": self.errors}
+
+stats_buffer = StatsBuffer()
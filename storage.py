@@ -0,0 +1,473 @@
+import sqlite3
+import logging
+import queue
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Iterator, List, Optional, Tuple
+
+from config import DB_PATH, DB_POOL_SIZE
+
+logger = logging.getLogger(__name__)
+
+# ================ ПУЛ СОЕДИНЕНИЙ SQLITE ================
+# Вместо sqlite3.connect на каждый вызов держим несколько долгоживущих
+# соединений в режиме WAL: читатели не блокируют писателя и наоборот.
+
+PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -8000",
+    "PRAGMA mmap_size = 67108864",
+    "PRAGMA busy_timeout = 5000",
+)
+
+class ConnectionPool:
+    """Небольшой пул долгоживущих соединений с настроенными PRAGMA"""
+
+    def __init__(self, path: str, size: int = 4):
+        self.path = path
+        self.size = size
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, check_same_thread=False, timeout=5)
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def _acquire(self) -> sqlite3.Connection:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._created < self.size:
+                self._created += 1
+                return self._connect()
+        return self._idle.get()
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """Выдаёт соединение из пула и возвращает его обратно"""
+        conn = self._acquire()
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            self._idle.put(conn)
+
+    def close(self):
+        """Закрывает все простаивающие соединения"""
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+            with self._lock:
+                self._created -= 1
+
+pool = ConnectionPool(DB_PATH, DB_POOL_SIZE)
+
+@contextmanager
+def transaction() -> Iterator[sqlite3.Connection]:
+    """Соединение с транзакцией: commit при успехе, rollback при ошибке"""
+    with pool.connection() as conn:
+        with conn:
+            yield conn
+
+# ================ СХЕМА ================
+
+DEFAULT_WORDS = {
+    "крокодил": "зелёное зубастое животное, которое живёт в реках и любит плавать",
+    "слон": "огромное серое животное с длинным хоботом и большими ушами",
+    "робот": "механическое устройство, которое может выполнять команды человека",
+    "пицца": "итальянское блюдо: круглая лепёшка с томатным соусом и сыром",
+    "самолёт": "летательный аппарат с крыльями, который перевозит людей и грузы",
+    "кофе": "ароматный напиток из зёрен, бодрит по утрам",
+    "гитара": "музыкальный инструмент с шестью струнами и грифом",
+    "радуга": "разноцветная дуга на небе после дождя",
+    "космос": "бесконечное пространство со звёздами и планетами за пределами Земли",
+    "шоколад": "сладкое лакомство из какао-бобов, бывает молочным и горьким",
+    "интернет": "глобальная сеть, которая соединяет компьютеры по всему миру",
+    "дружба": "близкие отношения между людьми, основанные на доверии и взаимопомощи",
+    "солнце": "звезда, которая даёт нам свет и тепло",
+    "море": "огромное солёное водное пространство",
+    "поезд": "транспортное средство из вагонов, которое движется по рельсам",
+    "телефон": "устройство для связи с людьми на расстоянии",
+    "компьютер": "электронная машина для работы, игр и выхода в интернет",
+    "книга": "печатное издание с текстом и картинками",
+    "цветок": "растение с красивыми лепестками и приятным запахом",
+    "дождь": "атмосферные осадки в виде капель воды"
+}
+
+def init_db():
+    """Инициализация базы данных SQLite"""
+    with transaction() as conn:
+        c = conn.cursor()
+
+        # Таблица кармы
+        c.execute('''CREATE TABLE IF NOT EXISTS karma
+                     (user_id INTEGER, chat_id INTEGER, karma INTEGER DEFAULT 0,
+                      PRIMARY KEY (user_id, chat_id))''')
+
+        # Таблица игр: только текущие игры, завершённые уезжают в архив
+        c.execute('''CREATE TABLE IF NOT EXISTS games
+                     (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                      chat_id INTEGER, game_type TEXT, active INTEGER,
+                      word TEXT, players TEXT, started_at TIMESTAMP)''')
+
+        # Архив завершённых игр
+        c.execute('''CREATE TABLE IF NOT EXISTS games_archive
+                     (id INTEGER PRIMARY KEY,
+                      chat_id INTEGER, game_type TEXT,
+                      word TEXT, players TEXT, started_at TIMESTAMP,
+                      archived_at TIMESTAMP)''')
+
+        # Таблица пар дня
+        c.execute('''CREATE TABLE IF NOT EXISTS couples
+                     (chat_id INTEGER, user1_id INTEGER, user2_id INTEGER,
+                      date TEXT)''')
+
+        # Таблица слов для игры с описанием
+        c.execute('''CREATE TABLE IF NOT EXISTS game_words
+                     (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                      word TEXT UNIQUE,
+                      description TEXT,
+                      added_by INTEGER,
+                      added_at TIMESTAMP)''')
+
+        # Статистика Крокодила
+        c.execute('''CREATE TABLE IF NOT EXISTS game_stats
+                     (user_id INTEGER,
+                      chat_id INTEGER,
+                      games_played INTEGER DEFAULT 0,
+                      games_won INTEGER DEFAULT 0,
+                      total_guesses INTEGER DEFAULT 0,
+                      last_played TIMESTAMP,
+                      PRIMARY KEY (user_id, chat_id))''')
+
+        # Подписки на утреннюю погоду: города через запятую и время отправки
+        c.execute('''CREATE TABLE IF NOT EXISTS weather_subscriptions
+                     (chat_id INTEGER PRIMARY KEY,
+                      cities TEXT,
+                      send_time TEXT,
+                      timezone TEXT DEFAULT 'Europe/Moscow',
+                      created_at TIMESTAMP)''')
+        c.execute("CREATE INDEX IF NOT EXISTS idx_weather_subscriptions_time ON weather_subscriptions (timezone, send_time)")
+
+        # Имена пользователей для рейтингов (обновляются из входящих сообщений)
+        c.execute('''CREATE TABLE IF NOT EXISTS user_profiles
+                     (user_id INTEGER PRIMARY KEY,
+                      first_name TEXT,
+                      username TEXT,
+                      updated_at REAL)''')
+
+        # Диалоги с нейросетью, вытесненные из памяти (реплики в JSON)
+        c.execute('''CREATE TABLE IF NOT EXISTS conversation_history
+                     (chat_id INTEGER PRIMARY KEY,
+                      turns TEXT,
+                      updated_at REAL)''')
+
+        # Расход токенов нейросети по дням, чатам и пользователям
+        c.execute('''CREATE TABLE IF NOT EXISTS ai_usage
+                     (day TEXT,
+                      chat_id INTEGER,
+                      user_id INTEGER,
+                      prompt_tokens INTEGER DEFAULT 0,
+                      completion_tokens INTEGER DEFAULT 0,
+                      requests INTEGER DEFAULT 0,
+                      PRIMARY KEY (day, chat_id, user_id))''')
+
+        # Свои слова-обращения к боту в отдельных чатах
+        c.execute('''CREATE TABLE IF NOT EXISTS chat_triggers
+                     (chat_id INTEGER,
+                      word TEXT,
+                      added_by INTEGER,
+                      PRIMARY KEY (chat_id, word))''')
+
+        _migrate(conn)
+
+        # Индекс горячего запроса: активная игра чата (завершение, загрузка реестра)
+        c.execute("CREATE INDEX IF NOT EXISTS idx_games_active_chat ON games (chat_id) WHERE active = 1")
+
+        # Индексы рейтингов: топ чата читается по индексу, без сортировки таблицы.
+        # user_id в конце — однозначный порядок при равных очках (как в leaderboard)
+        c.execute("CREATE INDEX IF NOT EXISTS idx_karma_chat_rank ON karma (chat_id, karma DESC, user_id)")
+        c.execute("CREATE INDEX IF NOT EXISTS idx_game_stats_chat_rank ON game_stats (chat_id, games_won DESC, user_id)")
+
+        # Добавляем начальные слова и описания, если таблица пуста
+        c.execute("SELECT COUNT(*) FROM game_words")
+        if c.fetchone()[0] == 0:
+            c.executemany("INSERT OR IGNORE INTO game_words (word, description, added_by, added_at) VALUES (?, ?, ?, ?)",
+                          [(word, description, 0, datetime.now()) for word, description in DEFAULT_WORDS.items()])
+            logger.info("Добавлены начальные слова для игры с описаниями")
+
+    archived = archive_finished_games()
+    if archived:
+        logger.info(f"🗄️ В архив перенесено {archived} завершённых игр")
+
+    logger.info("База данных инициализирована")
+
+# ================ МИГРАЦИИ ================
+# Номер применённой миграции хранится в PRAGMA user_version.
+
+def _migrate_games_primary_key(conn: sqlite3.Connection):
+    """Пересоздаёт старую таблицу games без первичного ключа"""
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(games)")]
+    if "id" in columns:
+        return
+    logger.info("🔧 Миграция: добавляем первичный ключ в games")
+    conn.execute("ALTER TABLE games RENAME TO games_old")
+    conn.execute('''CREATE TABLE games
+                    (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                     chat_id INTEGER, game_type TEXT, active INTEGER,
+                     word TEXT, players TEXT, started_at TIMESTAMP)''')
+    conn.execute('''INSERT INTO games (chat_id, game_type, active, word, players, started_at)
+                    SELECT chat_id, game_type, active, word, players, started_at
+                    FROM games_old ORDER BY rowid''')
+    conn.execute("DROP TABLE games_old")
+
+MIGRATIONS = (
+    _migrate_games_primary_key,
+)
+
+def _migrate(conn: sqlite3.Connection):
+    """Применяет недостающие миграции по порядку"""
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    for number, migration in enumerate(MIGRATIONS[version:], version + 1):
+        migration(conn)
+        conn.execute(f"PRAGMA user_version = {number}")
+
+# ================ КАРМА ================
+
+def get_user_karma(user_id: int, chat_id: int) -> int:
+    """Получить карму пользователя"""
+    with pool.connection() as conn:
+        row = conn.execute('SELECT karma FROM karma WHERE user_id = ? AND chat_id = ?',
+                           (user_id, chat_id)).fetchone()
+    return row[0] if row else 0
+
+def get_top_karma(chat_id: int, limit: int = 10) -> List[Tuple[int, int]]:
+    """Получить топ пользователей по карме: [(user_id, karma), ...]"""
+    with pool.connection() as conn:
+        return conn.execute('''SELECT user_id, karma FROM karma
+                               WHERE chat_id = ? ORDER BY karma DESC, user_id LIMIT ?''',
+                            (chat_id, limit)).fetchall()
+
+# ================ ИГРЫ ================
+
+def get_active_games() -> List[Tuple[int, str, str, Optional[str]]]:
+    """Все активные игры в Крокодила: [(chat_id, слово, started_at, описание), ...]"""
+    with pool.connection() as conn:
+        return conn.execute('''SELECT g.chat_id, g.word, g.started_at, w.description
+                               FROM games g LEFT JOIN game_words w ON w.word = g.word
+                               WHERE g.game_type = 'crocodile' AND g.active = 1''').fetchall()
+
+def start_game(chat_id: int, word: str, started_at: datetime, game_type: str = 'crocodile'):
+    """Сохраняет новую активную игру"""
+    with transaction() as conn:
+        conn.execute("INSERT INTO games (chat_id, game_type, active, word, started_at) VALUES (?, ?, 1, ?, ?)",
+                     (chat_id, game_type, word, started_at))
+
+def finish_game(chat_id: int, game_type: str = 'crocodile') -> bool:
+    """Завершает игру. False — игра уже была завершена кем-то другим"""
+    with transaction() as conn:
+        cur = conn.execute("UPDATE games SET active = 0 WHERE chat_id = ? AND game_type = ? AND active = 1",
+                           (chat_id, game_type))
+        return cur.rowcount > 0
+
+def archive_finished_games() -> int:
+    """Переносит завершённые игры в games_archive, чтобы games оставалась маленькой"""
+    with transaction() as conn:
+        conn.execute('''INSERT OR REPLACE INTO games_archive
+                        (id, chat_id, game_type, word, players, started_at, archived_at)
+                        SELECT id, chat_id, game_type, word, players, started_at, ?
+                        FROM games WHERE active = 0''', (datetime.now(),))
+        return conn.execute("DELETE FROM games WHERE active = 0").rowcount
+
+# ================ СЛОВА ДЛЯ ИГРЫ ================
+
+def get_all_words() -> List[Tuple[str, str]]:
+    """Все слова с описаниями по алфавиту"""
+    with pool.connection() as conn:
+        return conn.execute("SELECT word, description FROM game_words ORDER BY word").fetchall()
+
+def add_word(word: str, description: str, added_by: int) -> bool:
+    """Добавляет слово. False — такое слово уже есть"""
+    try:
+        with transaction() as conn:
+            conn.execute("INSERT INTO game_words (word, description, added_by, added_at) VALUES (?, ?, ?, ?)",
+                         (word, description, added_by, datetime.now()))
+        return True
+    except sqlite3.IntegrityError:
+        return False
+
+# ================ СТАТИСТИКА КРОКОДИЛА ================
+
+# Одно событие игры: (user_id, chat_id, +игр, +побед, +попыток)
+GameEvent = Tuple[int, int, int, int, int]
+
+_GAME_STATS_UPSERT = '''INSERT INTO game_stats (user_id, chat_id, games_played, games_won, total_guesses, last_played)
+                         VALUES (?, ?, ?, ?, ?, datetime('now', 'localtime'))
+                         ON CONFLICT(user_id, chat_id) DO UPDATE SET
+                             games_played = games_played + excluded.games_played,
+                             games_won = games_won + excluded.games_won,
+                             total_guesses = total_guesses + excluded.total_guesses,
+                             last_played = excluded.last_played'''
+
+def get_game_stats(user_id: int, chat_id: int) -> Tuple[int, int]:
+    """Статистика игрока: (побед, игр)"""
+    with pool.connection() as conn:
+        row = conn.execute("SELECT games_won, games_played FROM game_stats WHERE user_id = ? AND chat_id = ?",
+                           (user_id, chat_id)).fetchone()
+    return tuple(row) if row else (0, 0)
+
+def get_top_game_stats(chat_id: int, limit: int = 10) -> List[Tuple[int, int, int]]:
+    """Топ игроков по победам: [(user_id, побед, игр), ...]"""
+    with pool.connection() as conn:
+        return conn.execute('''SELECT user_id, games_won, games_played
+                               FROM game_stats
+                               WHERE chat_id = ?
+                               ORDER BY games_won DESC, user_id
+                               LIMIT ?''', (chat_id, limit)).fetchall()
+
+# ================ ПАКЕТНАЯ ЗАПИСЬ ПРИРАЩЕНИЙ ================
+
+def apply_stat_deltas(karma: List[Tuple[int, int, int]], games: List[GameEvent]):
+    """Применяет накопленные приращения одной транзакцией.
+    karma: [(user_id, chat_id, +карма)], games: [(user_id, chat_id, +игр, +побед, +попыток)]"""
+    with transaction() as conn:
+        conn.executemany('''INSERT INTO karma (user_id, chat_id, karma)
+                            VALUES (?, ?, ?)
+                            ON CONFLICT(user_id, chat_id)
+                            DO UPDATE SET karma = karma + excluded.karma''', karma)
+        conn.executemany(_GAME_STATS_UPSERT, games)
+
+# ================ ПАРЫ ДНЯ ================
+
+def add_couple(chat_id: int, user1_id: int, user2_id: int, date):
+    """Сохраняет пару дня"""
+    with transaction() as conn:
+        conn.execute("INSERT INTO couples (chat_id, user1_id, user2_id, date) VALUES (?, ?, ?, ?)",
+                     (chat_id, user1_id, user2_id, date))
+
+# ================ ПОДПИСКИ НА ПОГОДУ ================
+
+def subscribe_weather(chat_id: int, cities: List[str], send_time: str, timezone: str = 'Europe/Moscow'):
+    """Создаёт или обновляет подписку чата на погоду"""
+    with transaction() as conn:
+        conn.execute('''INSERT INTO weather_subscriptions (chat_id, cities, send_time, timezone, created_at)
+                        VALUES (?, ?, ?, ?, ?)
+                        ON CONFLICT(chat_id) DO UPDATE SET
+                            cities = excluded.cities,
+                            send_time = excluded.send_time,
+                            timezone = excluded.timezone''',
+                     (chat_id, ",".join(cities), send_time, timezone, datetime.now()))
+
+def unsubscribe_weather(chat_id: int) -> bool:
+    """Удаляет подписку. False — подписки не было"""
+    with transaction() as conn:
+        return conn.execute("DELETE FROM weather_subscriptions WHERE chat_id = ?", (chat_id,)).rowcount > 0
+
+def get_weather_timezones() -> List[str]:
+    """Часовые пояса, в которых есть подписки"""
+    with pool.connection() as conn:
+        return [row[0] for row in conn.execute("SELECT DISTINCT timezone FROM weather_subscriptions")]
+
+def get_due_weather_subscriptions(timezone: str, send_time: str) -> List[Tuple[int, List[str]]]:
+    """Подписки, которым пора отправить погоду: [(chat_id, города), ...]"""
+    with pool.connection() as conn:
+        rows = conn.execute("SELECT chat_id, cities FROM weather_subscriptions WHERE timezone = ? AND send_time = ?",
+                            (timezone, send_time)).fetchall()
+    return [(chat_id, cities.split(",")) for chat_id, cities in rows]
+
+# ================ ПРОФИЛИ ПОЛЬЗОВАТЕЛЕЙ ================
+
+def get_user_profiles() -> List[Tuple[int, str, Optional[str], float]]:
+    """Все сохранённые профили: [(user_id, имя, username, updated_at), ...]"""
+    with pool.connection() as conn:
+        return conn.execute("SELECT user_id, first_name, username, updated_at FROM user_profiles").fetchall()
+
+def save_user_profiles(profiles: List[Tuple[int, str, Optional[str], float]]):
+    """Сохраняет пачку профилей одной транзакцией"""
+    with transaction() as conn:
+        conn.executemany('''INSERT INTO user_profiles (user_id, first_name, username, updated_at)
+                            VALUES (?, ?, ?, ?)
+                            ON CONFLICT(user_id) DO UPDATE SET
+                                first_name = excluded.first_name,
+                                username = excluded.username,
+                                updated_at = excluded.updated_at''',
+                         profiles)
+
+# ================ ИСТОРИЯ ДИАЛОГОВ ================
+
+def save_conversations(rows: List[Tuple[int, str, float]]):
+    """Сохраняет диалоги: [(chat_id, реплики в JSON, updated_at), ...]"""
+    with transaction() as conn:
+        conn.executemany('''INSERT INTO conversation_history (chat_id, turns, updated_at)
+                            VALUES (?, ?, ?)
+                            ON CONFLICT(chat_id) DO UPDATE SET
+                                turns = excluded.turns,
+                                updated_at = excluded.updated_at''', rows)
+
+def load_conversation(chat_id: int) -> Optional[str]:
+    """Сохранённый диалог чата (JSON) или None"""
+    with pool.connection() as conn:
+        row = conn.execute("SELECT turns FROM conversation_history WHERE chat_id = ?", (chat_id,)).fetchone()
+    return row[0] if row else None
+
+# ================ РАСХОД ТОКЕНОВ НЕЙРОСЕТИ ================
+
+def save_ai_usage(rows: List[Tuple[str, int, int, int, int, int]]):
+    """Прибавляет расход: [(день, chat_id, user_id, +prompt, +completion, +запросов), ...]"""
+    with transaction() as conn:
+        conn.executemany('''INSERT INTO ai_usage (day, chat_id, user_id, prompt_tokens, completion_tokens, requests)
+                            VALUES (?, ?, ?, ?, ?, ?)
+                            ON CONFLICT(day, chat_id, user_id) DO UPDATE SET
+                                prompt_tokens = prompt_tokens + excluded.prompt_tokens,
+                                completion_tokens = completion_tokens + excluded.completion_tokens,
+                                requests = requests + excluded.requests''', rows)
+
+def get_ai_usage_by_chat(day: str) -> List[Tuple[int, int]]:
+    """Токены за день по чатам: [(chat_id, токенов), ...]"""
+    with pool.connection() as conn:
+        return conn.execute('''SELECT chat_id, SUM(prompt_tokens + completion_tokens)
+                               FROM ai_usage WHERE day = ? GROUP BY chat_id''', (day,)).fetchall()
+
+def get_top_ai_usage_chats(day: str, limit: int = 10) -> List[Tuple[int, int, int, int]]:
+    """Чаты, больше всех потратившие за день: [(chat_id, prompt, completion, запросов), ...]"""
+    with pool.connection() as conn:
+        return conn.execute('''SELECT chat_id, SUM(prompt_tokens), SUM(completion_tokens), SUM(requests)
+                               FROM ai_usage WHERE day = ?
+                               GROUP BY chat_id
+                               ORDER BY SUM(prompt_tokens + completion_tokens) DESC
+                               LIMIT ?''', (day, limit)).fetchall()
+
+def get_top_ai_usage_users(day: str, chat_id: int, limit: int = 10) -> List[Tuple[int, int, int, int]]:
+    """Пользователи чата, больше всех потратившие за день: [(user_id, prompt, completion, запросов), ...]"""
+    with pool.connection() as conn:
+        return conn.execute('''SELECT user_id, prompt_tokens, completion_tokens, requests
+                               FROM ai_usage WHERE day = ? AND chat_id = ?
+                               ORDER BY prompt_tokens + completion_tokens DESC
+                               LIMIT ?''', (day, chat_id, limit)).fetchall()
+
+# ================ СЛОВА-ТРИГГЕРЫ ЧАТОВ ================
+
+def get_chat_triggers() -> List[Tuple[int, str]]:
+    """Все свои триггеры: [(chat_id, слово), ...]"""
+    with pool.connection() as conn:
+        return conn.execute("SELECT chat_id, word FROM chat_triggers").fetchall()
+
+def add_chat_trigger(chat_id: int, word: str, added_by: int):
+    with transaction() as conn:
+        conn.execute("INSERT OR IGNORE INTO chat_triggers (chat_id, word, added_by) VALUES (?, ?, ?)",
+                     (chat_id, word, added_by))
+
+def remove_chat_trigger(chat_id: int, word: str):
+    with transaction() as conn:
+        conn.execute("DELETE FROM chat_triggers WHERE chat_id = ? AND word = ?", (chat_id, word))
@@ -0,0 +1,109 @@
+import asyncio
+import html
+import logging
+import time
+from typing import Dict, Optional
+
+from aiogram import Bot
+from aiogram.utils.exceptions import MessageNotModified, TelegramAPIError
+
+logger = logging.getLogger(__name__)
+
+# ================ ПОТОКОВЫЕ ОТВЕТЫ НЕЙРОСЕТИ ================
+# Бот сразу отправляет заглушку, а ответ нейросети дописывает в неё через
+# edit_message_text по мере прихода токенов. Правки идут не чаще раза в
+# interval секунд (лимит Telegram на редактирование), промежуточные куски
+# склеиваются, а по окончании потока обязательно уходит финальный текст.
+
+# Максимальная длина сообщения в Telegram
+MESSAGE_LIMIT = 4096
+
+class StreamingMessage:
+    """Сообщение, которое дописывается правками с ограничением частоты"""
+
+    def __init__(self, bot: Bot, chat_id: int, message_id: int, interval: float = 1.0):
+        self.bot = bot
+        self.chat_id = chat_id
+        self.message_id = message_id
+        self.interval = interval
+        self.text = ""
+        self.shown = ""
+        self.edits = 0
+        self.first_visible: Optional[float] = None
+        self._done = False
+        self._changed = asyncio.Event()
+        self._runner = asyncio.create_task(self._run())
+
+    def update(self, text: str):
+        """Новый текст целиком (правка уйдёт, когда позволит лимит)"""
+        self.text = text
+        self._changed.set()
+
+    async def finish(self, text: str):
+        """Финальный текст: дожидается последней правки"""
+        self._done = True
+        self.update(text)
+        await self._runner
+
+    async def _run(self):
+        while True:
+            await self._changed.wait()
+            self._changed.clear()
+            if self.text != self.shown:
+                await self._edit(self.text)
+            if self._done and self.text == self.shown:
+                return
+            if not self._done:
+                await asyncio.sleep(self.interval)
+
+    async def _edit(self, text: str):
+        try:
+            await self.bot.edit_message_text(html.escape(text[:MESSAGE_LIMIT]), self.chat_id, self.message_id)
+        except MessageNotModified:
+            pass
+        except TelegramAPIError as e:
+            logger.warning(f"Не удалось обновить ответ в чате {self.chat_id}: {e}")
+        # Даже при ошибке не повторяем тот же текст бесконечно
+        self.shown = text
+        self.edits += 1
+        if self.first_visible is None and text:
+            self.first_visible = time.monotonic()
+
+class StreamingStats:
+    """Время до первого видимого токена: потоком и целым ответом"""
+
+    def __init__(self):
+        self.streams = 0
+        self.edits = 0
+        self.errors = 0
+        self.ttft_total = 0.0
+        self.ttft_max = 0.0
+        self.full_replies = 0
+        self.full_total = 0.0
+
+    def record_stream(self, started: float, message: StreamingMessage, failed: bool = False):
+        self.streams += 1
+        self.edits += message.edits
+        self.errors += int(failed)
+        if message.first_visible is not None:
+            ttft = message.first_visible - started
+            self.ttft_total += ttft
+            self.ttft_max = max(self.ttft_max, ttft)
+
+    def record_full(self, started: float):
+        """Ответ без потока: первый токен виден только вместе с последним"""
+        self.full_replies += 1
+        self.full_total += time.monotonic() - started
+
+    def stats(self) -> Dict:
+        return {
+            "streams": self.streams,
+            "edits": self.edits,
+            "errors": self.errors,
+            "ttft_avg": round(self.ttft_total / self.streams, 3) if self.streams else 0.0,
+            "ttft_max": round(self.ttft_max, 3),
+            "full_replies": self.full_replies,
+            "full_reply_avg": round(self.full_total / self.full_replies, 3) if self.full_replies else 0.0,
+        }
+
+streaming_stats = StreamingStats()
@@ -0,0 +1,21 @@
+import os
+import sys
+import tempfile
+
+# config.py требует токены, а storage открывает DB_PATH при импорте —
+# подставляем тестовые значения до первого импорта модулей бота
+_tmp = tempfile.mkdtemp(prefix="bot-tests-")
+os.environ.setdefault("BOT_TOKEN", "123456:TEST")
+os.environ.setdefault("MEGANOVA_API_KEY", "test")
+os.environ["DB_PATH"] = os.path.join(_tmp, "test.db")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+@pytest.fixture(scope="session")
+def db():
+    """Схема в тестовой базе (одна на сессию; таблицы чистят сами тесты)"""
+    import storage
+    storage.init_db()
+    return storage
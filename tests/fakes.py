@@ -0,0 +1,40 @@
+import asyncio
+import time
+from typing import Dict, List, Tuple
+
+from aiogram import Bot
+from aiogram.utils.exceptions import RetryAfter
+
+from outbound import OutboundLimiter, ThrottledBot
+
+class FakeTelegram(Bot):
+    """Bot без сети: запоминает, когда и куда ушёл каждый запрос.
+    retry_after[chat_id] — список пауз, которые Telegram вернёт этому чату по очереди."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__("123456:TEST", *args, **kwargs)
+        self.sent: List[Tuple[float, str, object, Dict]] = []
+        self.retry_after: Dict[object, List[float]] = {}
+        self.latency = 0.0
+
+    async def request(self, method, data=None, files=None, **kwargs):
+        data = data or {}
+        chat_id = data.get("chat_id")
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        pauses = self.retry_after.get(chat_id)
+        if pauses:
+            raise RetryAfter(pauses.pop(0))
+        self.sent.append((time.monotonic(), method, chat_id, data))
+        return {"message_id": len(self.sent), "date": int(time.time()),
+                "chat": {"id": chat_id or 0, "type": "private" if (chat_id or 0) > 0 else "group"},
+                "text": data.get("text")}
+
+    def times(self, chat_id=None) -> List[float]:
+        return [at for at, _, chat, _ in self.sent if chat_id is None or chat == chat_id]
+
+class FakeThrottledBot(ThrottledBot, FakeTelegram):
+    """ThrottledBot поверх FakeTelegram: лимиты настоящие, сеть поддельная"""
+
+    def __init__(self, outbound: OutboundLimiter = None):
+        super().__init__(outbound=outbound)
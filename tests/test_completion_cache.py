@@ -0,0 +1,22 @@
+import asyncio
+
+from completion_cache import CompletionCache, cache_key
+
+def test_short_answers_are_not_served_as_full_ones():
+    cache = CompletionCache(variants=1, ttl=60, max_entries=10)
+    full = cache_key("Расскажи  сказку", "model", 0.8, 250)
+    short = cache_key("расскажи сказку", "model", 0.8, 120)
+    assert full != short
+    assert full == cache_key("расскажи сказку", "model", 0.81, 250)
+
+    async def answer(text):
+        return text, 10
+
+    async def main():
+        await cache.get(short, lambda: answer("короткая сказка"))
+        return await cache.get(full, lambda: answer("длинная сказка"))
+
+    assert asyncio.run(main()) == "длинная сказка"
+    assert cache.peek(short) == "короткая сказка"
+    assert cache.peek(full) == "длинная сказка"
+    assert cache.misses == 2
@@ -0,0 +1,63 @@
+import asyncio
+import random
+import tracemalloc
+
+from conversation_memory import ConversationStore
+
+WORDS = "привет как дела что нового расскажи про погоду кино игру крокодил слон кофе".split()
+
+def phrase(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+async def chat_traffic(store: ConversationStore, chats: int, exchanges: int, seed: int = 0):
+    rng = random.Random(seed)
+    prompts = [phrase(rng, rng.randint(3, 30)) for _ in range(200)]
+    replies = [phrase(rng, rng.randint(20, 120)) for _ in range(200)]
+    for n in range(exchanges):
+        # Номер в конце — у каждой реплики своя строка, как в живом чате
+        await store.add_exchange(-rng.randrange(chats), f"{rng.choice(prompts)} {n}", f"{rng.choice(replies)} {n}")
+
+def test_ten_thousand_chats_stay_under_memory_limit():
+    limit = 8 * 1024 * 1024
+    store = ConversationStore(max_turns=20, token_budget=1500, max_chats=100_000, memory_limit=limit, spill=False)
+
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    asyncio.run(chat_traffic(store, chats=10_000, exchanges=30_000))
+    used = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+
+    assert store.size <= limit
+    # Учёт размера в store совпадает с реальной памятью с точностью до 10%
+    assert used <= limit * 1.1
+    assert store.evicted > 0  # без вытеснения 10k чатов в 8 МБ не поместились бы
+
+def test_history_respects_turn_and_token_budget():
+    store = ConversationStore(max_turns=6, token_budget=200, max_chats=10, memory_limit=10 ** 9, spill=False)
+    rng = random.Random(1)
+
+    async def main():
+        for _ in range(20):
+            await store.add_exchange(1, phrase(rng, 10), phrase(rng, 40))
+        return await store.history(1)
+
+    history = asyncio.run(main())
+    assert 1 <= len(history) <= 6
+    assert history[-1]["role"] == "assistant"
+    assert store.chats[1].tokens <= 200 or len(history) == 1
+
+def test_evicted_chats_spill_to_sqlite_and_come_back(db):
+    with db.transaction() as conn:
+        conn.execute("DELETE FROM conversation_history")
+    store = ConversationStore(max_turns=20, token_budget=1500, max_chats=100, memory_limit=10 ** 9, spill=True)
+
+    async def main():
+        await store.add_exchange(42, "как зовут кота?", "Барсик")
+        await chat_traffic(store, chats=300, exchanges=1000, seed=2)
+        assert 42 not in store.chats
+        return await store.history(42)
+
+    history = asyncio.run(main())
+    assert history == [{"role": "user", "content": "как зовут кота?"}, {"role": "assistant", "content": "Барсик"}]
+    assert store.spilled > 0 and store.restored > 0
+    assert len(store.chats) <= 100
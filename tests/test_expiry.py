@@ -0,0 +1,130 @@
+import asyncio
+import random
+import time
+from datetime import timedelta
+
+import pytest
+
+import game_registry as registry_module
+from expiry_scheduler import ExpiryScheduler
+from game_registry import GameRegistry
+
+def test_thousands_of_deadlines_fire_on_time_and_once():
+    rng = random.Random(0)
+    fired = {}
+
+    async def on_expire(key, deadline):
+        fired[key] = fired.get(key, 0) + 1
+        lateness.append(time.time() - deadline)
+
+    lateness = []
+
+    async def main():
+        scheduler = ExpiryScheduler(on_expire)
+        runner = asyncio.create_task(scheduler.run())
+        now = time.time()
+        deadlines = {}
+        for key in range(5000):
+            deadlines[key] = now + rng.uniform(0.05, 0.5)
+            scheduler.schedule(key, deadlines[key], deadlines[key])
+        # Половину отменяем, часть переносим — сработать должен только последний срок
+        for key in range(0, 5000, 2):
+            scheduler.cancel(key)
+        for key in range(1, 1000, 2):
+            deadlines[key] = time.time() + 0.3
+            scheduler.schedule(key, deadlines[key], deadlines[key])
+        await asyncio.sleep(0.7)
+        runner.cancel()
+        return scheduler
+
+    scheduler = asyncio.run(main())
+    assert sorted(fired) == list(range(1, 5000, 2))
+    assert set(fired.values()) == {1}
+    assert min(lateness) >= 0
+    assert sorted(lateness)[int(len(lateness) * 0.99)] < 0.05
+    assert len(scheduler) == 0 and scheduler.fired == 2500
+
+def test_earlier_deadline_wakes_sleeping_scheduler():
+    fired = []
+
+    async def on_expire(key, item):
+        fired.append((key, time.time()))
+
+    async def main():
+        scheduler = ExpiryScheduler(on_expire)
+        runner = asyncio.create_task(scheduler.run())
+        scheduler.schedule("late", time.time() + 60, None)
+        await asyncio.sleep(0.01)  # цикл уснул до далёкого срока
+        started = time.time()
+        scheduler.schedule("soon", started + 0.05, None)
+        await asyncio.sleep(0.15)
+        runner.cancel()
+        return started
+
+    started = asyncio.run(main())
+    assert [key for key, _ in fired] == ["soon"]
+    assert fired[0][1] - started < 0.1
+
+@pytest.fixture
+def games(db, monkeypatch):
+    with db.transaction() as conn:
+        conn.execute("DELETE FROM games")
+    monkeypatch.setattr(registry_module, "CROCODILE_DURATION", timedelta(seconds=1))
+    return db
+
+def test_registry_expires_concurrent_games_across_chats(games):
+    chats = list(range(-100_000, -100_000 + 2000))
+    expired = []
+
+    async def main():
+        registry = GameRegistry()
+        registry.on_expire = lambda game: _record(expired, game)
+        runner = asyncio.create_task(registry.expiry.run())
+        started = await asyncio.gather(*(registry.start(chat_id, "слон", "описание") for chat_id in chats),
+                                       registry.start(chats[0], "кофе", ""))
+        assert started[-1] is None  # вторая игра в чате не начинается
+        # Часть игр отгадана до срока
+        for chat_id in chats[:500]:
+            assert await registry.finish(chat_id)
+        await _wait_empty(registry)
+        runner.cancel()
+        return registry
+
+    registry = asyncio.run(main())
+    assert sorted(game.chat_id for game in expired) == chats[500:]
+    assert all(game.is_expired() for game in expired)
+    assert registry.stats()["active_games"] == 0
+    assert games.get_active_games() == []
+
+def test_restart_rebuilds_schedule_from_db(games):
+    expired = []
+
+    async def main():
+        before = GameRegistry()
+        for chat_id in range(-200, -100):
+            await before.start(chat_id, "кофе", "напиток")
+
+        # «Перезапуск»: новый реестр поднимается из таблицы games
+        after = GameRegistry()
+        after.on_expire = lambda game: _record(expired, game)
+        after.load(games.get_active_games())
+        assert len(after.expiry) == 100
+        runner = asyncio.create_task(after.expiry.run())
+        await _wait_empty(after)
+        runner.cancel()
+
+    asyncio.run(main())
+    assert sorted(game.chat_id for game in expired) == list(range(-200, -100))
+    # Описание после перезапуска берётся из game_words
+    assert expired[0].word == "кофе" and "напиток" in expired[0].description
+    assert games.get_active_games() == []
+
+async def _record(expired, game):
+    expired.append(game)
+
+async def _wait_empty(registry: GameRegistry, timeout: float = 5):
+    """Ждёт, пока все игры реестра завершатся (по сроку или отгадкой)"""
+    deadline = time.monotonic() + timeout
+    while registry.games or registry.expiry._tasks:
+        assert time.monotonic() < deadline, "игры не завершились вовремя"
+        await asyncio.sleep(0.05)
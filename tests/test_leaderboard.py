@@ -0,0 +1,76 @@
+import asyncio
+import random
+
+import pytest
+
+from leaderboard import Leaderboard
+
+CHAT = -100
+
+@pytest.fixture
+def karma(db):
+    with db.transaction() as conn:
+        conn.execute("DELETE FROM karma")
+    return db
+
+def make_board(storage) -> Leaderboard:
+    async def loader(chat_id, limit):
+        return storage.get_top_karma(chat_id, limit)
+    return Leaderboard(loader, size=10)
+
+def add(storage, board: Leaderboard, user_id: int, value: int):
+    """То же, что add_karma в bot.py: приращение в БД и новое значение в топ"""
+    storage.apply_stat_deltas([(user_id, CHAT, value)], [])
+    board.update(CHAT, (user_id, storage.get_user_karma(user_id, CHAT)))
+
+def test_outsider_enters_and_leader_stays(karma):
+    for user_id in range(1, 13):
+        karma.apply_stat_deltas([(user_id, CHAT, user_id * 10)], [])
+    board = make_board(karma)
+    asyncio.run(board.top(CHAT))
+
+    add(karma, board, 1, 90)  # 10 -> 100: входит в топ, вытесняет последнего (3, 30)
+    top = asyncio.run(board.top(CHAT))
+    assert top == karma.get_top_karma(CHAT, 10)
+    assert (1, 100) in top and (3, 30) not in top
+
+    add(karma, board, 2, 200)  # 20 -> 220: новый лидер, прежний (12, 120) остаётся вторым
+    top = asyncio.run(board.top(CHAT))
+    assert top == karma.get_top_karma(CHAT, 10)
+    assert top[:2] == [(2, 220), (12, 120)]
+    assert board.invalidations == 0 and board.loads == 1
+
+def test_member_drop_below_last_invalidates(karma):
+    for user_id in range(1, 13):
+        karma.apply_stat_deltas([(user_id, CHAT, user_id * 10)], [])
+    board = make_board(karma)
+    asyncio.run(board.top(CHAT))
+
+    add(karma, board, 12, -200)  # лидер уходит в минус — на его место мог подняться (2, 20)
+    assert not board.tracks(CHAT)
+    assert asyncio.run(board.top(CHAT)) == karma.get_top_karma(CHAT, 10)
+
+@pytest.mark.parametrize("seed", range(5))
+def test_random_updates_match_sql(karma, seed):
+    rng = random.Random(seed)
+    board = make_board(karma)
+    for step in range(3000):
+        # Чаще плюсы, иногда минусы (как /karma в чате) и равные счёты
+        add(karma, board, rng.randint(1, 60), rng.choice((1, 1, 1, 2, 3, -1, -5)))
+        if step % 50 == 0:
+            assert asyncio.run(board.top(CHAT)) == karma.get_top_karma(CHAT, 10)
+    assert asyncio.run(board.top(CHAT)) == karma.get_top_karma(CHAT, 10)
+
+def test_increments_only_are_served_from_memory(karma):
+    rng = random.Random(1)
+    board = make_board(karma)
+    reads = 0
+    for step in range(3000):
+        add(karma, board, rng.randint(1, 500), rng.randint(1, 3))
+        if step % 50 == 0:
+            reads += 1
+            assert asyncio.run(board.top(CHAT)) == karma.get_top_karma(CHAT, 10)
+    # Плюсы никогда не опускают участника топа — загрузка только первая
+    assert board.loads == 1
+    assert board.hits == reads - 1
+    assert board.invalidations == 0
@@ -0,0 +1,41 @@
+import asyncio
+
+import pytest
+
+from llm_client import HALF_OPEN, OPEN, LLMClient, LLMUnavailable
+
+def make_client(**kwargs) -> LLMClient:
+    return LLMClient("fake-model", 0.7, max_tokens=250, **kwargs)
+
+def test_open_breaker_does_not_spend_budget():
+    llm = make_client(rate_per_min=60)
+    llm.breaker.state, llm.breaker.opened_at = OPEN, float("inf")
+    tokens = llm.budget.tokens
+
+    for _ in range(20):
+        with pytest.raises(LLMUnavailable):
+            asyncio.run(llm._enter(1))
+    assert llm.rejected == {"circuit_open": 20}
+    assert llm.budget.tokens == tokens
+
+def test_full_queue_does_not_spend_budget():
+    llm = make_client(max_concurrency=1, max_queue=0, rate_per_min=60)
+    asyncio.run(llm._enter(1))
+    tokens = llm.budget.tokens
+
+    with pytest.raises(LLMUnavailable):
+        asyncio.run(llm._enter(2))
+    assert llm.rejected == {"queue_full": 1}
+    assert llm.budget.tokens == tokens
+
+def test_rate_limited_probe_is_returned_to_breaker():
+    llm = make_client(rate_per_min=6)  # ёмкость бюджета — один запрос
+    llm.budget.try_acquire()
+    llm.breaker.state, llm.breaker.opened_at = OPEN, 0.0
+
+    with pytest.raises(LLMUnavailable):
+        asyncio.run(llm._enter(1))
+    assert llm.rejected == {"rate_limited": 1}
+    # Пробный запрос не ушёл — следующий после паузы снова может им стать
+    assert llm.breaker.state == OPEN
+    assert llm.breaker.allow() and llm.breaker.state == HALF_OPEN
@@ -0,0 +1,74 @@
+import asyncio
+import time
+
+from fakes import FakeThrottledBot
+from outbound import OutboundLimiter, bulk_sends
+
+GROUP_A, GROUP_B, GROUP_C, GROUP_D = -1001, -1002, -1003, -1004
+
+def test_retry_after_in_one_chat_does_not_stop_other_chats():
+    async def main():
+        bot = FakeThrottledBot()
+        bot.retry_after[GROUP_A] = [1]
+        started = time.monotonic()
+        await asyncio.gather(bot.send_message(GROUP_A, "a"),
+                             bot.send_message(GROUP_B, "b"),
+                             bot.send_message(42, "reply"))
+        return bot, started
+
+    bot, started = asyncio.run(main())
+    assert bot.times(GROUP_B)[0] - started < 0.1
+    assert bot.times(42)[0] - started < 0.1
+    assert bot.times(GROUP_A)[0] - started >= 1  # припаркованный чат повторяет после паузы
+    assert bot.outbound.retry_after == 1 and bot.outbound.global_pauses == 0
+
+def test_retry_after_from_many_chats_pauses_everyone():
+    async def main():
+        bot = FakeThrottledBot(OutboundLimiter(flood_chats=3, flood_window=1))
+        for chat_id in (GROUP_A, GROUP_B, GROUP_C):
+            bot.retry_after[chat_id] = [0.5]
+        started = time.monotonic()
+        await asyncio.gather(*(bot.send_message(chat_id, "x") for chat_id in (GROUP_A, GROUP_B, GROUP_C)))
+        await bot.send_message(GROUP_D, "after flood")
+        return bot, started
+
+    bot, started = asyncio.run(main())
+    assert bot.outbound.global_pauses >= 1
+    assert bot.times(GROUP_D)[0] - started >= 0.5
+
+def test_interactive_replies_overtake_bulk():
+    async def main():
+        bot = FakeThrottledBot(OutboundLimiter(global_rate=10))
+        bot.outbound.global_bucket.tokens = 0
+
+        async def broadcast():
+            with bulk_sends():
+                await asyncio.gather(*(bot.send_message(-2000 - i, "weather") for i in range(10)))
+
+        task = asyncio.create_task(broadcast())
+        await asyncio.sleep(0.01)  # рассылка уже стоит в очереди
+        await bot.send_message(7, "reply")
+        await task
+        return bot
+
+    bot = asyncio.run(main())
+    order = [chat_id for _, _, chat_id, _ in bot.sent]
+    assert order.index(7) <= 1
+    assert len(order) == 11
+
+def test_global_rate_is_respected():
+    async def main():
+        bot = FakeThrottledBot(OutboundLimiter(global_rate=30))
+        with bulk_sends():
+            await asyncio.gather(*(bot.send_message(-3000 - i, "x") for i in range(90)))
+        return bot
+
+    bot = asyncio.run(main())
+    times = bot.times()
+    # 30 сразу (ёмкость ведра), остальные 60 — со скоростью 30 в секунду:
+    # к моменту i-й отправки прошло не меньше (i - 29) / 30 секунд
+    for i in range(30, len(times)):
+        assert times[i] - times[0] >= (i - 29) / 30 - 0.01
+    assert times[-1] - times[0] < 2.5
+    stats = bot.outbound.stats()
+    assert stats["sent"] == 90 and stats["queue_bulk"] == 0
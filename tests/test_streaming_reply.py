@@ -0,0 +1,83 @@
+import asyncio
+import json
+import time
+
+import openai
+import pytest
+from aiohttp import web
+
+from fakes import FakeTelegram
+from llm_client import LLMClient
+from streaming_reply import StreamingMessage, StreamingStats
+
+TOKENS = [f"слово{i} " for i in range(40)]
+TOKEN_DELAY = 0.025  # полный ответ генерируется ~1 с
+
+async def fake_completions(request: web.Request):
+    """OpenAI-совместимый /chat/completions: поток SSE или ответ целиком"""
+    body = await request.json()
+    if not body.get("stream"):
+        await asyncio.sleep(TOKEN_DELAY * len(TOKENS))
+        return web.json_response({"object": "chat.completion", "choices": [
+            {"index": 0, "message": {"role": "assistant", "content": "".join(TOKENS)}}]})
+
+    response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+    await response.prepare(request)
+    for token in TOKENS:
+        await asyncio.sleep(TOKEN_DELAY)
+        chunk = {"object": "chat.completion.chunk", "choices": [{"index": 0, "delta": {"content": token}}]}
+        await response.write(f"data: {json.dumps(chunk)}\n\n".encode())
+    await response.write(b"data: [DONE]\n\n")
+    return response
+
+@pytest.fixture
+def fake_openai(monkeypatch):
+    """Поднимает заглушку в цикле теста и направляет на неё openai"""
+    async def start():
+        app = web.Application()
+        app.router.add_post("/v1/chat/completions", fake_completions)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        monkeypatch.setattr(openai, "api_base", f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}/v1")
+        return runner
+    return start
+
+def test_stream_shows_first_tokens_long_before_full_reply(fake_openai):
+    chat_id = 77
+
+    async def main():
+        runner = await fake_openai()
+        llm = LLMClient("fake-model", 0.7, max_tokens=250)
+        bot = FakeTelegram()
+        stats = StreamingStats()
+        try:
+            started = time.monotonic()
+            await llm.complete([{"role": "user", "content": "привет"}], chat_id)
+            stats.record_full(started)
+
+            started = time.monotonic()
+            placeholder = await bot.send_message(chat_id, "💭 Думаю...")
+            reply = StreamingMessage(bot, chat_id, placeholder.message_id, interval=0.2)
+            answer = ""
+            async for piece in llm.stream([{"role": "user", "content": "привет"}], chat_id):
+                answer += piece
+                reply.update(answer)
+            await reply.finish(answer)
+            stats.record_stream(started, reply)
+        finally:
+            await runner.cleanup()
+        return bot, reply, answer, stats.stats()
+
+    bot, reply, answer, stats = asyncio.run(main())
+    assert answer == "".join(TOKENS)
+    edits = [(at, data["text"]) for at, method, _, data in bot.sent if method == "editMessageText"]
+    # Последняя правка — полный ответ; промежуточные не чаще interval
+    assert edits[-1][1] == answer
+    assert all(later - earlier >= 0.2 - 0.02 for (earlier, _), (later, _) in zip(edits, edits[1:-1]))
+    assert len(edits) <= 1 + len(TOKENS) * TOKEN_DELAY / 0.2 + 1
+    # Первый токен виден через ~TOKEN_DELAY, а целый ответ — только через ~1 с
+    assert stats["full_reply_avg"] >= TOKEN_DELAY * len(TOKENS)
+    assert stats["ttft_avg"] < stats["full_reply_avg"] / 4
+    assert stats["streams"] == 1 and stats["edits"] == reply.edits == len(edits)
@@ -0,0 +1,49 @@
+import pytest
+
+from trigger_matcher import TriggerMatcher, TriggerRegistry
+
+@pytest.mark.parametrize("text, expected", [
+    ("Бот, как дела?", (True, "как дела?")),
+    ("эй БОТ расскажи анекдот", (True, "расскажи анекдот")),
+    ("Привет, бот!", (True, "Привет!")),
+    ("болталочка, спой", (True, "спой")),
+    ("пойду на работу", (False, "пойду на работу")),
+    ("какая эйфория", (False, "какая эйфория")),
+    ("роботы захватят мир", (False, "роботы захватят мир")),
+    ("@other_bot привет", (False, "@other_bot привет")),
+    ("@croco_bot что нового", (True, "что нового")),
+])
+def test_whole_words_in_any_case(text, expected):
+    assert TriggerMatcher(["бот", "эй", "болталка", "болталочка"], mention="croco_bot").match(text) == expected
+
+def test_matches_old_substring_loop_on_plain_triggers():
+    # Там, где старый цикл не ошибался (слово целиком, нижний регистр),
+    # решение и очищенный текст совпадают
+    words = ["бот", "друг", "помоги"]
+    matcher = TriggerMatcher(words)
+    for text in ["бот скажи", "помоги мне", "друг привет", "просто текст"]:
+        should_reply = any(word in text.lower() for word in words)
+        prompt = text
+        for word in words:
+            prompt = prompt.replace(word, "").strip()
+        assert matcher.match(text) == (should_reply, prompt if should_reply else text)
+
+def test_custom_chat_triggers_do_not_leak():
+    registry = TriggerRegistry(defaults=["бот"])
+    registry.load([(1, "кеша")])
+    assert registry.match(1, "Кеша, привет") == (True, "привет")
+    assert registry.match(2, "Кеша, привет") == (False, "Кеша, привет")
+    assert registry.match(2, "бот, привет") == (True, "привет")
+
+    assert registry.add(2, "гоша") and not registry.add(2, "гоша") and not registry.add(2, "бот")
+    assert registry.match(2, "гоша?") == (True, "?")
+    assert registry.remove(1, "кеша") and not registry.custom.get(1)
+    assert registry.match(1, "кеша") == (False, "кеша")
+
+def test_mention_is_added_after_start():
+    registry = TriggerRegistry(defaults=["бот"])
+    registry.load([(5, "кеша")])
+    registry.match(5, "кеша")
+    registry.set_mention("croco_bot")
+    assert registry.match(5, "@croco_bot погода") == (True, "погода")
+    assert registry.match(6, "@Croco_Bot погода") == (True, "погода")
@@ -0,0 +1,85 @@
+import asyncio
+import random
+import time
+
+from update_queue import UpdateQueue
+
+def message(update_id: int, chat_id: int) -> dict:
+    return {"update_id": update_id, "message": {"message_id": update_id, "chat": {"id": chat_id}}}
+
+def test_busy_chat_does_not_block_other_chats():
+    finished = {}
+
+    async def handler(update):
+        chat_id = update["message"]["chat"]["id"]
+        await asyncio.sleep(0.125 if chat_id == 1 else 0.01)
+        finished[update["update_id"]] = time.monotonic()
+
+    async def main():
+        queue = UpdateQueue(handler, workers=8)
+        await queue.start()
+        started = time.monotonic()
+        for update_id in range(8):
+            queue.put_nowait(message(update_id, 1))
+        queue.put_nowait(message(100, 2))
+        await queue.stop()
+        return started
+
+    started = asyncio.run(main())
+    # Восемь медленных обновлений чата 1 идут одно за другим (~1 с),
+    # а чат 2 не ждёт их в очереди
+    assert finished[100] - started < 0.1
+    assert finished[7] - started >= 8 * 0.125
+
+def test_updates_of_a_chat_run_in_order_and_one_at_a_time():
+    rng = random.Random(0)
+    seen = {}
+    running = set()
+    overlaps = []
+
+    async def handler(update):
+        chat_id = update["message"]["chat"]["id"]
+        if chat_id in running:
+            overlaps.append(chat_id)
+        running.add(chat_id)
+        await asyncio.sleep(rng.random() / 1000)
+        running.discard(chat_id)
+        seen.setdefault(chat_id, []).append(update["update_id"])
+
+    async def main():
+        queue = UpdateQueue(handler, maxsize=10_000, workers=16)
+        await queue.start()
+        for update_id in range(5000):
+            assert queue.put_nowait(message(update_id, rng.randint(1, 200)))
+            if update_id % 100 == 0:
+                await asyncio.sleep(0)
+        await queue.stop()
+        return queue
+
+    queue = asyncio.run(main())
+    assert not overlaps
+    assert all(ids == sorted(ids) for ids in seen.values())
+    assert sum(map(len, seen.values())) == 5000
+    assert queue.stats()["processed"] == 5000
+    assert not queue.shards and queue.pending == 0
+
+def test_full_queue_drops_and_updates_without_chat_run_in_parallel():
+    started = []
+
+    async def handler(update):
+        started.append(update["update_id"])
+        await asyncio.sleep(0.05)
+
+    async def main():
+        queue = UpdateQueue(handler, maxsize=3, workers=4)
+        await queue.start()
+        accepted = [queue.put_nowait({"update_id": i}) for i in range(4)]
+        await asyncio.sleep(0.01)
+        running = len(started)
+        await queue.stop()
+        return queue, accepted, running
+
+    queue, accepted, running = asyncio.run(main())
+    assert accepted == [True, True, True, False]
+    assert running == 3  # без chat.id у каждого обновления свой шард
+    assert queue.stats()["dropped"] == 1
@@ -0,0 +1,49 @@
+import asyncio
+
+import pytest
+
+from usage_ledger import ECONOMY, EXHAUSTED, NORMAL, UsageLedger
+
+@pytest.fixture
+def usage(db):
+    with db.transaction() as conn:
+        conn.execute("DELETE FROM ai_usage")
+    return db
+
+def test_levels_switch_at_chat_and_global_thresholds():
+    ledger = UsageLedger(daily_budget=10_000, chat_budget=1_000, economy_threshold=0.8)
+
+    ledger.record(-1, 7, 500, 299)
+    assert ledger.level(-1) == NORMAL
+    ledger.record(-1, 7, 0, 1)  # 800 из 1000 — режим экономии только для этого чата
+    assert ledger.level(-1) == ECONOMY
+    assert ledger.level(-2) == NORMAL
+    ledger.record(-1, 8, 150, 50)
+    assert ledger.level(-1) == EXHAUSTED
+
+    # Общий бюджет касается всех чатов, даже тех, кто ещё ничего не тратил
+    for chat_id in range(-10, -3):
+        ledger.record(chat_id, 1, 500, 500)
+    assert ledger.total == 8_000
+    assert ledger.level(-3) == ECONOMY
+    assert ledger.degraded == 2 and ledger.refused == 1
+
+def test_totals_survive_restart(usage):
+    ledger = UsageLedger(daily_budget=10_000, chat_budget=1_000, economy_threshold=0.8)
+
+    async def main():
+        ledger.record(-1, 7, 400, 200)
+        ledger.record(-1, 8, 150, 50)
+        ledger.record(-2, 7, 10, 5)
+        await ledger.flush()
+        return await ledger.top_users(-1)
+
+    top = asyncio.run(main())
+    assert [row[0] for row in top] == [7, 8]
+    assert ledger.pending == {}
+
+    restarted = UsageLedger(daily_budget=10_000, chat_budget=1_000, economy_threshold=0.8)
+    restarted.load(usage.get_ai_usage_by_chat(restarted.day))
+    assert restarted.chats == {-1: 800, -2: 15}
+    assert restarted.total == 815
+    assert restarted.level(-1) == ECONOMY
@@ -0,0 +1,42 @@
+import asyncio
+
+import weather_broadcast
+from fakes import FakeThrottledBot
+from outbound import OutboundLimiter
+from weather_broadcast import WeatherBroadcaster
+
+CITIES = ["Липецк", "Славянск-на-Кубани"]
+
+async def fake_render(cities):
+    return {city: f"Погода: {city}" for city in cities}
+
+async def send_weather(chat_id, cities, rendered, send):
+    """Как send_weather_to_chat: по сообщению на каждый город подписки"""
+    for city in cities:
+        await send(chat_id, rendered[city])
+
+def test_broadcast_respects_global_rate_and_reaches_every_chat(monkeypatch):
+    monkeypatch.setattr(weather_broadcast, "render_weather_messages", fake_render)
+    subscriptions = [(-5000 - i, CITIES[:1 + i % 2]) for i in range(60)]
+    failing = subscriptions[0][0]
+
+    async def main():
+        bot = FakeThrottledBot(OutboundLimiter(global_rate=30))
+        bot.retry_after[failing] = [1]
+        broadcaster = WeatherBroadcaster(bot, send_weather)
+        await broadcaster.broadcast(subscriptions)
+        return bot, broadcaster
+
+    bot, broadcaster = asyncio.run(main())
+    expected = sum(len(cities) for _, cities in subscriptions)
+    assert broadcaster.sent == expected and broadcaster.failed == 0
+    for chat_id, cities in subscriptions:
+        texts = [data["text"] for _, _, sent_to, data in bot.sent if sent_to == chat_id]
+        assert texts == [f"Погода: {city}" for city in cities]
+
+    # Не больше ёмкости ведра сразу, дальше — не быстрее 30 в секунду
+    times = bot.times()
+    for i in range(30, len(times)):
+        assert times[i] - times[0] >= (i - 29) / 30 - 0.01
+    # RetryAfter одного чата не остановил рассылку остальным
+    assert bot.outbound.retry_after == 1 and bot.outbound.global_pauses == 0
@@ -0,0 +1,115 @@
+import logging
+import re
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# ================ СЛОВА-ТРИГГЕРЫ ДЛЯ НЕЙРОСЕТИ ================
+# Все слова-обращения («бот», «эй», @username бота) собраны в одно
+# регулярное выражение, которое компилируется один раз. Слово срабатывает
+# только целиком, в любом регистре: «бот» и «Бот,» — да, «работа» и
+# «эйфория» — нет. Один проход re.sub и решает, отвечать ли, и вырезает
+# обращения из текста для запроса к нейросети.
+# Чат может дополнить список своими словами (/addtrigger) — для него
+# собирается отдельное выражение, которое живёт до следующего изменения.
+
+# Ключевые слова для вызова бота во всех чатах
+DEFAULT_TRIGGERS = ["болталка", "болталочка", "бот", "друг", "подруга", "болбес", "помоги", "эй"]
+
+# Разделители после обращения уходят из текста вместе с ним («бот, ...»)
+_SEPARATORS = r"[\s,:;\-—]*"
+# Хвосты после вырезания: разделители перед знаком препинания или концом
+# строки («Привет, !») и двойные пробелы
+_LEFTOVERS = re.compile(r"[\s,:;\-—]+(?=[!?.…]|$)|(?<=\s)\s+")
+
+def _compile(words: Iterable[str], mention: Optional[str]) -> re.Pattern:
+    words = sorted(set(words), key=len, reverse=True)
+    # Длинные слова раньше, чтобы «болталочка» не обрезалась до «болталка»
+    parts = [rf"(?<![\w@])(?:{'|'.join(map(re.escape, words))})(?!\w)"] if words else []
+    if mention:
+        parts.append(rf"@{re.escape(mention)}\b")
+    if not parts:
+        return re.compile(r"(?!)")  # ничего не совпадает
+    # Опережающая проверка первой буквы: на остальных позициях перебор
+    # альтернатив даже не начинается — это основная экономия на длинных текстах
+    first = "".join(sorted({word[0] for word in words} | ({"@"} if mention else set())))
+    return re.compile(f"(?=[{re.escape(first)}])(?:{'|'.join(parts)}){_SEPARATORS}", re.IGNORECASE)
+
+class TriggerMatcher:
+    """Скомпилированный набор триггеров: (нужно ли отвечать, очищенный текст) за один проход"""
+
+    def __init__(self, words: Iterable[str], mention: Optional[str] = None):
+        self.pattern = _compile(words, mention)
+
+    def match(self, text: str) -> Tuple[bool, str]:
+        prompt, found = self.pattern.subn(" ", text)
+        if not found:
+            return False, text.strip()
+        return True, _LEFTOVERS.sub("", prompt).strip()
+
+class TriggerRegistry:
+    """Общие триггеры + свои слова чатов; выражения собираются лениво и кэшируются"""
+
+    def __init__(self, defaults: Iterable[str] = DEFAULT_TRIGGERS, max_words: int = 20):
+        self.defaults = [word.lower() for word in defaults]
+        self.max_words = max_words
+        self.mention: Optional[str] = None
+        self.custom: Dict[int, Set[str]] = {}
+        self._default = TriggerMatcher(self.defaults)
+        self._matchers: Dict[int, TriggerMatcher] = {}
+
+    def load(self, rows: Iterable[Tuple[int, str]]):
+        """Заполняет свои слова чатов строками (chat_id, слово) из БД"""
+        self.custom.clear()
+        for chat_id, word in rows:
+            self.custom.setdefault(chat_id, set()).add(word)
+        self._matchers.clear()
+        logger.info(f"🗣️ Свои триггеры загружены для {len(self.custom)} чатов")
+
+    def set_mention(self, username: Optional[str]):
+        """Имя бота становится известно после запуска — пересобираем выражения"""
+        if username == self.mention:
+            return
+        self.mention = username
+        self._default = TriggerMatcher(self.defaults, username)
+        self._matchers.clear()
+
+    def matcher(self, chat_id: int) -> TriggerMatcher:
+        words = self.custom.get(chat_id)
+        if not words:
+            return self._default
+        matcher = self._matchers.get(chat_id)
+        if matcher is None:
+            matcher = self._matchers[chat_id] = TriggerMatcher([*self.defaults, *words], self.mention)
+        return matcher
+
+    def match(self, chat_id: int, text: str) -> Tuple[bool, str]:
+        return self.matcher(chat_id).match(text)
+
+    def words(self, chat_id: int) -> List[str]:
+        """Свои слова чата по алфавиту"""
+        return sorted(self.custom.get(chat_id, ()))
+
+    def add(self, chat_id: int, word: str) -> bool:
+        """False — слово уже есть или лимит слов чата исчерпан"""
+        words = self.custom.setdefault(chat_id, set())
+        if word in words or word in self.defaults or len(words) >= self.max_words:
+            return False
+        words.add(word)
+        self._matchers.pop(chat_id, None)
+        return True
+
+    def remove(self, chat_id: int, word: str) -> bool:
+        words = self.custom.get(chat_id)
+        if not words or word not in words:
+            return False
+        words.discard(word)
+        if not words:
+            del self.custom[chat_id]
+        self._matchers.pop(chat_id, None)
+        return True
+
+    def stats(self) -> Dict:
+        return {"chats_with_custom": len(self.custom), "compiled": len(self._matchers) + 1}
+
+trigger_registry = TriggerRegistry()
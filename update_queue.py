@@ -0,0 +1,131 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, Hashable, List, Optional, Tuple
+
+from chat_dispatcher import get_update_chat_id
+
+logger = logging.getLogger(__name__)
+
+# ================ ОЧЕРЕДЬ ВХОДЯЩИХ ОБНОВЛЕНИЙ ================
+# Вебхук только кладёт обновление в ограниченную очередь и сразу отвечает
+# Telegram 200, а пул воркеров-корутин разбирает очередь в фоне.
+# Очередь шардирована по chat.id ещё до воркеров: у каждого чата своя FIFO,
+# а воркеры берут из общей очереди готовых чатов. Чат стоит в ней не больше
+# одного раза, поэтому его обновления обрабатываются строго по порядку и
+# одним воркером за раз, а занятый чат держит одного воркера, а не всех.
+
+def is_valid_update(update_data) -> bool:
+    """Минимальная проверка, что тело запроса похоже на Update"""
+    return isinstance(update_data, dict) and isinstance(update_data.get("update_id"), int)
+
+# Ключ шарда: chat.id или None — обновление без чата обрабатывается отдельно
+KeyFunc = Callable[[dict], Optional[Hashable]]
+
+class UpdateQueue:
+    """Ограниченная очередь обновлений с FIFO на чат, пулом воркеров и счётчиками"""
+
+    def __init__(self, handler: Callable[[dict], Awaitable[None]], maxsize: int = 1000, workers: int = 8,
+                 key: KeyFunc = get_update_chat_id):
+        self.handler = handler
+        self.maxsize = maxsize
+        self.workers_count = workers
+        self.key = key
+        # Шард живёт, пока в нём есть обновления или одно из них обрабатывается
+        self.shards: Dict[Hashable, Deque[Tuple[float, dict]]] = {}
+        # Чаты, готовые к обработке (каждый не больше одного раза)
+        self.ready: "asyncio.Queue[Hashable]" = asyncio.Queue()
+        self.pending = 0
+        self._drained = asyncio.Event()
+        self._drained.set()
+        self.workers: List[asyncio.Task] = []
+
+        # Счётчики для /stats
+        self.enqueued = 0
+        self.processed = 0
+        self.failed = 0
+        self.dropped = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    async def start(self):
+        """Запускает воркеры в текущем цикле событий"""
+        if self.workers:
+            return
+        for i in range(self.workers_count):
+            task = asyncio.create_task(self._worker(), name=f"update-worker-{i}")
+            self.workers.append(task)
+        logger.info(f"📥 Очередь обновлений: {self.workers_count} воркеров, размер {self.maxsize}")
+
+    async def stop(self):
+        """Дожидается разбора очереди и останавливает воркеры"""
+        if self.workers:
+            await self._drained.wait()
+        for task in self.workers:
+            task.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        self.workers.clear()
+
+    def put_nowait(self, update_data: dict) -> bool:
+        """Кладёт обновление в очередь. False — очередь переполнена, обновление отброшено"""
+        if self.pending >= self.maxsize:
+            self.dropped += 1
+            logger.warning(f"🚫 Очередь обновлений переполнена, отброшено {update_data.get('update_id')}")
+            return False
+
+        key = self.key(update_data)
+        if key is None:
+            key = object()  # свой шард из одного обновления
+        shard = self.shards.get(key)
+        if shard is None:
+            shard = self.shards[key] = deque()
+            self.ready.put_nowait(key)
+        shard.append((time.monotonic(), update_data))
+        self.pending += 1
+        self._drained.clear()
+        self.enqueued += 1
+        return True
+
+    async def submit(self, update_data: dict) -> bool:
+        """Корутинная обёртка над put_nowait для вызова из другого потока"""
+        return self.put_nowait(update_data)
+
+    async def _worker(self):
+        while True:
+            key = await self.ready.get()
+            shard = self.shards[key]
+            enqueued_at, update_data = shard.popleft()
+            wait = time.monotonic() - enqueued_at
+            self.wait_total += wait
+            self.wait_max = max(self.wait_max, wait)
+            try:
+                await self.handler(update_data)
+                self.processed += 1
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"Ошибка обработки обновления {update_data.get('update_id')}: {e}", exc_info=True)
+            finally:
+                self.pending -= 1
+                # Следующее обновление чата — в конец очереди готовых, после других чатов
+                if shard:
+                    self.ready.put_nowait(key)
+                else:
+                    del self.shards[key]
+                if not self.pending:
+                    self._drained.set()
+
+    def stats(self) -> Dict:
+        taken = self.processed + self.failed
+        return {
+            "depth": self.pending,
+            "chats": len(self.shards),
+            "maxsize": self.maxsize,
+            "workers": len(self.workers),
+            "enqueued": self.enqueued,
+            "processed": self.processed,
+            "failed": self.failed,
+            "dropped": self.dropped,
+            "wait_avg_ms": round(self.wait_total / taken * 1000, 2) if taken else 0.0,
+            "wait_max_ms": round(self.wait_max * 1000, 2),
+        }
@@ -0,0 +1,121 @@
+import asyncio
+import logging
+from datetime import date
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import async_storage as db
+from config import (AI_DAILY_TOKEN_BUDGET, AI_CHAT_DAILY_TOKEN_BUDGET, AI_ECONOMY_THRESHOLD,
+                    AI_USAGE_FLUSH_INTERVAL)
+
+logger = logging.getLogger(__name__)
+
+# ================ УЧЁТ ТОКЕНОВ НЕЙРОСЕТИ ================
+# Каждый ответ MegaNova записывается в память по (день, чат, пользователь):
+# prompt- и completion-токены из поля usage. Раз в AI_USAGE_FLUSH_INTERVAL
+# секунд накопленное пишется в таблицу ai_usage одной транзакцией.
+# Дневные итоги по чатам и в целом держатся в памяти и определяют режим:
+#   NORMAL  — всё как обычно;
+#   ECONOMY — с AI_ECONOMY_THRESHOLD бюджета: короткие ответы без истории,
+#             однотипные запросы — только из кэша, если он есть;
+#   EXHAUSTED — бюджет исчерпан: нейросеть не вызывается, ответ-заготовка.
+
+NORMAL, ECONOMY, EXHAUSTED = "normal", "economy", "exhausted"
+
+UsageKey = Tuple[str, int, int]  # (день, chat_id, user_id)
+
+class UsageLedger:
+    """Расход токенов за день по чатам и пользователям с отложенной записью в БД"""
+
+    def __init__(self, daily_budget: int = AI_DAILY_TOKEN_BUDGET, chat_budget: int = AI_CHAT_DAILY_TOKEN_BUDGET,
+                 economy_threshold: float = AI_ECONOMY_THRESHOLD, interval: float = AI_USAGE_FLUSH_INTERVAL):
+        self.daily_budget = daily_budget
+        self.chat_budget = chat_budget
+        self.economy_threshold = economy_threshold
+        self.interval = interval
+        self.day = date.today().isoformat()
+        self.total = 0
+        self.chats: Dict[int, int] = {}
+        # (день, chat_id, user_id) -> [+prompt, +completion, +запросов]
+        self.pending: Dict[UsageKey, List[int]] = {}
+        self._lock = asyncio.Lock()
+
+        # Счётчики для /stats
+        self.degraded = 0
+        self.refused = 0
+
+    def load(self, rows: Iterable[Tuple[int, int]]):
+        """Восстанавливает итоги сегодняшнего дня: строки (chat_id, токенов) из БД"""
+        self.chats = {chat_id: tokens for chat_id, tokens in rows}
+        self.total = sum(self.chats.values())
+        logger.info(f"🧮 Расход токенов за сегодня: {self.total}")
+
+    def _roll_day(self):
+        today = date.today().isoformat()
+        if today != self.day:
+            self.day = today
+            self.total = 0
+            self.chats.clear()
+
+    def record(self, chat_id: Optional[int], user_id: Optional[int], prompt_tokens: int, completion_tokens: int):
+        """Учитывает один ответ нейросети"""
+        self._roll_day()
+        chat_id, user_id = chat_id or 0, user_id or 0
+        tokens = prompt_tokens + completion_tokens
+        self.total += tokens
+        self.chats[chat_id] = self.chats.get(chat_id, 0) + tokens
+        entry = self.pending.setdefault((self.day, chat_id, user_id), [0, 0, 0])
+        entry[0] += prompt_tokens
+        entry[1] += completion_tokens
+        entry[2] += 1
+
+    def level(self, chat_id: Optional[int]) -> str:
+        """Режим для следующего запроса этого чата"""
+        self._roll_day()
+        used = 0.0
+        if self.daily_budget:
+            used = self.total / self.daily_budget
+        if self.chat_budget:
+            used = max(used, self.chats.get(chat_id or 0, 0) / self.chat_budget)
+        if used >= 1:
+            self.refused += 1
+            return EXHAUSTED
+        if used >= self.economy_threshold:
+            self.degraded += 1
+            return ECONOMY
+        return NORMAL
+
+    async def flush(self):
+        async with self._lock:
+            if not self.pending:
+                return
+            pending, self.pending = self.pending, {}
+            rows = [(day, chat_id, user_id, *deltas) for (day, chat_id, user_id), deltas in pending.items()]
+            try:
+                await db.save_ai_usage(rows)
+            except Exception as e:
+                logger.error(f"Ошибка записи расхода токенов ({len(rows)} строк): {e}")
+                for key, deltas in pending.items():
+                    entry = self.pending.setdefault(key, [0, 0, 0])
+                    for i, delta in enumerate(deltas):
+                        entry[i] += delta
+
+    async def run(self):
+        """Фоновая задача: пишет накопленный расход в БД"""
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.flush()
+
+    async def top_chats(self, limit: int = 10) -> List[Tuple[int, int, int, int]]:
+        await self.flush()
+        return await db.get_top_ai_usage_chats(self.day, limit)
+
+    async def top_users(self, chat_id: int, limit: int = 10) -> List[Tuple[int, int, int, int]]:
+        await self.flush()
+        return await db.get_top_ai_usage_users(self.day, chat_id, limit)
+
+    def stats(self) -> Dict:
+        return {"day": self.day, "tokens_today": self.total, "daily_budget": self.daily_budget,
+                "chats_today": len(self.chats), "pending": len(self.pending),
+                "degraded": self.degraded, "refused": self.refused}
+
+usage_ledger = UsageLedger()
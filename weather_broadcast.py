@@ -0,0 +1,81 @@
+import asyncio
+import logging
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Tuple
+
+import pytz
+from aiogram import Bot
+from aiogram.utils.exceptions import TelegramAPIError
+
+import async_storage as db
+from outbound import bulk_sends
+from weather_service import render_weather_messages
+
+logger = logging.getLogger(__name__)
+
+# ================ РАССЫЛКА ПОГОДЫ ПОДПИСЧИКАМ ================
+# Раз в минуту выбираются подписки, у которых наступило время отправки.
+# Прогноз каждого города запрашивается один раз, текст рендерится один раз,
+# а дальше расходится по чатам. Лимиты Telegram и RetryAfter соблюдает
+# слой исходящих сообщений (outbound.py); рассылка идёт с низким
+# приоритетом, чтобы не задерживать ответы пользователям.
+
+SendWeather = Callable[..., Awaitable[None]]
+
+class WeatherBroadcaster:
+    """Рассылает погоду тысячам подписанных чатов, не превышая лимиты Telegram"""
+
+    def __init__(self, bot: Bot, send_weather: SendWeather, max_parallel: int = 50):
+        self.bot = bot
+        self.send_weather = send_weather
+        self.max_parallel = max_parallel
+        self._tasks = set()
+
+        # Счётчики для /stats
+        self.broadcasts = 0
+        self.sent = 0
+        self.failed = 0
+
+    async def run_due(self):
+        """Отправляет погоду всем подпискам, чьё местное время совпало с текущей минутой"""
+        for timezone in await db.get_weather_timezones():
+            send_time = datetime.now(pytz.timezone(timezone)).strftime("%H:%M")
+            subscriptions = await db.get_due_weather_subscriptions(timezone, send_time)
+            if subscriptions:
+                # Рассылка может длиться дольше минуты — не задерживаем следующий тик
+                with bulk_sends():
+                    task = asyncio.create_task(self.broadcast(subscriptions))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+
+    async def broadcast(self, subscriptions: List[Tuple[int, List[str]]]):
+        """Один запрос погоды на все города и рассылка по чатам"""
+        self.broadcasts += 1
+        cities = list(dict.fromkeys(city for _, chat_cities in subscriptions for city in chat_cities))
+        rendered = await render_weather_messages(cities)
+        logger.info(f"🌅 Рассылка погоды: {len(subscriptions)} чатов, {len(cities)} городов")
+
+        semaphore = asyncio.Semaphore(self.max_parallel)
+
+        async def deliver(chat_id: int, chat_cities: List[str]):
+            async with semaphore:
+                await self.send_weather(chat_id, chat_cities, rendered=rendered, send=self._send)
+
+        with bulk_sends():
+            await asyncio.gather(*(deliver(chat_id, chat_cities) for chat_id, chat_cities in subscriptions))
+
+    async def _send(self, chat_id: int, text: str, **kwargs):
+        try:
+            await self.bot.send_message(chat_id, text, **kwargs)
+            self.sent += 1
+        except TelegramAPIError as e:
+            self.failed += 1
+            logger.error(f"Не удалось отправить погоду в чат {chat_id}: {e}")
+
+    def stats(self) -> Dict:
+        return {
+            "broadcasts": self.broadcasts,
+            "sent": self.sent,
+            "failed": self.failed,
+            "running": len(self._tasks),
+        }
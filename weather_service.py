@@ -1,9 +1,11 @@
-import aiohttp
 import logging
 import asyncio
+import time
 from datetime import datetime
 import pytz
-from typing import Dict, Tuple
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from http_client import http_client
 
 logger = logging.getLogger(__name__)
 
@@ -35,14 +37,14 @@ async def get_weather(city_name: str) -> Tuple[str, Dict]:
             "forecast_days": 1
         }
         
-        async with aiohttp.ClientSession() as session:
-            async with session.get(WEATHER_API_URL, params=params) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    return "success", data
-                else:
-                    logger.error(f"Ошибка API погоды: {response.status}")
-                    return "error", {"message": f"Ошибка API: {response.status}"}
+        async with http_client.session.get(WEATHER_API_URL, params=params,
+                                           timeout=http_client.timeout("weather")) as response:
+            if response.status == 200:
+                data = await response.json()
+                return "success", data
+            else:
+                logger.error(f"Ошибка API погоды: {response.status}")
+                return "error", {"message": f"Ошибка API: {response.status}"}
                     
     except Exception as e:
         logger.error(f"Исключение при получении погоды: {e}")
@@ -67,6 +69,221 @@ async def get_weather_with_retry(city_name: str, max_retries: int = 3):
     
     return "error", data
 
+# ================ ПАКЕТНЫЙ ЗАПРОС ПОГОДЫ ================
+# Open-Meteo принимает списки широт и долгот через запятую и отвечает
+# массивом прогнозов в том же порядке: все города — за один запрос.
+
+async def get_weather_batch(city_names: List[str]) -> Tuple[str, Dict]:
+    """
+    Получает погоду сразу для нескольких городов одним запросом
+    Возвращает (статус, {город: данные_погоды}) или (статус, {"message": ...})
+    """
+    try:
+        coords = [CITIES[city] for city in city_names]
+        params = {
+            "latitude": ",".join(str(c["lat"]) for c in coords),
+            "longitude": ",".join(str(c["lon"]) for c in coords),
+            "current": "temperature_2m,weather_code,wind_speed_10m,relative_humidity_2m",
+            "daily": "temperature_2m_max,temperature_2m_min,weather_code",
+            "timezone": "Europe/Moscow",
+            "forecast_days": 1
+        }
+
+        async with http_client.session.get(WEATHER_API_URL, params=params,
+                                           timeout=http_client.timeout("weather")) as response:
+            if response.status != 200:
+                logger.error(f"Ошибка пакетного API погоды: {response.status}")
+                return "error", {"message": f"Ошибка API: {response.status}"}
+            data = await response.json()
+
+        # Для одной точки API возвращает объект, для нескольких — массив
+        if isinstance(data, dict):
+            data = [data]
+        if len(data) != len(city_names):
+            return "error", {"message": f"Ожидалось {len(city_names)} прогнозов, получено {len(data)}"}
+        return "success", dict(zip(city_names, data))
+
+    except Exception as e:
+        logger.error(f"Исключение при пакетном получении погоды: {e}")
+        return "error", {"message": str(e)}
+
+async def fetch_weather_many(city_names: List[str], max_retries: int = 3) -> Dict[str, Tuple[str, Dict]]:
+    """Пакетный запрос с повторами при 429; если пакет не удался — города параллельно по одному"""
+    for attempt in range(max_retries):
+        status, data = await get_weather_batch(city_names)
+        if status == "success":
+            return {city: ("success", city_data) for city, city_data in data.items()}
+
+        if "429" in str(data.get("message")):
+            wait_time = 2 ** attempt
+            logger.warning(f"⚠️ Лимит API, повтор пакета через {wait_time}с (попытка {attempt+1}/{max_retries})")
+            await asyncio.sleep(wait_time)
+        else:
+            break
+
+    logger.warning("⚠️ Пакетный запрос погоды не удался, запрашиваем города по отдельности")
+    results = await asyncio.gather(*(get_weather_with_retry(city) for city in city_names))
+    return dict(zip(city_names, results))
+
+# ================ КЭШ ПОГОДЫ ================
+# Прогноз для города меняется не чаще раза в час, поэтому ответ Open-Meteo
+# кэшируется по координатам и часу прогноза. Устаревший ответ ещё какое-то
+# время отдаётся сразу, пока в фоне идёт обновление (stale-while-revalidate),
+# а одновременные запросы одного города сливаются в один запрос к API.
+# Все промахи одного вызова get_many уходят в API одним пакетом.
+
+Key = Tuple[float, float]
+FetchMany = Callable[[List[Key]], Awaitable[Dict[Key, Tuple[str, Dict]]]]
+
+def forecast_hour() -> str:
+    """Текущий час прогноза по Москве, например 2026-01-31T08"""
+    return datetime.now(pytz.timezone('Europe/Moscow')).strftime("%Y-%m-%dT%H")
+
+class WeatherCache:
+    """TTL-кэш ответов погоды с фоновым обновлением и слиянием запросов"""
+
+    def __init__(self, ttl: float = 3600, stale_ttl: float = 3 * 3600):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        # (lat, lon) -> (час прогноза, время получения, данные)
+        self.entries: Dict[Key, Tuple[str, float, Dict]] = {}
+        # (lat, lon) -> future с результатом запроса, который уже идёт
+        self.inflight: Dict[Key, asyncio.Future] = {}
+        self._tasks = set()
+
+        # Счётчики для /stats
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.upstream_requests = 0
+        self.errors = 0
+
+    async def get_many(self, keys: List[Key], fetch_many: FetchMany) -> Dict[Key, Tuple[str, Dict]]:
+        """Результаты для всех ключей; промахи и устаревшие загружаются одним fetch_many"""
+        results: Dict[Key, Tuple[str, Dict]] = {}
+        waiting: Dict[Key, asyncio.Future] = {}
+        to_fetch: List[Key] = []
+        to_refresh: List[Key] = []
+        hour = forecast_hour()
+        now = time.monotonic()
+
+        for key in keys:
+            entry = self.entries.get(key)
+            if entry:
+                entry_hour, fetched_at, data = entry
+                age = now - fetched_at
+                if entry_hour == hour and age < self.ttl:
+                    self.hits += 1
+                    results[key] = ("success", data)
+                    continue
+                if age < self.stale_ttl:
+                    # Отдаём устаревшее сразу и обновляем в фоне
+                    self.stale_hits += 1
+                    results[key] = ("success", data)
+                    if key not in self.inflight:
+                        to_refresh.append(key)
+                    continue
+
+            self.misses += 1
+            if key in self.inflight:
+                self.coalesced += 1
+                waiting[key] = self.inflight[key]
+            else:
+                to_fetch.append(key)
+
+        if to_fetch or to_refresh:
+            futures = self._start_fetch(to_fetch + to_refresh, fetch_many)
+            for key in to_fetch:
+                waiting[key] = futures[key]
+
+        for key, future in waiting.items():
+            results[key] = await asyncio.shield(future)
+        return results
+
+    def _start_fetch(self, keys: List[Key], fetch_many: FetchMany) -> Dict[Key, asyncio.Future]:
+        """Запускает один запрос к API для ключей и регистрирует его как идущий"""
+        loop = asyncio.get_running_loop()
+        futures = {key: loop.create_future() for key in keys}
+        self.inflight.update(futures)
+        self.upstream_requests += 1
+
+        async def run():
+            try:
+                fetched = await fetch_many(keys)
+            except Exception as e:
+                fetched = {}
+                logger.error(f"Ошибка загрузки погоды: {e}")
+            finally:
+                for key in keys:
+                    self.inflight.pop(key, None)
+
+            for key in keys:
+                status, data = fetched.get(key, ("error", {"message": "нет данных"}))
+                if status == "success":
+                    self.entries[key] = (forecast_hour(), time.monotonic(), data)
+                else:
+                    self.errors += 1
+                futures[key].set_result((status, data))
+
+        task = asyncio.create_task(run())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return futures
+
+    def stats(self) -> Dict:
+        return {
+            "entries": len(self.entries),
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "upstream_requests": self.upstream_requests,
+            "errors": self.errors,
+        }
+
+weather_cache = WeatherCache()
+
+def city_key(city_name: str) -> Key:
+    coords = CITIES[city_name]
+    return coords["lat"], coords["lon"]
+
+async def get_weather_many(city_names: Optional[List[str]] = None) -> Dict[str, Tuple[str, Dict]]:
+    """
+    Погода для нескольких городов (по умолчанию для всех CITIES) через кэш.
+    Все промахи загружаются одним запросом к Open-Meteo.
+    Возвращает {город: (статус, данные_погоды)} в порядке city_names
+    """
+    city_names = list(city_names or CITIES)
+    known = [city for city in city_names if city in CITIES]
+    by_key = {city_key(city): city for city in known}
+
+    async def fetch_many(keys: List[Key]) -> Dict[Key, Tuple[str, Dict]]:
+        fetched = await fetch_weather_many([by_key[key] for key in keys])
+        return {city_key(city): result for city, result in fetched.items()}
+
+    cached = await weather_cache.get_many(list(by_key), fetch_many)
+
+    results = {}
+    for city in city_names:
+        if city in CITIES:
+            results[city] = cached[city_key(city)]
+        else:
+            results[city] = ("error", {"message": f"Город {city} не найден"})
+    return results
+
+async def render_weather_messages(city_names: List[str]) -> Dict[str, str]:
+    """Готовые тексты погоды {город: сообщение} — один рендер на город для любой рассылки"""
+    forecasts = await get_weather_many(city_names)
+    messages = {}
+    for city, (status, weather_data) in forecasts.items():
+        if status == "success":
+            messages[city] = format_weather_message(city, weather_data)
+        else:
+            logger.error(f"Не удалось получить погоду для {city}")
+            messages[city] = f"🌅 Доброе утро! Не удалось получить погоду для {city}, но день всё равно будет хорошим! ☀️"
+    return messages
+
 def get_weather_emoji(weather_code: int) -> str:
     """Преобразует код погоды Open-Meteo в эмодзи """
     weather_codes = {
@@ -0,0 +1,131 @@
+import os
+import logging
+import traceback
+from datetime import datetime
+from aiohttp import web
+
+# Настройка логирования
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Импортируем бота
+from bot import dp, bot, start_background_tasks, shutdown_background_tasks, process_update, update_queue, collect_stats
+from aiogram import Bot, Dispatcher
+from update_queue import is_valid_update
+from config import ASYNC_INGEST
+
+# ================ НАТИВНЫЙ АСИНХРОННЫЙ ВЕБХУК (AIOHTTP) ================
+# Альтернатива gunicorn+Flask: dp из bot.py работает прямо в цикле aiohttp,
+# поэтому один процесс обрабатывает сотни обновлений одновременно.
+
+INDEX_HTML = '''<html>
+        <head><title>Бот Болталка</title></head>
+        <body style="font-family: Arial; text-align: center; margin-top: 50px;">
+            <h1>🤖 Бот Болталка</h1>
+            <p style="color: green; font-size: 24px;">✅ Бот запущен и работает!</p>
+            <p>Telegram: <b>@BoltalkaChatBot_bot</b></p>
+            <p><a href="/webhook_info">Проверить вебхук</a> | <a href="/set_webhook">Установить вебхук</a></p>
+        </body>
+    </html>'''
+
+async def index(request: web.Request):
+    return web.Response(text=INDEX_HTML, content_type='text/html')
+
+async def webhook(request: web.Request):
+    """Асинхронная версия вебхука"""
+    try:
+        update_data = await request.json()
+        if not is_valid_update(update_data):
+            return web.Response(text='Bad request', status=400)
+        logger.info(f"Получено обновление: {update_data.get('update_id')}")
+
+        # Быстрый режим: кладём в очередь и сразу отвечаем Telegram
+        if ASYNC_INGEST:
+            if not update_queue.put_nowait(update_data):
+                return web.Response(text='Busy', status=503)
+            return web.Response(text='OK')
+
+        await process_update(update_data)
+
+        return web.Response(text='OK')
+    except Exception as e:
+        logger.error(f"Ошибка обработки вебхука: {e}")
+        logger.error(traceback.format_exc())
+        return web.Response(text='Error', status=500)
+
+async def set_webhook(request: web.Request):
+    """Установка вебхука"""
+    try:
+        railway_url = os.getenv('RAILWAY_STATIC_URL')
+        if not railway_url:
+            railway_url = os.getenv('RAILWAY_PUBLIC_DOMAIN')
+
+        if not railway_url:
+            return web.Response(text="❌ Ошибка: Не удалось определить URL приложения", status=500)
+
+        webhook_url = f"https://{railway_url}/webhook"
+
+        # Удаляем старый вебхук и устанавливаем новый
+        await bot.delete_webhook()
+        await bot.set_webhook(
+            webhook_url,
+            allowed_updates=['message', 'callback_query', 'chat_member', 'new_chat_members']
+        )
+        return web.Response(text=f"✅ Webhook успешно установлен на {webhook_url}")
+    except Exception as e:
+        logger.error(traceback.format_exc())
+        return web.Response(text=f"❌ Ошибка: {str(e)}", status=500)
+
+async def delete_webhook(request: web.Request):
+    """Удаление вебхука"""
+    try:
+        await bot.delete_webhook()
+        return web.Response(text="✅ Webhook удален")
+    except Exception as e:
+        return web.Response(text=f"❌ Ошибка: {str(e)}", status=500)
+
+async def webhook_info(request: web.Request):
+    """Информация о вебхуке"""
+    try:
+        info = await bot.get_webhook_info()
+        return web.json_response({'ok': True, 'result': info.to_python()})
+    except Exception as e:
+        return web.json_response({'error': str(e)}, status=500)
+
+async def health(request: web.Request):
+    return web.json_response({'status': 'healthy', 'timestamp': datetime.now().isoformat()})
+
+async def stats(request: web.Request):
+    """Метрики очереди обновлений и других компонентов"""
+    return web.json_response(collect_stats())
+
+async def on_startup(app: web.Application):
+    """Запускает фоновые задачи в цикле aiohttp"""
+    Bot.set_current(bot)
+    Dispatcher.set_current(dp)
+    await start_background_tasks()
+
+async def on_shutdown(app: web.Application):
+    """Останавливает фоновые задачи и закрывает ресурсы"""
+    await shutdown_background_tasks()
+
+def create_app() -> web.Application:
+    """Создаёт aiohttp приложение с теми же маршрутами, что и Flask версия"""
+    app = web.Application()
+    app.router.add_get('/', index)
+    app.router.add_post('/webhook', webhook)
+    app.router.add_get('/set_webhook', set_webhook)
+    app.router.add_get('/delete_webhook', delete_webhook)
+    app.router.add_get('/webhook_info', webhook_info)
+    app.router.add_get('/health', health)
+    app.router.add_get('/stats', stats)
+    app.on_startup.append(on_startup)
+    app.on_shutdown.append(on_shutdown)
+    return app
+
+def main():
+    port = int(os.getenv('PORT', 8080))
+    web.run_app(create_app(), host='0.0.0.0', port=port)
+
+if __name__ == '__main__':
+    main()
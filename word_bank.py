@@ -0,0 +1,75 @@
+import logging
+import random
+from collections import deque
+from typing import Deque, Dict, Iterable, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# ================ БАНК СЛОВ ДЛЯ КРОКОДИЛА ================
+# Все слова с описаниями лежат в памяти: случайное слово выбирается за O(1)
+# без ORDER BY RANDOM(), описание ищется по словарю, а /addword просто
+# дописывает слово в конец массива.
+
+class WordBank:
+    """Массив (слово, описание) с индексом и памятью недавних слов по чатам"""
+
+    def __init__(self, recent_size: int = 20, attempts: int = 8):
+        self.recent_size = recent_size
+        self.attempts = attempts
+        self.words: List[Tuple[str, str]] = []
+        self.index: Dict[str, int] = {}
+        self._recent: Dict[int, Deque[str]] = {}
+        self._recent_sets: Dict[int, Set[str]] = {}
+
+    def load(self, rows: Iterable[Tuple[str, str]]):
+        """Заполняет банк строками (слово, описание) из БД"""
+        self.words.clear()
+        self.index.clear()
+        for word, description in rows:
+            self.add(word, description)
+        logger.info(f"📚 Загружено слов для игры: {len(self.words)}")
+
+    def add(self, word: str, description: str):
+        """Добавляет слово (или обновляет описание существующего)"""
+        position = self.index.get(word)
+        if position is None:
+            self.index[word] = len(self.words)
+            self.words.append((word, description))
+        else:
+            self.words[position] = (word, description)
+
+    def describe(self, word: str) -> Optional[str]:
+        position = self.index.get(word)
+        return self.words[position][1] if position is not None else None
+
+    def __len__(self):
+        return len(self.words)
+
+    def pick(self, chat_id: Optional[int] = None) -> Optional[Tuple[str, str]]:
+        """Случайное слово, по возможности не из недавних слов этого чата"""
+        if not self.words:
+            return None
+
+        recent = self._recent_sets.get(chat_id, ())
+        for _ in range(self.attempts):
+            choice = random.choice(self.words)
+            if choice[0] not in recent:
+                break
+
+        if chat_id is not None:
+            self._remember(chat_id, choice[0])
+        return choice
+
+    def _remember(self, chat_id: int, word: str):
+        # Храним не больше половины банка, иначе свободных слов почти не останется
+        limit = min(self.recent_size, len(self.words) // 2)
+        history = self._recent.setdefault(chat_id, deque())
+        seen = self._recent_sets.setdefault(chat_id, set())
+        if word in seen:
+            return
+        history.append(word)
+        seen.add(word)
+        while len(history) > limit:
+            seen.discard(history.popleft())
+
+word_bank = WordBank()